@@ -0,0 +1,120 @@
+# coding: utf-8
+"""
+Saída colunar (Parquet) para o relatório de acessos.
+
+Os metadados do documento se repetem em todas as linhas de acesso de um
+documento, então as colunas de texto são gravadas com codificação de
+dicionário e os acessos como colunas inteiras, reduzindo o tamanho do arquivo
+e o tempo de carga em ferramentas analíticas.
+
+Requer o pacote opcional pyarrow.
+"""
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+import profiling
+
+ROW_GROUP_SIZE = 65536
+
+TEXT_FIELDS = [
+    'id',
+    'collection',
+    'pid',
+    'issn',
+    'journal_title',
+    'issue',
+    'issue_title',
+    'document_title',
+    'processing_date',
+    'publication_date',
+    'publication_year',
+    'document_type',
+    'access_date',
+    'access_year',
+    'access_month',
+    'access_day',
+]
+
+LIST_FIELDS = [
+    'subject_areas',
+    'languages',
+    'aff_countries',
+]
+
+COUNT_FIELDS = [
+    'access_abstract',
+    'access_html',
+    'access_pdf',
+    'access_epdf',
+    'access_total',
+]
+
+
+def is_available():
+
+    return pa is not None
+
+
+def schema():
+    text = pa.dictionary(pa.int32(), pa.string())
+    fields = [pa.field(name, text) for name in TEXT_FIELDS]
+    fields += [pa.field(name, pa.list_(pa.string())) for name in LIST_FIELDS]
+    fields += [pa.field(name, pa.int64()) for name in COUNT_FIELDS]
+
+    return pa.schema(fields)
+
+
+class ParquetWriter(object):
+
+    def __init__(self, output_file, row_group_size=ROW_GROUP_SIZE):
+        """
+        Recebe as linhas de join_metadata_with_accesses e as grava em
+        ``output_file`` em grupos de ``row_group_size`` linhas.
+        """
+        if not is_available():
+            raise ValueError('pyarrow is required for the parquet output format')
+
+        self.schema = schema()
+        self.row_group_size = row_group_size
+        self._writer = pq.ParquetWriter(
+            output_file, self.schema, use_dictionary=True, compression='snappy')
+        self._columns = None
+        self._reset()
+
+    def _reset(self):
+        self._columns = dict((name, []) for name in self.schema.names)
+        self._size = 0
+
+    def write(self, data):
+        for name, column in self._columns.items():
+            column.append(data.get(name, 0 if name in COUNT_FIELDS else None))
+
+        self._size += 1
+
+        if self._size >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self._size:
+            return
+
+        with profiling.stage('write', self._size):
+            arrays = [
+                pa.array(self._columns[field.name], type=field.type)
+                for field in self.schema
+            ]
+            self._writer.write_table(
+                pa.Table.from_arrays(arrays, schema=self.schema))
+        self._reset()
+
+    def close(self):
+        if self._writer is None:
+            return
+
+        self.flush()
+        self._writer.close()
+        self._writer = None
@@ -9,9 +9,11 @@ Formato de saída:
 
 import argparse
 import logging
-import codecs
 
 import utils
+import metrics
+import profiling
+import output
 
 logger = logging.getLogger(__name__)
 
@@ -44,12 +46,13 @@ def _config_logging(logging_level='INFO', logging_file=None):
 
 class Dumper(object):
 
-    def __init__(self, collection, issns=None, output_file=None):
+    def __init__(self, collection, issns=None, output_file=None, bulk=False):
         self._articlemeta = utils.articlemeta_server()
         self._accessstats = utils.accessstats_server()
         self.collection = collection
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
+        self.bulk = bulk
+        self.output_file = output.CSVWriter(output_file)
         header = [
             u"issn scielo",
             u"issn impresso",
@@ -67,14 +70,14 @@ class Dumper(object):
         self.write(','.join(header))
 
     def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def writerows(self, rows):
+        self.output_file.writerows(rows)
 
     def run(self):
-        for item in self.items():
-            self.write(item)
+        self.writerows(self.items())
+        self.output_file.close()
         logger.info('Export finished')
 
     def items(self):
@@ -82,12 +85,27 @@ class Dumper(object):
         if not self.issns:
             self.issns = [None]
 
-        for issn in self.issns:
-            for data in self._articlemeta.journals(collection=self.collection, issn=issn):
-                for item in self.fmt_csv(data):
+        journals = (
+            journal for issn in self.issns
+            for journal in self._articlemeta.journals(collection=self.collection, issn=issn)
+        )
+
+        if not self.bulk:
+            for data in journals:
+                acessos = self._accessstats.access_lifetime(data.scielo_issn, self.collection)
+                for item in self.fmt_csv(data, acessos):
                     yield item
-        
-    def fmt_csv(self, data):
+            return
+
+        lifetime = self._accessstats.access_lifetime_bulk(
+            self.collection, issns=[issn for issn in self.issns if issn])
+
+        for data in journals:
+            for item in self.fmt_csv(data, lifetime.get(data.scielo_issn, [])):
+                yield item
+
+    @profiling.timed('format')
+    def fmt_csv(self, data, acessos):
 
         line = [
             data.scielo_issn,
@@ -97,13 +115,8 @@ class Dumper(object):
             ','.join(data.subject_areas or [])
         ]
 
-        acessos = self._accessstats.access_lifetime(data.scielo_issn, self.collection)
-
         for item in acessos:
-            l = None
-            l = line + [str(i) for i in item]
-            joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in l])
-            yield joined_line
+            yield line + [str(i) for i in item]
 
 
 def main():
@@ -130,6 +143,19 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--bulk',
+        '-b',
+        action='store_true',
+        help='Load the accesses of all journals in a few collection-wide queries'
+    )
+
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Report the time and throughput of each processing stage'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -146,12 +172,17 @@ def main():
 
     args = parser.parse_args()
     _config_logging(args.logging_level, args.logging_file)
+    metrics.set_logger(logger)
+
+    if args.profile:
+        profiling.enable(logger)
+
     logger.info('Dumping data for: %s' % args.collection)
 
     issns = None
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
 
-    dumper = Dumper(args.collection, issns, args.output_file)
+    dumper = Dumper(args.collection, issns, args.output_file, bulk=args.bulk)
 
     dumper.run()
@@ -2,17 +2,24 @@
 """
 Esse processamento condença os metadados de documentos com os dados de acessos.
 """
+import os
 import sys
 import argparse
 import logging
 import re
 import json
-import codecs
 import datetime
 
 import choices
 
 import utils
+import metrics
+import profiling
+import output
+import resume
+import sharding
+from accesses import columnar
+from thrift import decoder
 
 __version__ = 0.1
 
@@ -25,6 +32,7 @@ FROM = '1500-01-01'
 UNTIL = datetime.datetime.now().isoformat()[0:10]
 DAYLY_GRANULARITY = False
 OUTPUT_FORMAT = 'csv'
+BATCH_SIZE = 100
 
 
 def _config_logging(logging_level='INFO', logging_file=None):
@@ -96,6 +104,19 @@ def eligible_match_keys(document):
     return keys
 
 
+def batches(items, size):
+    batch = []
+
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
 def country(country):
     if country in choices.ISO_3166:
         return country
@@ -185,6 +206,120 @@ def join_metadata_with_accesses(document, accesses_date, accesses):
     return data
 
 
+ACCESS_TYPES = ['abstract', 'html', 'pdf', 'readcube']
+
+# Índices das contagens: meses são contados a partir do ano 0 (ano * 12 + mês)
+# e dias ocupam 31 posições por mês (ano * 372 + mês * 31 + dia), sem
+# validação de calendário, preservando datas como informadas pelo Ratchet.
+MONTHS_IN_YEAR = 12
+DAYS_IN_MONTH = 31
+DAYS_IN_YEAR = MONTHS_IN_YEAR * DAYS_IN_MONTH
+
+
+def month_index(year, month):
+
+    return year * MONTHS_IN_YEAR + month - 1
+
+
+def day_index(year, month, day):
+
+    return year * DAYS_IN_YEAR + (month - 1) * DAYS_IN_MONTH + day - 1
+
+
+_INDEX_DATES = ({}, {})
+
+
+def index_date(index, dayly_granularity):
+    dates = _INDEX_DATES[bool(dayly_granularity)]
+
+    try:
+        return dates[index]
+    except KeyError:
+        pass
+
+    if not dayly_granularity:
+        year, month = divmod(index, MONTHS_IN_YEAR)
+        date = '%04d-%02d' % (year, month + 1)
+    else:
+        year, rest = divmod(index, DAYS_IN_YEAR)
+        month, day = divmod(rest, DAYS_IN_MONTH)
+        date = '%04d-%02d-%02d' % (year, month + 1, day + 1)
+
+    dates[index] = date
+
+    return date
+
+
+def period_indexes(from_date, until_date, dayly_granularity):
+    """
+    Converte o período em índices inclusivos. Na granularidade diária uma
+    data final sem dia (AAAA-MM) exclui o próprio mês, equivalente a comparar
+    as datas como texto.
+    """
+    if not dayly_granularity:
+        return (
+            month_index(int(from_date[0:4]), int(from_date[5:7])),
+            month_index(int(until_date[0:4]), int(until_date[5:7]))
+        )
+
+    start = day_index(int(from_date[0:4]), int(from_date[5:7]), int(from_date[8:10] or 1))
+
+    if until_date[8:10]:
+        end = day_index(int(until_date[0:4]), int(until_date[5:7]), int(until_date[8:10]))
+    else:
+        end = day_index(int(until_date[0:4]), int(until_date[5:7]), 1) - 1
+
+    return start, end
+
+
+def accumulate_accesses(joined, atype, data, start, end, dayly_granularity):
+    """
+    Soma em ``joined`` ({índice: {tipo: total}}) os acessos de um tipo
+    (ex: data['html']) no formato do Ratchet (yAAAA/mMM/dDD), considerando
+    apenas os índices entre ``start`` e ``end``. Anos e meses fora do período
+    são descartados sem percorrer seus dias e o dicionário recebido não é
+    alterado.
+    """
+    for year, months in data.items():
+        if year == 'total':
+            continue
+        iyear = int(year[1:])
+        if not dayly_granularity:
+            if month_index(iyear, 12) < start or month_index(iyear, 1) > end:
+                continue
+        elif day_index(iyear, 12, 31) < start or day_index(iyear, 1, 1) > end:
+            continue
+
+        for month, days in months.items():
+            if month == 'total':
+                continue
+
+            if not dayly_granularity:
+                index = month_index(iyear, int(month[1:]))
+                if index < start or index > end:
+                    continue
+                counts = joined.get(index)
+                if counts is None:
+                    counts = joined[index] = {}
+                counts[atype] = counts.get(atype, 0) + days['total']
+                continue
+
+            base = day_index(iyear, int(month[1:]), 1)
+            if base + DAYS_IN_MONTH - 1 < start or base > end:
+                continue
+
+            for day, total in days.items():
+                if day == 'total':
+                    continue
+                index = base + int(day[1:]) - 1
+                if index < start or index > end:
+                    continue
+                counts = joined.get(index)
+                if counts is None:
+                    counts = joined[index] = {}
+                counts[atype] = counts.get(atype, 0) + total
+
+
 def join_accesses(unique_id, accesses, from_date, until_date, dayly_granularity):
     """
     Esse metodo recebe 1 ou mais chaves para um documento em específico para que
@@ -195,88 +330,82 @@ def join_accesses(unique_id, accesses, from_date, until_date, dayly_granularity)
     PID FBPE: Id antigo do SciELO ex: S0102-6720(09)000300001
     Path PDF: Quando o acesso é feito diretamente para o arquivo PDF no FS do
     servidor ex: /pdf/rsp/v12n10/v12n10.pdf
+
+    As datas são tratadas como índices inteiros de mês ou dia, convertidos em
+    texto apenas para os períodos retornados.
     """
     logger.debug('joining accesses for: %s' % unique_id)
-    joined_data = {}
-    listed_data = []
-    def joining_monthly(joined_data, atype, data):
-
-        if 'total' in data:
-            del(data['total'])
-
-        for year, months in data.items():
-            del(months['total'])
-            for month in months:
-
-                dt = '%s-%s' % (year[1:], month[1:])
-                if not dt >= from_date[:7] or not dt <= until_date[:7]:
-                    continue
-                joined_data.setdefault(dt, {})
-                joined_data[dt].setdefault(atype, 0)
-                joined_data[dt][atype] += data[year][month]['total']
-
-        return joined_data
-
-    def joining_dayly(joined_data, atype, data):
-
-        if 'total' in data:
-            del(data['total'])
 
-        for year, months in data.items():
-            del(months['total'])
-            for month, days in months.items():
-                del(days['total'])
-                for day in days:
-                    dt = '%s-%s-%s' % (year[1:], month[1:], day[1:])
-                    if not dt >= from_date or not dt <= until_date:
-                        continue
-                    joined_data.setdefault(dt, {})
-                    joined_data[dt].setdefault(atype, 0)
-                    joined_data[dt][atype] += data[year][month][day]
-
-        return joined_data
-
-    joining = joining_monthly
-    if dayly_granularity:
-        joining = joining_dayly
+    start, end = period_indexes(from_date, until_date, dayly_granularity)
+    joined = {}
 
     for data in accesses:
-        for key, value in data.items():
-            if not key in ['abstract', 'html', 'pdf', 'readcube']:
+        for atype in ACCESS_TYPES:
+            if atype not in data:
                 continue
-            joined_data = joining(joined_data, key, value)
+            accumulate_accesses(
+                joined, atype, data[atype], start, end, dayly_granularity)
 
-    return joined_data
+    return dict(
+        (index_date(index, dayly_granularity), counts)
+        for index, counts in joined.items()
+    )
 
 
 class Dumper(object):
 
     def __init__(self, collection, issns=None, from_date=FROM, until_date=UNTIL,
-        dayly_granularity=DAYLY_GRANULARITY, fmt=OUTPUT_FORMAT, output_file=None):
+        dayly_granularity=DAYLY_GRANULARITY, fmt=OUTPUT_FORMAT, output_file=None, workers=None,
+        ratchet_workers=None, state_file=None, resume_dump=False):
 
-        self._ratchet = utils.ratchet_server()
-        self._articlemeta = utils.articlemeta_server()
+        self._ratchet = utils.ratchet_server(workers=ratchet_workers)
+        self._articlemeta = utils.articlemeta_server(workers=workers)
         self.from_date = from_date
         self.until_date = until_date
         self.dayly_granularity = dayly_granularity
-        self.output_file=output_file
         self.issns = issns
         self.collection = collection
+        self.columnar = fmt == 'parquet'
+        self.output_path = output_file
+        self.checkpoint = resume.Checkpoint(state_file) if state_file else None
+        self.state = self.checkpoint.read() if self.checkpoint and resume_dump else None
+
+        if self.state:
+            logger.info('Resuming from %s at offset %d' % (self.state['issn'], self.state['offset']))
+            resume.truncate(output_file, self.state['output_size'])
+
+        if self.columnar:
+            self.output_file = columnar.ParquetWriter(output_file)
+        else:
+            self.output_file = output.CSVWriter(output_file, append=bool(self.state))
 
         self.fmt = self.fmt_csv
         if fmt == 'json':
             self.fmt = self.fmt_json
+        if fmt == 'parquet':
+            self.fmt = self.fmt_parquet
 
 
-    def get_accesses(self, issn):
-
-        for document in self._articlemeta.documents(collection=self.collection, issn=issn):
-            accesses = []
+    def batch_accesses(self, documents):
+        """
+        Recupera de uma só vez os acessos de todas as chaves elegíveis de
+        ``documents`` e os consolida por documento.
+        """
+        documents_keys = []
+        for document in documents:
             keys = eligible_match_keys(document)
             logger.debug('keys to join for %s: %s' % (document.publisher_id, str(keys)))
+            documents_keys.append((document, keys))
+
+        payloads = self._ratchet.documents(
+            set(key for document, keys in documents_keys for key in keys))
+        with profiling.stage('decode', len(payloads)):
+            payloads = dict((key, decoder.loads(data)) for key, data in payloads.items())
+
+        for document, keys in documents_keys:
+            accesses = []
             for key in keys:
-                data = self._ratchet.document(key)
-                jdata = json.loads(data)
+                jdata = payloads[key]
                 if 'objects' in jdata and len(jdata['objects']) > 0:
                     accesses.append(jdata['objects'][0])
             joined_accesses = join_accesses(document.publisher_id,
@@ -286,9 +415,30 @@ class Dumper(object):
             for adate, adata in joined_accesses.items():
                 yield join_metadata_with_accesses(document, adate, adata)
 
+    def document_accesses(self, document):
+
+        return self.batch_accesses([document])
+
+    def get_accesses(self, issn):
+
+        documents = self._articlemeta.documents(collection=self.collection, issn=issn)
+
+        for batch in batches(documents, BATCH_SIZE):
+            for item in self.batch_accesses(batch):
+                yield item
+
+    def process(self, document):
+        for data in self.document_accesses(document):
+            self.write(self.fmt(data))
+
+    @profiling.timed('format')
     def fmt_json(self, data):
         return json.dumps(data)
 
+    def fmt_parquet(self, data):
+        return data
+
+    @profiling.timed('format')
     def fmt_csv(self, data):
 
         line = [
@@ -317,23 +467,36 @@ class Dumper(object):
             data['access_total']
         ]
 
-        return ','.join(['"%s"' % i for i in line])
+        return line
+
+    def write(self, line):
+        if isinstance(line, list):
+            self.output_file.writerow(line)
+        else:
+            self.output_file.write(line)
 
     def run(self):
 
         if not self.issns:
             self.issns = [None]
 
-        if not self.output_file:
-            for issn in self.issns:
-                for data in self.get_accesses(issn=issn):
-                    print(self.fmt(data))
-            exit()
+        documents = resume.documents(
+            self._articlemeta, self.issns, self.state, collection=self.collection)
+
+        for batch in batches(documents, BATCH_SIZE):
+            for data in self.batch_accesses([document for issn, offset, document in batch]):
+                self.write(self.fmt(data))
 
-        with codecs.open(self.output_file, 'w', encoding='utf-8') as f:
-            for issn in self.issns:
-                for data in self.get_accesses(issn=issn):
-                    f.write(u'%s\r\n' % self.fmt(data))
+            if self.checkpoint:
+                self.output_file.flush()
+                issn, offset, document = batch[-1]
+                self.checkpoint.commit(issn, offset, document.publisher_id,
+                    os.path.getsize(self.output_path))
+
+        self.output_file.close()
+
+        if self.checkpoint:
+            self.checkpoint.remove()
 
 
 def main():
@@ -377,7 +540,7 @@ def main():
     parser.add_argument(
         '--output_format',
         '-f',
-        choices=['json', 'csv'],
+        choices=['json', 'csv', 'parquet'],
         default=OUTPUT_FORMAT,
         help='Output format'
     )
@@ -388,6 +551,45 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--state_file',
+        '-s',
+        help='File to record the dump checkpoints, defaults to the output file followed by %s' % resume.STATE_SUFFIX
+    )
+
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Resume the dump from the last checkpoint appending to the output file'
+    )
+
+    parser.add_argument(
+        '--processes',
+        '-j',
+        type=int,
+        default=sharding.PROCESSES,
+        help='Number of processes dumping ISSNs in parallel, requires --output_file'
+    )
+
+    parser.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        help='Number of documents retrieved in parallel from Article Meta'
+    )
+
+    parser.add_argument(
+        '--ratchet_workers',
+        type=int,
+        help='Number of access keys retrieved in parallel from Ratchet'
+    )
+
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Report the time and throughput of each processing stage'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -404,6 +606,11 @@ def main():
 
     args = parser.parse_args()
     _config_logging(args.logging_level, args.logging_file)
+    metrics.set_logger(logger)
+
+    if args.profile:
+        profiling.enable(logger)
+
     logger.info('Dumping data for: %s' % args.collection)
  
     issns = None
@@ -418,7 +625,48 @@ def main():
         logger.error('Invalid until date: %s' % args.until_date)
         exit()
 
+    if args.output_format == 'parquet':
+        if not args.output_file or args.processes > 1:
+            logger.error('Parquet output requires an output file and is not available for parallel dumps')
+            exit()
+
+        if output.compression(args.output_file):
+            logger.error('Parquet output is compressed internally, use a .parquet output file')
+            exit()
+
+        if not columnar.is_available():
+            logger.error('Parquet output requires the pyarrow package')
+            exit()
+
+    state_file = None
+    if args.output_file and not output.compression(args.output_file) and \
+        args.output_format != 'parquet' and args.processes == 1:
+        state_file = args.state_file or resume.state_file(args.output_file)
+
+    if args.resume:
+        if not state_file:
+            logger.error('Resume requires an uncompressed CSV or JSON output file and a single process')
+            exit()
+
+        if not os.path.exists(state_file):
+            logger.error('Checkpoint file not found: %s' % state_file)
+            exit()
+
+    if args.processes > 1:
+        if not args.output_file:
+            logger.error('Parallel dump requires an output file')
+            exit()
+
+        sharding.run('accesses.dumpdata', args.collection, issns,
+            args.output_file, args.processes, header=False,
+            from_date=args.from_date, until_date=args.until_date,
+            dayly_granularity=args.dayly_granularity, fmt=args.output_format,
+            workers=args.workers, ratchet_workers=args.ratchet_workers)
+        exit()
+
     dumper = Dumper(args.collection, issns, args.from_date, args.until_date,
-        args.dayly_granularity, args.output_format, args.output_file)
+        args.dayly_granularity, args.output_format, args.output_file, workers=args.workers,
+        ratchet_workers=args.ratchet_workers, state_file=state_file,
+        resume_dump=args.resume)
 
     dumper.run()
@@ -1,7 +1,7 @@
 # coding: utf-8
 import logging
 
-import requests
+import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -42,7 +42,8 @@ class Analytics(object):
 
         try:
             logger.debug('Requesting data to Analytics %s %s' % (url, str(payload)))
-            response = requests.get(url, params=payload, timeout=360)
+            response = metrics.http_get(
+                'analytics.impact_factor', url, params=payload, timeout=360)
         except Exception as e:
             logger.error('Could not retrieve data from Analytics %s %s' % (url, str(payload)))
             return None
@@ -0,0 +1,184 @@
+# coding: utf-8
+"""
+Mede a participação da decodificação JSON em uma execução de
+ArticleMeta.documents() e compara os backends de thrift.decoder sobre os
+mesmos payloads.
+
+Os documentos são recuperados do Articlemeta configurado em
+PROCESSING_SETTINGS_FILE.
+"""
+import time
+import argparse
+import logging
+import threading
+from itertools import islice
+
+import utils
+from thrift import decoder
+
+logger = logging.getLogger(__name__)
+
+LIMIT = 1000
+REPEAT = 3
+
+
+def _config_logging(logging_level='INFO', logging_file=None):
+
+    allowed_levels = {
+        'DEBUG': logging.DEBUG,
+        'INFO': logging.INFO,
+        'WARNING': logging.WARNING,
+        'ERROR': logging.ERROR,
+        'CRITICAL': logging.CRITICAL
+    }
+
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    logger.setLevel(allowed_levels.get(logging_level, 'INFO'))
+
+    if logging_file:
+        hl = logging.FileHandler(logging_file, mode='a')
+    else:
+        hl = logging.StreamHandler()
+
+    hl.setFormatter(formatter)
+    hl.setLevel(allowed_levels.get(logging_level, 'INFO'))
+
+    logger.addHandler(hl)
+
+    return logger
+
+
+class TimedDecoder(object):
+    """
+    Substitui decoder.loads acumulando o tempo gasto e guardando os payloads
+    decodificados.
+    """
+
+    def __init__(self, loads):
+        self._loads = loads
+        self._lock = threading.Lock()
+        self.elapsed = 0.0
+        self.payloads = []
+
+    def __call__(self, data):
+        start = time.time()
+        result = self._loads(data)
+        elapsed = time.time() - start
+
+        with self._lock:
+            self.elapsed += elapsed
+            self.payloads.append(data)
+
+        return result
+
+
+def documents_run(collection, issn=None, limit=LIMIT, workers=None):
+    """
+    Executa ArticleMeta.documents() para até ``limit`` documentos e retorna
+    (tempo total, tempo de decodificação, payloads decodificados).
+    """
+    articlemeta = utils.articlemeta_server(workers=workers)
+    timed = TimedDecoder(decoder.loads)
+    loads = decoder.loads
+
+    decoder.loads = timed
+    try:
+        start = time.time()
+        for document in islice(articlemeta.documents(collection=collection, issn=issn), limit):
+            pass
+        total = time.time() - start
+    finally:
+        decoder.loads = loads
+
+    return total, timed.elapsed, timed.payloads
+
+
+def backends_run(payloads, repeat=REPEAT):
+    """
+    Retorna o menor tempo, entre ``repeat`` execuções, para decodificar todos
+    os ``payloads`` com cada backend disponível.
+    """
+    result = []
+
+    for name in decoder.available_backends():
+        loads = decoder.load_backend(name)
+        timings = []
+        for i in range(repeat):
+            start = time.time()
+            for payload in payloads:
+                loads(payload)
+            timings.append(time.time() - start)
+        result.append((name, min(timings)))
+
+    return result
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark JSON decoding of Article Meta documents'
+    )
+
+    parser.add_argument(
+        'issns',
+        nargs='*',
+        help='ISSN\'s separated by spaces'
+    )
+
+    parser.add_argument(
+        '--collection',
+        '-c',
+        help='Collection Acronym'
+    )
+
+    parser.add_argument(
+        '--limit',
+        '-n',
+        type=int,
+        default=LIMIT,
+        help='Number of documents retrieved'
+    )
+
+    parser.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        help='Number of documents retrieved in parallel from Article Meta'
+    )
+
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=REPEAT,
+        help='Number of decoding rounds for each backend'
+    )
+
+    parser.add_argument(
+        '--logging_file',
+        '-o',
+        help='Full path to the log file'
+    )
+
+    parser.add_argument(
+        '--logging_level',
+        '-l',
+        default='INFO',
+        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+        help='Logggin level'
+    )
+
+    args = parser.parse_args()
+    _config_logging(args.logging_level, args.logging_file)
+
+    issns = utils.ckeck_given_issns(args.issns) or [None]
+
+    total, decoding, payloads = documents_run(
+        args.collection, issns[0], args.limit, args.workers)
+
+    print('documents(): %d payloads in %.3fs' % (len(payloads), total))
+    print('decoding with %s: %.3fs (%.1f%%)' % (
+        decoder.backend, decoding, 100 * decoding / total if total else 0))
+
+    for name, elapsed in backends_run(payloads, args.repeat):
+        print('%-8s %.3fs' % (name, elapsed))
@@ -0,0 +1,156 @@
+# coding: utf-8
+"""
+Compara a extração dos valores da chave natural em export/natural_keys.py
+avaliando as expressões XPath como texto, recompiladas a cada documento, e
+com as expressões pré-compiladas de NATURAL_KEY_PLAN, sobre documentos
+parseados antes das medições.
+
+Compara também a leitura dos documentos, incluída na medição, com o parse
+completo e com a leitura apenas de front (front_tree).
+
+Os documentos são arquivos XML locais.
+"""
+import time
+import argparse
+import logging
+from io import BytesIO
+
+from lxml import etree
+
+from export import natural_keys
+
+logger = logging.getLogger(__name__)
+
+REPEAT = 1000
+
+
+def _config_logging(logging_level='INFO', logging_file=None):
+
+    allowed_levels = {
+        'DEBUG': logging.DEBUG,
+        'INFO': logging.INFO,
+        'WARNING': logging.WARNING,
+        'ERROR': logging.ERROR,
+        'CRITICAL': logging.CRITICAL
+    }
+
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    logger.setLevel(allowed_levels.get(logging_level, 'INFO'))
+
+    if logging_file:
+        hl = logging.FileHandler(logging_file, mode='a')
+    else:
+        hl = logging.StreamHandler()
+
+    hl.setFormatter(formatter)
+    hl.setLevel(allowed_levels.get(logging_level, 'INFO'))
+
+    logger.addHandler(hl)
+
+    return logger
+
+
+class Tree(object):
+    """
+    Expõe o atributo lxml utilizado por natural_key_values, como o
+    packtools.XMLValidator.
+    """
+
+    def __init__(self, path):
+        self.lxml = etree.parse(path)
+
+
+def string_plan():
+    """
+    Plano equivalente à avaliação anterior, com ``parsed_xml.xpath(expression)``.
+    """
+    return [
+        lambda parsed_xml, expression=expression: parsed_xml.xpath(expression)
+        for expression in natural_keys.NATURAL_KEY_XPATHS
+    ]
+
+
+def plan_run(trees, plan, repeat=REPEAT):
+
+    start = time.time()
+    for i in range(repeat):
+        for tree in trees:
+            natural_keys.natural_key_values(tree, plan)
+
+    return time.time() - start
+
+
+def full_parse_run(xmls, repeat=REPEAT):
+
+    start = time.time()
+    for i in range(repeat):
+        for xml in xmls:
+            tree = etree.parse(BytesIO(xml), etree.XMLParser(load_dtd=False, no_network=True))
+            [natural_keys.first_value(xpath, tree) for xpath in natural_keys.NATURAL_KEY_PLAN]
+
+    return time.time() - start
+
+
+def front_run(xmls, repeat=REPEAT):
+
+    start = time.time()
+    for i in range(repeat):
+        for xml in xmls:
+            natural_keys._extract_front((None, xml))
+
+    return time.time() - start
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the natural keys XPath extraction'
+    )
+
+    parser.add_argument(
+        'xml_files',
+        nargs='+',
+        help='XML RSPS files'
+    )
+
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=REPEAT,
+        help='Number of extraction rounds over the given files'
+    )
+
+    parser.add_argument(
+        '--logging_file',
+        '-o',
+        help='Full path to the log file'
+    )
+
+    parser.add_argument(
+        '--logging_level',
+        '-l',
+        default='INFO',
+        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+        help='Logggin level'
+    )
+
+    args = parser.parse_args()
+    _config_logging(args.logging_level, args.logging_file)
+
+    trees = [Tree(path) for path in args.xml_files]
+    xmls = []
+    for path in args.xml_files:
+        with open(path, 'rb') as f:
+            xmls.append(f.read())
+
+    documents = len(trees) * args.repeat
+
+    for name, elapsed in [
+        ('string', plan_run(trees, string_plan(), args.repeat)),
+        ('compiled', plan_run(trees, natural_keys.NATURAL_KEY_PLAN, args.repeat)),
+        ('full parse', full_parse_run(xmls, args.repeat)),
+        ('front', front_run(xmls, args.repeat))
+    ]:
+        print('%-10s %d documents in %.3fs, %.1f documents/s' % (
+            name, documents, elapsed, documents / elapsed if elapsed else 0))
@@ -0,0 +1,183 @@
+# coding: utf-8
+"""
+Compara a vazão (documentos/s) da validação de documentos xmlrsps em
+export/xml_rsps.py:
+
+    legacy: cada validação (DTD e estilo) executada três vezes por documento,
+            como no summarize anterior
+    cached: cada validação executada uma única vez
+    parallel: validação única distribuída em processos
+
+Os documentos são recuperados do Articlemeta configurado em
+PROCESSING_SETTINGS_FILE antes das medições.
+"""
+import time
+import argparse
+import logging
+import multiprocessing
+from itertools import islice
+
+import utils
+from export import xml_rsps
+
+logger = logging.getLogger(__name__)
+
+LIMIT = 200
+PROCESSES = multiprocessing.cpu_count()
+LEGACY_VALIDATIONS = 3
+
+
+def _config_logging(logging_level='INFO', logging_file=None):
+
+    allowed_levels = {
+        'DEBUG': logging.DEBUG,
+        'INFO': logging.INFO,
+        'WARNING': logging.WARNING,
+        'ERROR': logging.ERROR,
+        'CRITICAL': logging.CRITICAL
+    }
+
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    logger.setLevel(allowed_levels.get(logging_level, 'INFO'))
+
+    if logging_file:
+        hl = logging.FileHandler(logging_file, mode='a')
+    else:
+        hl = logging.StreamHandler()
+
+    hl.setFormatter(formatter)
+    hl.setLevel(allowed_levels.get(logging_level, 'INFO'))
+
+    logger.addHandler(hl)
+
+    return logger
+
+
+def fetch_xmls(collection, issn=None, limit=LIMIT, workers=None):
+    """
+    Retorna até ``limit`` pares (código, xml) de documentos xmlrsps.
+    """
+    articlemeta = utils.articlemeta_server(workers=workers)
+    xmls = []
+
+    for document in islice(articlemeta.documents(collection=collection, issn=issn), limit):
+        xml = articlemeta.document(document.publisher_id, document.collection_acronym,
+            fmt='xmlrsps', processing_date=document.processing_date)
+        xmls.append((document.publisher_id, xml or u''))
+
+    return xmls
+
+
+def legacy_run(xmls):
+    """
+    Valida ``xmls`` repetindo as validações como o summarize anterior.
+    """
+    summarize = xml_rsps.summarize
+
+    def legacy_summarize(validator):
+        for i in range(LEGACY_VALIDATIONS - 1):
+            validator.validate()
+            validator.validate_style()
+        return summarize(validator)
+
+    xml_rsps.summarize = legacy_summarize
+    try:
+        return cached_run(xmls)
+    finally:
+        xml_rsps.summarize = summarize
+
+
+def cached_run(xmls):
+
+    start = time.time()
+    for item in xmls:
+        xml_rsps._analyze(item)
+
+    return time.time() - start
+
+
+def parallel_run(xmls, processes=PROCESSES):
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        start = time.time()
+        for result in pool.imap(xml_rsps._analyze, xmls, xml_rsps.CHUNKSIZE):
+            pass
+        elapsed = time.time() - start
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return elapsed
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark XML RSPS validation of Article Meta documents'
+    )
+
+    parser.add_argument(
+        'issns',
+        nargs='*',
+        help='ISSN\'s separated by spaces'
+    )
+
+    parser.add_argument(
+        '--collection',
+        '-c',
+        help='Collection Acronym'
+    )
+
+    parser.add_argument(
+        '--limit',
+        '-n',
+        type=int,
+        default=LIMIT,
+        help='Number of documents validated'
+    )
+
+    parser.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        help='Number of documents retrieved in parallel from Article Meta'
+    )
+
+    parser.add_argument(
+        '--processes',
+        '-j',
+        type=int,
+        default=PROCESSES,
+        help='Number of processes of the parallel validation'
+    )
+
+    parser.add_argument(
+        '--logging_file',
+        '-o',
+        help='Full path to the log file'
+    )
+
+    parser.add_argument(
+        '--logging_level',
+        '-l',
+        default='INFO',
+        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+        help='Logggin level'
+    )
+
+    args = parser.parse_args()
+    _config_logging(args.logging_level, args.logging_file)
+
+    issns = utils.ckeck_given_issns(args.issns) or [None]
+
+    xmls = fetch_xmls(args.collection, issns[0], args.limit, args.workers)
+
+    for name, elapsed in [
+        ('legacy', legacy_run(xmls)),
+        ('cached', cached_run(xmls)),
+        ('parallel(%d)' % args.processes, parallel_run(xmls, args.processes))
+    ]:
+        print('%-12s %d documents in %.3fs, %.1f documents/s' % (
+            name, len(xmls), elapsed, len(xmls) / elapsed if elapsed else 0))
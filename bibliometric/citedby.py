@@ -7,10 +7,13 @@ Formato de saída:
 """
 import argparse
 import logging
-import codecs
-import json
 
 import utils
+import metrics
+import profiling
+import output
+import sharding
+from thrift import decoder
 
 logger = logging.getLogger(__name__)
 
@@ -43,30 +46,35 @@ def _config_logging(logging_level='INFO', logging_file=None):
 
 class Dumper(object):
 
-    def __init__(self, collection, issns=None, output_file=None):
+    def __init__(self, collection, issns=None, output_file=None, workers=None):
 
         self._citedby = utils.citedby_server()
-        self._articlemeta = utils.articlemeta_server()
+        self._articlemeta = utils.articlemeta_server(workers=workers)
         self.collection = collection
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
+        self.output_file = output.CSVWriter(output_file)
         header = [u"PID", u"ISSN", u"título", u"área temática", u"ano de publicação", u"tipo de documento", u"título do documento", u"citado por PID", u"citado por ISSN", u"citado por título", u"citado por título do documento"]
         self.write(','.join(header))
 
     def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def writerows(self, rows):
+        self.output_file.writerows(rows)
+
+    def process(self, data):
+        for item in self.citedby(data.publisher_id):
+            self.output_file.writerow(self.fmt_csv(data, item))
 
     def run(self):
-        for item in self.items():
-            self.write(item)
+        self.writerows(self.items())
+        self.output_file.close()
 
 
     def citedby(self, pid):
         data = self._citedby.citedby_pid(pid, False)
-        dataj = json.loads(data)
+        with profiling.stage('decode'):
+            dataj = decoder.loads(data)
         if isinstance(dataj, dict):
             for item in dataj.get('cited_by', []):
                 yield item
@@ -82,6 +90,7 @@ class Dumper(object):
                 for item in self.citedby(data.publisher_id):
                     yield self.fmt_csv(data, item)
         
+    @profiling.timed('format')
     def fmt_csv(self, data, citedby):
         know_languages = set(['pt', 'es', 'en'])
         languages = set(data.languages())
@@ -102,9 +111,7 @@ class Dumper(object):
         else:
             line.append('')
 
-        joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in line])
-
-        return joined_line
+        return line
 
 def main():
 
@@ -130,6 +137,27 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--processes',
+        '-j',
+        type=int,
+        default=sharding.PROCESSES,
+        help='Number of processes dumping ISSNs in parallel, requires --output_file'
+    )
+
+    parser.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        help='Number of documents retrieved in parallel from Article Meta'
+    )
+
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Report the time and throughput of each processing stage'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -146,12 +174,26 @@ def main():
 
     args = parser.parse_args()
     _config_logging(args.logging_level, args.logging_file)
+    metrics.set_logger(logger)
+
+    if args.profile:
+        profiling.enable(logger)
+
     logger.info('Dumping data for: %s' % args.collection)
 
     issns = None
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
 
-    dumper = Dumper(args.collection, issns, args.output_file)
+    if args.processes > 1:
+        if not args.output_file:
+            logger.error('Parallel dump requires an output file')
+            exit()
+
+        sharding.run('bibliometric.citedby', args.collection, issns,
+            args.output_file, args.processes, workers=args.workers)
+        exit()
+
+    dumper = Dumper(args.collection, issns, args.output_file, workers=args.workers)
 
     dumper.run()
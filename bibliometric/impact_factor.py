@@ -8,9 +8,11 @@ Formato de saída:
 
 import argparse
 import logging
-import codecs
 
 import utils
+import metrics
+import profiling
+import output
 from analytics.client import Analytics
 
 logger = logging.getLogger(__name__)
@@ -49,7 +51,7 @@ class Dumper(object):
         self._analytics = Analytics()
         self.collection = collection
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
+        self.output_file = output.CSVWriter(output_file)
         header = [
             u"issn scielo",
             u"issn impresso",
@@ -67,14 +69,14 @@ class Dumper(object):
         self.write(','.join(header))
 
     def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def writerows(self, rows):
+        self.output_file.writerows(rows)
 
     def run(self):
-        for item in self.items():
-            self.write(item)
+        self.writerows(self.items())
+        self.output_file.close()
         logger.info('Export finished')
 
     def items(self):
@@ -84,10 +86,12 @@ class Dumper(object):
 
         for issn in self.issns:
             for data in self._articlemeta.journals(collection=self.collection, issn=issn):
-                for item in self.fmt_csv(data):
+                impact_factor = self._analytics.impact_factor(data.scielo_issn, self.collection)
+                for item in self.fmt_csv(data, impact_factor):
                     yield item
         
-    def fmt_csv(self, data):
+    @profiling.timed('format')
+    def fmt_csv(self, data, impact_factor):
 
         line = [
             data.scielo_issn,
@@ -97,13 +101,8 @@ class Dumper(object):
             ','.join(data.subject_areas or [])
         ]
 
-        impact_factor = self._analytics.impact_factor(data.scielo_issn, self.collection)
-
         for item in impact_factor or []:
-            l = None
-            l = line + [str(i) for i in item]
-            joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in l])
-            yield joined_line
+            yield line + [str(i) for i in item]
 
 
 def main():
@@ -130,6 +129,12 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Report the time and throughput of each processing stage'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -146,6 +151,11 @@ def main():
 
     args = parser.parse_args()
     _config_logging(args.logging_level, args.logging_file)
+    metrics.set_logger(logger)
+
+    if args.profile:
+        profiling.enable(logger)
+
     logger.info('Dumping data for: %s' % args.collection)
 
     issns = None
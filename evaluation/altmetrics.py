@@ -8,11 +8,12 @@ Formato de saída:
 
 import argparse
 import logging
-import codecs
-import requests
 import urlparse
 
 import utils
+import profiling
+import output
+import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -60,19 +61,19 @@ class Dumper(object):
         self._articlemeta = utils.articlemeta_server()
         self.collection = collection
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
+        self.output_file = output.CSVWriter(output_file)
         header = [u"PID",u"ISSN",u"título",u"área temática",u"ano de publicação",u"tipo de documento",u"título do artigo",u"doi",u"url",u"altmetrics url",u"score"]
         self.write(','.join(header))
 
     def write(self, line):
-        if not self.output_file:
-            print(line)
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def writerows(self, rows):
+        self.output_file.writerows(rows)
 
     def run(self):
-        for item in self.items():
-            self.write(item)
+        self.writerows(self.items())
+        self.output_file.close()
 
     def altmetrics_items_by_journals(self, issn):
 
@@ -87,7 +88,8 @@ class Dumper(object):
             payload['page'] = page
             try:
                 logger.debug('Requesting data to altmetrics %s' % str(payload))
-                response = requests.get(ALTMETRICS_API_URL, params=payload, timeout=10)
+                response = metrics.http_get(
+                    'altmetrics.citations', ALTMETRICS_API_URL, params=payload, timeout=10)
             except Exception as e:
                 logger.error('Could not retrieve data from altmetrics %s' % str(payload))
                 continue
@@ -117,6 +119,7 @@ class Dumper(object):
                 for altmetrics_item in self.altmetrics_items_by_journals(data.scielo_issn):
                     yield self.fmt_csv(data, altmetrics_item)
 
+    @profiling.timed('format')
     def fmt_csv(self, data, altmetrics):
         article = None
         url = altmetrics.get('url', None)
@@ -147,7 +150,7 @@ class Dumper(object):
             str(score) or '0'
         ]
 
-        return ','.join(['"%s"' % i.replace('"', '""') for i in line])
+        return line
 
 
 def main():
@@ -174,6 +177,12 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Report the time and throughput of each processing stage'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -190,6 +199,11 @@ def main():
 
     args = parser.parse_args()
     _config_logging(args.logging_level, args.logging_file)
+    metrics.set_logger(logger)
+
+    if args.profile:
+        profiling.enable(logger)
+
     logger.info('Dumping data for: %s' % args.collection)
 
     issns = None
@@ -6,18 +6,19 @@ nesta fonte de informação.
 import os
 import argparse
 import logging
-import codecs
 import json
 import time
 from io import BytesIO, StringIO
 from datetime import datetime, timedelta
 
-import requests
 from lxml import etree
 
 from doaj.journals import Journals
 
 import utils
+import profiling
+import output
+import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -56,7 +57,7 @@ def request_api(url, timeout=3, attempts=10):
         if attempt == attempts:
             return None
         try:
-            result = requests.get(url, timeout=3)
+            result = metrics.http_get('doaj.search_journals', url, timeout=3)
         except:
             logger.error("Fail to retrieve data from (%s) attempt %d/%d" % (url, attempt, attempts))
             time.sleep(1)
@@ -74,7 +75,7 @@ class Dumper(object):
         self.collection = collection
         self.doaj_journals = Journals()
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
+        self.output_file = output.CSVWriter(output_file)
         header = [u"coleção",u"issn scielo",u"issn impresso",u"issn eletrônico",u"título",u"ID no DOAJ",u"Provider no DOAJ",u"Status no DOAJ"]
         self.write(','.join(header))
 
@@ -106,14 +107,14 @@ class Dumper(object):
         return data
 
     def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def writerows(self, rows):
+        self.output_file.writerows(rows)
 
     def run(self):
-        for item in self.items():
-            self.write(item)
+        self.writerows(self.items())
+        self.output_file.close()
 
     def items(self):
 
@@ -131,6 +132,7 @@ class Dumper(object):
                 in_doaj = self.get_doaj_journal(list(jissns))
                 yield self.fmt_csv(data, in_doaj)
         
+    @profiling.timed('format')
     def fmt_csv(self, data, in_doaj):
 
         line = [
@@ -144,9 +146,7 @@ class Dumper(object):
             in_doaj.get('active', "")
         ]
 
-        joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in line])
-
-        return joined_line
+        return line
 
 def main():
 
@@ -172,6 +172,12 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Report the time and throughput of each processing stage'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -188,6 +194,11 @@ def main():
 
     args = parser.parse_args()
     _config_logging(args.logging_level, args.logging_file)
+    metrics.set_logger(logger)
+
+    if args.profile:
+        profiling.enable(logger)
+
     logger.info('Dumping data for: %s' % args.collection)
 
     issns = None
@@ -0,0 +1,120 @@
+# coding: utf-8
+"""
+Validação dos documentos exportados para o DOAJ contra o XSD doajArticles.
+
+O schema é compilado uma única vez, no processo principal, e os documentos
+são parseados diretamente a partir de bytes. Com mais de um processo os lotes
+de documentos são validados por um pool de processos criado após a
+compilação, que herda o schema compilado.
+"""
+import os
+import logging
+import multiprocessing
+
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+DOAJ_XSD = os.path.join(os.path.dirname(__file__), 'xsd', 'doajArticles.xsd')
+PROCESSES = 1
+CHUNKSIZE = 10
+
+_schema = None
+
+
+def schema():
+    """
+    Retorna o XMLSchema do DOAJ, compilado na primeira chamada do processo.
+    """
+    global _schema
+
+    if _schema is None:
+        _schema = etree.XMLSchema(etree.parse(DOAJ_XSD))
+
+    return _schema
+
+
+def validate_xml(xml):
+    """
+    Valida ``xml`` (bytes ou texto) contra o schema do DOAJ. Retorna
+    (válido, mensagem de erro).
+    """
+    if not xml:
+        return False, 'Empty document'
+
+    try:
+        xml_schema = schema()
+    except Exception as e:
+        return False, 'DOAJ schema not available: %s' % e
+
+    if isinstance(xml, bytes):
+        parser = etree.XMLParser(no_network=True)
+    else:
+        xml = xml.encode('utf-8')
+        parser = etree.XMLParser(no_network=True, encoding='utf-8')
+
+    try:
+        xml_doc = etree.fromstring(xml, parser)
+    except etree.XMLSyntaxError as e:
+        return False, 'XML is not well formed: %s' % e
+
+    if not xml_schema.validate(xml_doc):
+        return False, 'XML is not valid: %s' % xml_schema.error_log.last_error
+
+    return True, None
+
+
+def _validate(item):
+    """
+    Valida um par (código, xml) em um processo do pool.
+    """
+    code, xml = item
+
+    return validate_xml(xml)
+
+
+class SchemaValidator(object):
+
+    def __init__(self, processes=PROCESSES, chunksize=CHUNKSIZE):
+        """
+        Valida lotes de documentos em ``processes`` processos, mantidos
+        entre os lotes. O schema é compilado antes da criação do pool; se a
+        compilação falhar (o XSD importa um schema remoto do DOAJ) nenhum
+        processo é criado e todos os documentos são dados como inválidos.
+        """
+        self.processes = processes or PROCESSES
+        self.chunksize = chunksize
+        self.error = None
+        self._pool = None
+
+        try:
+            schema()
+        except Exception as e:
+            logger.exception(e)
+            logger.error('Fail to parse DOAJ schema')
+            self.error = 'DOAJ schema not available: %s' % e
+            return
+
+        if self.processes > 1:
+            self._pool = multiprocessing.Pool(self.processes)
+
+    def validate(self, items):
+        """
+        Retorna (válido, mensagem de erro) para cada par (código, xml) de
+        ``items``, na mesma ordem.
+        """
+        if self.error:
+            return [(False, self.error) for item in items]
+
+        if self._pool is None:
+            return [_validate(item) for item in items]
+
+        return self._pool.map(_validate, items, self.chunksize)
+
+    def close(self):
+        if self._pool is None:
+            return
+
+        self._pool.close()
+        self._pool.join()
+        self._pool = None
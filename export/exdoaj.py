@@ -8,19 +8,23 @@ import logging
 import codecs
 import json
 import requests
-from io import BytesIO, StringIO
+from itertools import islice
 from datetime import datetime, timedelta
 
-from lxml import etree
-
 from doaj.articles import Articles
 
 import utils
+import metrics
+import profiling
+import resume
+from export import validation, doaj_validation
 
 FROM = datetime.now() - timedelta(days=30)
 FROM = FROM.isoformat()[:10]
 
-DOAJ_XSD = open(os.path.dirname(__file__)+'/xsd/doajArticles.xsd', 'r').read()
+BATCH_SIZE = 100
+PROCESSES = doaj_validation.PROCESSES
+
 logger = logging.getLogger(__name__)
 
 def _config_logging(logging_level='INFO', logging_file=None):
@@ -53,16 +57,20 @@ def _config_logging(logging_level='INFO', logging_file=None):
 class Dumper(object):
 
     def __init__(self, collection, issns=None, output_file=None, from_date=FROM, 
-        user=None, password=None, api_token=None):
+        user=None, password=None, api_token=None, workers=None, state_file=None,
+        resume_export=False, processes=PROCESSES):
 
-        self._articlemeta = utils.articlemeta_server()
+        self._articlemeta = utils.articlemeta_server(workers=workers)
         self.collection = collection
         self.from_date = from_date
         self.user = user
         self.password = password
         self.issns = issns or [None]
+        self.workers = workers or utils.articlemeta_workers()
+        self.checkpoint = resume.Checkpoint(state_file) if state_file else None
+        self.state = self.checkpoint.read() if self.checkpoint and resume_export else None
         self.session = self.authenticated_session()
-        self.parse_schema()
+        self.validator = doaj_validation.SchemaValidator(processes)
         self.doaj_articles = Articles(usertoken=api_token)
 
 
@@ -123,18 +131,6 @@ class Dumper(object):
         if document.doi:
             return self._doaj_id_by_doi(document.doi)
 
-    def parse_schema(self):
-        xsd = BytesIO(DOAJ_XSD.encode('utf-8'))
-        try:
-            sch_doc = etree.parse(xsd)
-            sch = etree.XMLSchema(sch_doc)
-        except Exception as e:
-            logger.exception(e)
-            logger.error('Fail to parse XML')
-            return False
-        
-        self.doaj_schema = sch
-
     def authenticated_session(self):
         auth_url = 'https://doaj.org/account/login'
         login = {'username': self.user, 'password': self.password}
@@ -158,26 +154,6 @@ class Dumper(object):
 
         return session
 
-    def xml_is_valid(self, xml):
-        
-        try: 
-            xml = StringIO(xml)
-            xml_doc = etree.parse(xml)
-            logger.debug('XML is well formed')
-        except Exception as e:
-            logger.exception(e)
-            logger.error('Fail to parse XML')
-            return False
-
-        try:
-            result = self.doaj_schema.assertValid(xml_doc)
-            logger.debug('XML is valid')
-            return True
-        except Exception as e:
-            logger.exception(e)
-            logger.error('Fail to parse XML')
-            return False
-
     def send_xml(self, file_name, file_data):
         files = {'file': (file_name, file_data)}
 
@@ -201,38 +177,82 @@ class Dumper(object):
 
     def run(self):
         if not self.session:
+            self.validator.close()
             return None
 
-        for issn in self.issns:
-            for document in self._articlemeta.documents(collection=self.collection, issn=issn, from_date=self.from_date):
-                logger.info('Reading document: %s_%s' % (document.publisher_id, document.collection_acronym))
+        documents = resume.documents(self._articlemeta, self.issns, self.state,
+            collection=self.collection, from_date=self.from_date)
 
-                if document.data.get('doaj_id', None):
-                    logger.debug('Document already available in DOAJ: %s_%s' % (document.publisher_id, document.collection_acronym))
-                    continue
+        try:
+            while True:
+                batch = list(islice(documents, BATCH_SIZE))
+                if not batch:
+                    break
+                self.export_batch(batch)
+        finally:
+            self.validator.close()
+
+        if self.checkpoint:
+            self.checkpoint.remove()
+
+    def export_batch(self, batch):
+        """
+        Exporta os documentos de ``batch``, uma lista de (issn, offset,
+        documento). O XML dos documentos ainda não disponíveis no DOAJ é
+        recuperado em paralelo e validado de uma só vez pelo validator; o
+        envio segue a ordem dos documentos e o checkpoint é registrado ao
+        final do lote.
+        """
+        pending = [document for issn, offset, document in batch if self.pending(document)]
+
+        xmls = list(validation.fetch_xmls(self._articlemeta, pending, 'xmldoaj', self.workers))
+        results = self.validator.validate(
+            [(document.publisher_id, xml) for document, xml in xmls])
+        exported = dict(
+            (document.publisher_id, (xml, result)) for (document, xml), result in zip(xmls, results))
+
+        for issn, offset, document in batch:
+            if document.publisher_id in exported:
+                xml, result = exported[document.publisher_id]
+                self.send_document(document, xml, result)
+
+        if self.checkpoint:
+            issn, offset, document = batch[-1]
+            self.checkpoint.commit(issn, offset, document.publisher_id)
+
+    def pending(self, document):
+        """
+        Indica se o documento ainda não está disponível no DOAJ. Documentos
+        encontrados no DOAJ têm o id registrado no Article Meta.
+        """
+        logger.info('Reading document: %s_%s' % (document.publisher_id, document.collection_acronym))
+
+        if document.data.get('doaj_id', None):
+            logger.debug('Document already available in DOAJ: %s_%s' % (document.publisher_id, document.collection_acronym))
+            return False
 
-                doaj_id = self._doaj_id(document)
+        doaj_id = self._doaj_id(document)
 
-                if doaj_id:
-                    logger.debug('Document already available in DOAJ, setting id on Article Meta for: %s_%s' % (document.publisher_id, document.collection_acronym))
-                    self._articlemeta.set_doaj_id(document.publisher_id, document.collection_acronym, doaj_id)
-                    continue
+        if doaj_id:
+            logger.debug('Document already available in DOAJ, setting id on Article Meta for: %s_%s' % (document.publisher_id, document.collection_acronym))
+            self._articlemeta.set_doaj_id(document.publisher_id, document.collection_acronym, doaj_id)
+            return False
+
+        return True
 
-                try:
-                    xml = self._articlemeta.document(document.publisher_id, document.collection_acronym, fmt='xmldoaj')
-                except Exception as e:
-                    logger.exception(e)
-                    logger.error('Fail to read document: %s_%s' % (document.publisher_id, document.collection_acronym))
-                    xml = u''
+    def send_document(self, document, xml, result):
+        is_valid, error = result
 
-                if not self.xml_is_valid(xml):
-                    logger.error('Fail to parse xml document: %s_%s' % (document.publisher_id, document.collection_acronym))
-                    continue
+        if not is_valid:
+            logger.error(error)
+            logger.error('Fail to parse xml document: %s_%s' % (document.publisher_id, document.collection_acronym))
+            return
 
-                logger.info('Sending document: %s_%s' % (document.publisher_id, document.collection_acronym))
-                filename = '%s_%s.xml' % (document.publisher_id, document.collection_acronym)
+        logger.info('Sending document: %s_%s' % (document.publisher_id, document.collection_acronym))
+        filename = '%s_%s.xml' % (document.publisher_id, document.collection_acronym)
+
+        self.send_xml(filename, xml)
 
-                self.send_xml(filename, xml)
 
 def main():
 
@@ -280,6 +300,39 @@ def main():
         help='ISO date like %s' % FROM
     )
 
+    parser.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        help='Number of documents retrieved in parallel from Article Meta'
+    )
+
+    parser.add_argument(
+        '--processes',
+        '-j',
+        type=int,
+        default=PROCESSES,
+        help='Number of processes validating documents in parallel'
+    )
+
+    parser.add_argument(
+        '--state_file',
+        '-s',
+        help='File to record the export checkpoints'
+    )
+
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Resume the export from the last checkpoint recorded in --state_file'
+    )
+
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Report the time and throughput of each processing stage'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -296,6 +349,11 @@ def main():
 
     args = parser.parse_args()
     _config_logging(args.logging_level, args.logging_file)
+    metrics.set_logger(logger)
+
+    if args.profile:
+        profiling.enable(logger)
+
     logger.info('Dumping data for: %s' % args.collection)
 
     issns = None
@@ -312,8 +370,13 @@ def main():
     else:
         issns = issns_from_file if issns_from_file else []
 
+    if args.resume and not (args.state_file and os.path.exists(args.state_file)):
+        logger.error('Resume requires an existing --state_file')
+        exit()
+
     dumper = Dumper(
         args.collection, issns, from_date=args.from_date, user=args.user,
-        password=args.password)
+        password=args.password, workers=args.workers, state_file=args.state_file,
+        resume_export=args.resume, processes=args.processes)
 
     dumper.run()
@@ -7,9 +7,11 @@ Formato de saída:
 """
 import argparse
 import logging
-import codecs
 
 import utils
+import metrics
+import profiling
+import output
 
 logger = logging.getLogger(__name__)
 
@@ -49,7 +51,7 @@ class Dumper(object):
         self._publicationstats = utils.publicationstats_server()
         self.collection = collection
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
+        self.output_file = output.CSVWriter(output_file)
         header = [
             u"Título do Periódico (publication_title)",
             u"ISSN impresso (print_identifier)",
@@ -104,14 +106,14 @@ class Dumper(object):
         return document
 
     def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def writerows(self, rows):
+        self.output_file.writerows(rows)
 
     def run(self):
-        for item in self.items():
-            self.write(item)
+        self.writerows(self.items())
+        self.output_file.close()
 
     def items(self):
 
@@ -123,6 +125,7 @@ class Dumper(object):
                 logger.debug('Reading document: %s' % data.scielo_issn)
                 yield self.fmt_csv(data)
         
+    @profiling.timed('format')
     def fmt_csv(self, data):
         line = []
 
@@ -157,9 +160,7 @@ class Dumper(object):
         line.append('') # preceding_publication_title_id
         line.append('F') # access_type
 
-        joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in line])
-
-        return joined_line
+        return line
 
 def main():
 
@@ -185,6 +186,12 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Report the time and throughput of each processing stage'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -201,6 +208,11 @@ def main():
 
     args = parser.parse_args()
     _config_logging(args.logging_level, args.logging_file)
+    metrics.set_logger(logger)
+
+    if args.profile:
+        profiling.enable(logger)
+
     logger.info('Dumping data for: %s' % args.collection)
 
     issns = None
@@ -10,19 +10,27 @@ Formato de saída:
 import os
 import argparse
 import logging
-import codecs
 import json
 
-from io import StringIO
+from io import StringIO, BytesIO
 
+from lxml import etree
 import packtools
 from packtools.catalogs import XML_CATALOG
 
 import utils
+import metrics
+import profiling
+import output
+from export import validation
 
 os.environ['XML_CATALOG_FILES'] = XML_CATALOG
 logger = logging.getLogger(__name__)
 
+PROCESSES = validation.PROCESSES
+PARSER = 'stream'
+PARSERS = ['stream', 'packtools']
+
 def _config_logging(logging_level='INFO', logging_file=None):
 
     allowed_levels = {
@@ -50,91 +58,182 @@ def _config_logging(logging_level='INFO', logging_file=None):
     return logger
 
 
-class Dumper(object):
+def parse(xml):
+
+    f = StringIO(xml)
+
+    try:
+        tree = packtools.XMLValidator(f)
+    except Exception as e:
+        logger.exception(e)
+        logger.error('Fail to parse XML')
+        tree = None
+
+    return tree
+
+
+# Expressões dos valores que compõem a chave natural: título do periódico,
+# volume, número, ano, primeira página, sequência da primeira página, última
+# página, e-location e id ahead of print.
+NATURAL_KEY_XPATHS = [
+    '/article/front/journal-meta/journal-title-group/journal-title',
+    '/article/front/article-meta/volume',
+    '/article/front/article-meta/issue',
+    '/article/front/article-meta/pub-date/year',
+    '/article/front/article-meta/fpage',
+    '/article/article/front/article-meta/fpage/@seq',
+    '/article/front/article-meta/lpage',
+    '/article/front/article-meta/elocation',
+    '/article/front/article-meta/article-id[@pub-id-type="other"]'
+]
+
+# Expressões compiladas uma única vez por processo e reutilizadas em todos os
+# documentos.
+NATURAL_KEY_PLAN = [etree.XPath(expression) for expression in NATURAL_KEY_XPATHS]
+
+
+def first_value(xpath, parsed_xml):
+    """
+    Retorna o texto (ou valor do atributo) da primeira ocorrência de
+    ``xpath`` em ``parsed_xml``, sem espaços nas extremidades.
+    """
+    try:
+        first_occ = xpath(parsed_xml)[0]
+    except IndexError:
+        return None
+
+    try:
+        value = first_occ.text
+    except AttributeError:
+        # valor de atributo
+        value = first_occ
+
+    try:
+        return value.strip()
+    except AttributeError:
+        return value
+
+
+def natural_key_values(xml_etree, plan=NATURAL_KEY_PLAN):
+    """
+    Retorna os valores do XML que compõem a chave natural, na ordem de
+    NATURAL_KEY_XPATHS.
+    """
+    parsed_xml = xml_etree.lxml
+
+    return [first_value(xpath, parsed_xml) for xpath in plan]
+
+
+def front_tree(xml):
+    """
+    Retorna uma árvore com o elemento article contendo apenas front,
+    interrompendo a leitura do XML ao final de front, sem carregar DTD e sem
+    acesso à rede. Retorna None se o XML não puder ser lido até front ou se
+    front contiver entidades que dependem da DTD para serem resolvidas.
+    """
+    if not xml:
+        return None
+
+    data = xml if isinstance(xml, bytes) else xml.encode('utf-8')
+    encoding = None if isinstance(xml, bytes) else 'utf-8'
+
+    context = etree.iterparse(
+        BytesIO(data), events=('end',), tag='front', encoding=encoding,
+        load_dtd=False, no_network=True, resolve_entities=False)
+
+    try:
+        for event, element in context:
+            if any(isinstance(node, etree._Entity) for node in element.iter()):
+                return None
 
-    def __init__(self, collection, issns=None, output_file=None):
+            root = element.getparent()
 
-        self._articlemeta = utils.articlemeta_server()
-        self.collection = collection
-        self.issns = issns or [None]
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
-        header = [u"coleção", u"pid", u"título", u"volume", u"número", u"ano de publicação", u"primeira página","primeria página seq" u"última página", u"e-location", "ahead of print id", u"chave"]
-        self.write(','.join(header))
+            if root is None:
+                return etree.ElementTree(element)
 
-    def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+            # O parser lê o XML em blocos, então o início de body pode já
+            # ter sido lido.
+            for sibling in list(element.itersiblings()):
+                root.remove(sibling)
 
-    def fmt_json(self, data, xml_etree):
+            return etree.ElementTree(root)
+    except etree.XMLSyntaxError:
+        return None
 
-        parsed_xml = xml_etree.lxml
+    return None
 
-        def get_value(expression):
-            try:
-                first_occ = parsed_xml.xpath(expression)[0]
-            except IndexError:
-                return None
 
-            try:
-                value = first_occ.text
-            except AttributeError:
-                # valor de atributo
-                value = first_occ
+def _extract(item):
+    """
+    Extrai os valores da chave natural de um par (código, xml), em um
+    processo do pool de validação. Retorna None para XML inválido.
+    """
+    code, xml = item
+
+    tree = parse(xml)
+
+    if tree is None:
+        return None
+
+    return natural_key_values(tree)
+
 
-            try:
-                return value.strip()
-            except AttributeError:
-                return value
+def _extract_front(item):
+    """
+    Como _extract, lendo apenas front do XML. Documentos que não podem ser
+    lidos dessa forma são parseados por completo com o packtools.
+    """
+    code, xml = item
 
-        line = []
+    tree = front_tree(xml)
 
-        journal_title = get_value('/article/front/journal-meta/journal-title-group/journal-title')
-        volume = get_value('/article/front/article-meta/volume')
-        issue = get_value('/article/front/article-meta/issue')
-        year = get_value('/article/front/article-meta/pub-date/year')
-        fpage = get_value('/article/front/article-meta/fpage')
-        fpage_seq = get_value('/article/article/front/article-meta/fpage/@seq')
-        lpage = get_value('/article/front/article-meta/lpage')
-        elocation = get_value('/article/front/article-meta/elocation')
-        aop_id = get_value('/article/front/article-meta/article-id[@pub-id-type="other"]')
+    if tree is None:
+        logger.debug('Could not stream the front of %s, parsing the full document' % code)
+        return _extract(item)
+
+    return [first_value(xpath, tree) for xpath in NATURAL_KEY_PLAN]
+
+
+class Dumper(object):
+
+    def __init__(self, collection, issns=None, output_file=None, workers=None,
+        processes=PROCESSES, parser=PARSER):
+
+        self._articlemeta = utils.articlemeta_server(workers=workers)
+        self.collection = collection
+        self.issns = issns or [None]
+        self.workers = workers or utils.articlemeta_workers()
+        self.processes = processes or PROCESSES
+        self.extract = _extract_front if parser == 'stream' else _extract
+        self.output_file = output.CSVWriter(output_file)
+        header = [u"coleção", u"pid", u"título", u"volume", u"número", u"ano de publicação", u"primeira página","primeria página seq" u"última página", u"e-location", "ahead of print id", u"chave"]
+        self.write(','.join(header))
+
+    def write(self, line):
+        self.output_file.write(line)
 
+    def writerows(self, rows):
+        self.output_file.writerows(rows)
+
+    @profiling.timed('format')
+    def fmt_json(self, data, values):
 
         line = [
             data.collection_acronym,
-            data.publisher_id,
-            journal_title if journal_title else '',
-            volume if volume else '',
-            issue if issue else '',
-            year if year else '',
-            fpage if fpage else '',
-            fpage_seq if fpage_seq else '',
-            lpage if lpage else '',
-            elocation if elocation else '',
-            aop_id if aop_id else ''
+            data.publisher_id
         ]
 
+        line.extend(value if value else '' for value in values)
+
         natural_key = self.build_key(line[2:])
 
         line.append(natural_key)
 
-        joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in line])
-
-        return joined_line
+        return line
 
     def parse(self, xml):
-        
-        f = StringIO(xml)
-        
-        try:
-            tree = packtools.XMLValidator(f)
-        except Exception as e:
-            logger.exception(e)
-            logger.error('Fail to parse XML')
-            tree = None
-
-        return tree
+
+        return parse(xml)
 
     def build_key(self, data):
 
@@ -144,25 +243,31 @@ class Dumper(object):
 
         return utils.call_django_slugify(joined_values)
 
-    def run(self):
+    def write_document(self, document, values):
+
+        if values is None:
+            logger.error('Fail to parse xml document: %s_%s' % (document.publisher_id, document.collection_acronym))
+            return
+
+        self.output_file.writerow(self.fmt_json(document, values))
+
+    def process(self, document):
+        xml = validation.fetch_xml(self._articlemeta, document)
+        self.write_document(document, self.extract((document.publisher_id, xml)))
+
+    def documents(self):
         for issn in self.issns:
             for document in self._articlemeta.documents(collection=self.collection, issn=issn):
-                logger.debug('Reading document: %s' % document.publisher_id)
+                yield document
 
-                try:
-                    xml = self._articlemeta.document(document.publisher_id, document.collection_acronym, fmt='xmlrsps')
-                except Exception as e:
-                    logger.exception(e)
-                    logger.error('Fail to read document: %s_%s' % (document.publisher_id, document.collection_acronym))
-                    xml = u''
+    def run(self):
+        items = validation.fetch_xmls(
+            self._articlemeta, self.documents(), 'xmlrsps', self.workers)
 
-                et = self.parse(xml)
+        for document, values in validation.process_xmls(self.extract, items, self.processes):
+            self.write_document(document, values)
 
-                if not et:
-                    logger.error('Fail to parse xml document: %s_%s' % (document.publisher_id, document.collection_acronym))
-                    continue
-                
-                self.write(self.fmt_json(document, et))
+        self.output_file.close()
 
 
 def main():
@@ -189,6 +294,34 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        help='Number of documents retrieved in parallel from Article Meta'
+    )
+
+    parser.add_argument(
+        '--processes',
+        '-j',
+        type=int,
+        default=PROCESSES,
+        help='Number of processes parsing documents in parallel'
+    )
+
+    parser.add_argument(
+        '--parser',
+        default=PARSER,
+        choices=PARSERS,
+        help='Read only the XML front (stream) or the full document with packtools'
+    )
+
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Report the time and throughput of each processing stage'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -205,12 +338,18 @@ def main():
 
     args = parser.parse_args()
     _config_logging(args.logging_level, args.logging_file)
+    metrics.set_logger(logger)
+
+    if args.profile:
+        profiling.enable(logger)
+
     logger.info('Dumping data for: %s' % args.collection)
 
     issns = None
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
 
-    dumper = Dumper(args.collection, issns, args.output_file)
+    dumper = Dumper(args.collection, issns, args.output_file, workers=args.workers,
+        processes=args.processes, parser=args.parser)
 
     dumper.run()
\ No newline at end of file
@@ -6,8 +6,10 @@ Formato de saída:
 """
 import argparse
 import logging
-import codecs
 import utils
+import metrics
+import profiling
+import output
 from choices import ISO_3166_COUNTRY_AS_KEY
 
 logger = logging.getLogger(__name__)
@@ -41,10 +43,10 @@ def _config_logging(logging_level='INFO', logging_file=None):
 
 class Dumper(object):
 
-    def __init__(self, collection, issns=None, output_file=None, not_normalized=True):
+    def __init__(self, collection, issns=None, output_file=None, not_normalized=True, workers=None):
 
         self._ratchet = utils.ratchet_server()
-        self._articlemeta = utils.articlemeta_server()
+        self._articlemeta = utils.articlemeta_server(workers=workers)
         self.collection = collection
         self.issns = issns
         self.output_file = output_file
@@ -57,21 +59,16 @@ class Dumper(object):
         if not self.issns:
             self.issns = [None]
 
-        if not self.output_file:
-            print('%s\r\n' % ','.join(header))
-            for issn in self.issns:
-                for data in self.get_data(issn=issn):
-                    for item in self.fmt_csv(data):
-                        print(item)
-            exit()
-
-        with codecs.open(self.output_file, 'w', encoding='utf-8') as f:
-            f.write('%s\r\n' % ','.join(header))
-            for issn in self.issns:
-                for data in self.get_data(issn=issn):
-                    for item in self.fmt_csv(data):
-                        f.write('%s\r\n' % item)
+        writer = output.CSVWriter(self.output_file)
+        writer.write(','.join(header))
+
+        for issn in self.issns:
+            for data in self.get_data(issn=issn):
+                writer.writerows(self.fmt_csv(data))
+
+        writer.close()
         
+    @profiling.timed('format')
     def fmt_csv(self, data):
 
         line = [
@@ -84,8 +81,7 @@ class Dumper(object):
         ]
 
         if len(data.mixed_affiliations) == 0:
-            joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in line+['0']])
-            yield joined_line
+            yield line+['0']
 
         original_aff = {aff['index']:aff for aff in data.affiliations or []}
         normalized_aff = {aff['index']:aff for aff in data.normalized_affiliations or []}
@@ -118,8 +114,7 @@ class Dumper(object):
                 normalized_state
             ]
 
-            joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in line+aff_line])
-            yield joined_line
+            yield line+aff_line
 
     def get_data(self, issn):
         for document in self._articlemeta.documents(collection=self.collection, issn=issn):
@@ -158,6 +153,19 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        help='Number of documents retrieved in parallel from Article Meta'
+    )
+
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Report the time and throughput of each processing stage'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -174,12 +182,17 @@ def main():
 
     args = parser.parse_args()
     _config_logging(args.logging_level, args.logging_file)
+    metrics.set_logger(logger)
+
+    if args.profile:
+        profiling.enable(logger)
+
     logger.info('Dumping data for: %s' % args.collection)
 
     issns = None
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
 
-    dumper = Dumper(args.collection, issns, args.output_file, args.not_normalized)
+    dumper = Dumper(args.collection, issns, args.output_file, args.not_normalized, workers=args.workers)
 
     dumper.run()
@@ -0,0 +1,91 @@
+# coding: utf-8
+"""
+Pipeline de processamento dos XML exportados.
+
+O XML dos documentos é recuperado do Articlemeta por um grupo de threads
+(trabalho de rede) e entregue a um pool de processos que executa o trabalho
+de CPU com lxml/packtools (parsing, validação e extração), devolvendo apenas
+resumos compactos ao processo principal. Enquanto os processos validam um
+lote, as threads já recuperam os documentos seguintes.
+"""
+import logging
+import multiprocessing
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+from thrift.clients import ordered_map
+
+logger = logging.getLogger(__name__)
+
+THREADS = 1
+PROCESSES = 1
+CHUNKSIZE = 10
+
+
+def fetch_xml(articlemeta, document, fmt='xmlrsps'):
+    """
+    Retorna o XML do ``document`` no formato ``fmt``. Falhas de leitura
+    resultam em xml vazio.
+    """
+    try:
+        xml = articlemeta.document(document.publisher_id, document.collection_acronym, fmt=fmt,
+            processing_date=document.processing_date)
+    except Exception as e:
+        logger.exception(e)
+        logger.error('Fail to read document: %s_%s' % (document.publisher_id, document.collection_acronym))
+        xml = u''
+
+    logger.debug('Reading document: %s' % document.publisher_id)
+
+    return xml
+
+
+def fetch_xmls(articlemeta, documents, fmt='xmlrsps', threads=THREADS):
+    """
+    Gera (documento, xml) para os ``documents``, na mesma ordem, recuperando
+    o XML de até ``threads`` documentos em paralelo. Falhas de leitura
+    resultam em xml vazio.
+    """
+
+    def fetch(document):
+        return document, fetch_xml(articlemeta, document, fmt)
+
+    threads = max(threads or THREADS, 1)
+    executor = ThreadPool(threads)
+    try:
+        for item in ordered_map(executor, fetch, documents, threads * 2):
+            yield item
+    finally:
+        executor.terminate()
+
+
+def process_xmls(func, items, processes=PROCESSES, chunksize=CHUNKSIZE):
+    """
+    Gera (documento, resultado) aplicando ``func`` aos pares (código, xml)
+    dos pares (documento, xml) de ``items``, na mesma ordem. Com mais de um
+    processo ``func`` deve ser uma função de módulo (serializável) e é
+    executada pelos processos do pool.
+    """
+    if processes is None or processes <= 1:
+        for document, xml in items:
+            yield document, func((document.publisher_id, xml))
+        return
+
+    documents = deque()
+
+    def tasks():
+        for document, xml in items:
+            documents.append(document)
+            yield document.publisher_id, xml
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap(func, tasks(), chunksize):
+            yield documents.popleft(), result
+    except:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
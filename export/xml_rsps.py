@@ -14,10 +14,16 @@ import packtools
 from packtools.catalogs import XML_CATALOG
 
 import utils
+import metrics
+import profiling
+from export import validation
 
 os.environ['XML_CATALOG_FILES'] = XML_CATALOG
 logger = logging.getLogger(__name__)
 
+PROCESSES = validation.PROCESSES
+CHUNKSIZE = validation.CHUNKSIZE
+
 def _config_logging(logging_level='INFO', logging_file=None):
 
     allowed_levels = {
@@ -44,8 +50,39 @@ def _config_logging(logging_level='INFO', logging_file=None):
 
     return logger
 
+class CachedValidator(object):
+    """
+    Envolve um packtools.XMLValidator executando as validações de DTD e de
+    estilo uma única vez e reutilizando os resultados nas chamadas seguintes.
+    """
+
+    def __init__(self, validator):
+        self._validator = validator
+        self._dtd_result = None
+        self._style_result = None
+
+    def __getattr__(self, attr):
+
+        return getattr(self._validator, attr)
+
+    def validate(self):
+        if self._dtd_result is None:
+            self._dtd_result = self._validator.validate()
+
+        return self._dtd_result
+
+    def validate_style(self):
+        if self._style_result is None:
+            self._style_result = self._validator.validate_style()
+
+        return self._style_result
+
+
 def summarize(validator):
 
+    if not isinstance(validator, CachedValidator):
+        validator = CachedValidator(validator)
+
     def _make_err_message(err):
         """ An error message is comprised of the message itself and the
         element sourceline.
@@ -74,13 +111,13 @@ def summarize(validator):
         'sps_errors': [_make_err_message(err) for err in sps_errors],
     }
 
-    summary['dtd_is_valid'] = validator.validate()[0]
-    summary['sps_is_valid'] = validator.validate_style()[0]
-    summary['is_valid'] = bool(validator.validate()[0] and validator.validate_style()[0])
+    summary['dtd_is_valid'] = dtd_is_valid
+    summary['sps_is_valid'] = sps_is_valid
+    summary['is_valid'] = bool(dtd_is_valid and sps_is_valid)
 
     return summary
 
-def analyze_xml(xml, document):
+def analyze_xml(xml, code):
     """Analyzes `file` against packtools' XMLValidator.
     """
 
@@ -89,7 +126,7 @@ def analyze_xml(xml, document):
     try:
         xml = packtools.XMLValidator(f)
     except:
-        logger.error('Could not read file %s' % document.publisher_id)
+        logger.error('Could not read file %s' % code)
         summary = {}
         summary['dtd_is_valid'] = False
         summary['sps_is_valid'] = False
@@ -101,14 +138,26 @@ def analyze_xml(xml, document):
         return summary
 
 
+def _analyze(item):
+    """
+    Valida um par (código, xml) em um processo do pool de validação.
+    """
+    code, xml = item
+
+    return analyze_xml(xml, code)
+
+
 class Dumper(object):
 
-    def __init__(self, collection, issns=None):
+    def __init__(self, collection, issns=None, workers=None, processes=PROCESSES):
 
-        self._articlemeta = utils.articlemeta_server()
+        self._articlemeta = utils.articlemeta_server(workers=workers)
         self.collection = collection
         self.issns = issns or [None]
+        self.workers = workers or utils.articlemeta_workers()
+        self.processes = processes or PROCESSES
 
+    @profiling.timed('format')
     def fmt_json(self, data, xml_result):
 
         fmt = {}
@@ -123,18 +172,29 @@ class Dumper(object):
         fmt.update(xml_result)
         return json.dumps(fmt)
 
-    def run(self):
+    def documents(self):
         for issn in self.issns:
             for document in self._articlemeta.documents(collection=self.collection, issn=issn):
-                try:
-                    xml = self._articlemeta.document(document.publisher_id, document.collection_acronym, fmt='xmlrsps')
-                except Exception as e:
-                    logger.exception(e)
-                    logger.error('Fail to read document: %s_%s' % (document.publisher_id, document.collection_acronym))
-                    xml = u''
-                logger.debug('Reading document: %s' % document.publisher_id)
-                validation_result = analyze_xml(xml, document)
-                print(self.fmt_json(document, validation_result))
+                yield document
+
+    def xmls(self):
+
+        return validation.fetch_xmls(
+            self._articlemeta, self.documents(), 'xmlrsps', self.workers)
+
+    def validations(self, items):
+        """
+        Gera (documento, resultado da validação) para os pares (documento,
+        xml) de ``items``, na mesma ordem, validando em ``processes``
+        processos.
+        """
+
+        return validation.process_xmls(
+            _analyze, items, self.processes, CHUNKSIZE)
+
+    def run(self):
+        for document, validation_result in self.validations(self.xmls()):
+            print(self.fmt_json(document, validation_result))
 
 
 def main():
@@ -155,6 +215,27 @@ def main():
         help='Collection Acronym'
     )
 
+    parser.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        help='Number of documents retrieved in parallel from Article Meta'
+    )
+
+    parser.add_argument(
+        '--processes',
+        '-j',
+        type=int,
+        default=PROCESSES,
+        help='Number of processes validating documents in parallel'
+    )
+
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Report the time and throughput of each processing stage'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -171,12 +252,18 @@ def main():
 
     args = parser.parse_args()
     _config_logging(args.logging_level, args.logging_file)
+    metrics.set_logger(logger)
+
+    if args.profile:
+        profiling.enable(logger)
+
     logger.info('Dumping data for: %s' % args.collection)
 
     issns = None
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
 
-    dumper = Dumper(args.collection, issns)
+    dumper = Dumper(args.collection, issns, workers=args.workers,
+        processes=args.processes)
 
     dumper.run()
\ No newline at end of file
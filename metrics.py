@@ -0,0 +1,328 @@
+# coding: utf-8
+"""
+Métricas das requisições aos serviços externos (thrift e HTTP).
+
+Cada endpoint acumula um histograma de latência, o total de bytes recebidos,
+o número de erros e o número de requisições em andamento. As métricas podem
+ser registradas periodicamente no log e exportadas em um arquivo no formato
+texto do Prometheus, regravado a cada intervalo e ao final da execução. O
+registro no log utiliza o logger informado pelo processamento em set_logger,
+ou o logger deste módulo.
+
+Os bytes são contabilizados apenas para respostas textuais (payloads JSON e
+XML dos serviços thrift e corpo das respostas HTTP).
+"""
+import os
+import sys
+import time
+import atexit
+import logging
+import threading
+from bisect import bisect_left
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Limites superiores, em segundos, das faixas do histograma de latência.
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+LOG_INTERVAL = 60
+PREFIX = 'processing'
+
+PY2 = sys.version_info[0] == 2
+TEXT_TYPES = (str, unicode) if PY2 else (str, bytes)
+
+
+def payload_size(value):
+
+    return len(value) if isinstance(value, TEXT_TYPES) else 0
+
+
+class Endpoint(object):
+
+    def __init__(self, name, buckets=BUCKETS):
+        self.name = name
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.calls = 0
+        self.errors = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def quantile(self, q):
+        """
+        Limite superior da faixa do histograma que contém o quantil ``q``.
+        """
+        target = q * self.calls
+        total = 0
+
+        for index, count in enumerate(self.counts):
+            total += count
+            if count and total >= target:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+
+        return 0
+
+
+class Timer(object):
+    """
+    Contexto que registra uma requisição ao ``endpoint``. Exceções lançadas
+    dentro do contexto são contabilizadas como erro; ``bytes`` recebe o
+    tamanho da resposta.
+    """
+
+    def __init__(self, registry, endpoint):
+        self.registry = registry
+        self.endpoint = endpoint
+        self.bytes = 0
+        self.error = False
+
+    def __enter__(self):
+        self.registry.start(self.endpoint)
+        self.started = time.time()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.registry.finish(
+            self.endpoint, time.time() - self.started, self.bytes,
+            self.error or exc_type is not None)
+
+        return False
+
+
+class Registry(object):
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def _endpoint(self, name):
+        endpoint = self._endpoints.get(name, None)
+
+        if endpoint is None:
+            endpoint = self._endpoints[name] = Endpoint(name, self.buckets)
+
+        return endpoint
+
+    def start(self, name):
+        with self._lock:
+            endpoint = self._endpoint(name)
+            endpoint.in_flight += 1
+            endpoint.max_in_flight = max(endpoint.max_in_flight, endpoint.in_flight)
+
+    def finish(self, name, seconds, nbytes=0, error=False):
+        with self._lock:
+            endpoint = self._endpoint(name)
+            endpoint.in_flight -= 1
+            endpoint.calls += 1
+            endpoint.seconds += seconds
+            endpoint.bytes += nbytes
+            endpoint.errors += 1 if error else 0
+            endpoint.counts[bisect_left(self.buckets, seconds)] += 1
+
+    def timed(self, name):
+
+        return Timer(self, name)
+
+    def endpoints(self):
+        with self._lock:
+            return [self._endpoints[name] for name in sorted(self._endpoints)]
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+    def log_line(self):
+        """
+        Resumo de uma linha com chamadas, erros, latência média, percentil
+        95, bytes e concorrência de cada endpoint.
+        """
+        items = []
+
+        for endpoint in self.endpoints():
+            mean = endpoint.seconds / endpoint.calls if endpoint.calls else 0
+            items.append(
+                '%s calls=%d errors=%d mean=%.3fs p95<=%ss bytes=%d in_flight=%d max_in_flight=%d' % (
+                    endpoint.name, endpoint.calls, endpoint.errors, mean,
+                    endpoint.quantile(0.95), endpoint.bytes, endpoint.in_flight,
+                    endpoint.max_in_flight))
+
+        return '; '.join(items)
+
+    def prometheus(self, prefix=PREFIX):
+        """
+        Retorna as métricas no formato texto do Prometheus.
+        """
+        endpoints = self.endpoints()
+        lines = []
+
+        def metric(name, kind, help_text, values):
+            lines.append('# HELP %s_%s %s' % (prefix, name, help_text))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+            for endpoint in endpoints:
+                for suffix, labels, value in values(endpoint):
+                    lines.append('%s_%s%s{endpoint="%s"%s} %s' % (
+                        prefix, name, suffix, endpoint.name, labels, value))
+
+        def histogram(endpoint):
+            total = 0
+            for index, count in enumerate(endpoint.counts):
+                total += count
+                limit = repr(float(self.buckets[index])) if index < len(self.buckets) else '+Inf'
+                yield '_bucket', ',le="%s"' % limit, total
+            yield '_sum', '', repr(endpoint.seconds)
+            yield '_count', '', endpoint.calls
+
+        metric('request_duration_seconds', 'histogram',
+            'Latency of the requests to external services.', histogram)
+        metric('response_bytes_total', 'counter',
+            'Bytes received from external services.',
+            lambda endpoint: [('', '', endpoint.bytes)])
+        metric('request_errors_total', 'counter',
+            'Failed requests to external services.',
+            lambda endpoint: [('', '', endpoint.errors)])
+        metric('requests_in_flight', 'gauge',
+            'Requests to external services in progress.',
+            lambda endpoint: [('', '', endpoint.in_flight)])
+        metric('requests_in_flight_max', 'gauge',
+            'Maximum number of concurrent requests to external services.',
+            lambda endpoint: [('', '', endpoint.max_in_flight)])
+
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """
+        Grava as métricas em ``path`` substituindo o arquivo de forma atômica,
+        evitando leituras parciais pelo coletor.
+        """
+        temp = '%s.%d.tmp' % (path, os.getpid())
+
+        with open(temp, 'w') as f:
+            f.write(self.prometheus())
+        os.rename(temp, path)
+
+
+registry = Registry()
+
+
+def timed(endpoint):
+    start()
+
+    return registry.timed(endpoint)
+
+
+def http_get(endpoint, url, session=None, **kwargs):
+    """
+    requests.get (ou ``session``.get) registrado em ``endpoint``. Respostas
+    com status de erro HTTP são contabilizadas como erro.
+    """
+    with timed(endpoint) as timer:
+        response = (session or requests).get(url, **kwargs)
+        timer.bytes = len(response.content or b'')
+        timer.error = response.status_code >= 400
+
+    return response
+
+
+class Reporter(object):
+    """
+    Registra as métricas no log a cada ``interval`` segundos e, com
+    ``prometheus_file``, exporta o arquivo do Prometheus no mesmo intervalo.
+    """
+
+    def __init__(self, registry=registry, interval=LOG_INTERVAL, prometheus_file=None,
+        report_logger=None):
+        self.registry = registry
+        self.interval = interval
+        self.prometheus_file = prometheus_file
+        self.report_logger = report_logger
+        self._stop = threading.Event()
+        self._thread = None
+
+    def report(self):
+        line = self.registry.log_line()
+
+        if line:
+            (self.report_logger or logger).info('Requests: %s' % line)
+
+        if self.prometheus_file:
+            try:
+                self.registry.write_prometheus(self.prometheus_file)
+            except (IOError, OSError) as e:
+                logger.warning('Could not write metrics to %s: %s' % (self.prometheus_file, e))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.report()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.report()
+
+
+_reporter = None
+_reporter_pid = None
+_report_logger = None
+_options = {}
+
+
+def configure(interval=None, prometheus_file=None):
+    """
+    Habilita o registro periódico das métricas. O relatório é iniciado na
+    primeira requisição de cada processo; em processos filhos o arquivo do
+    Prometheus recebe o pid como sufixo.
+    """
+    _options.clear()
+
+    if interval or prometheus_file:
+        _options.update({
+            'interval': interval or LOG_INTERVAL,
+            'prometheus_file': prometheus_file,
+            'pid': os.getpid()
+        })
+
+
+def set_logger(report_logger):
+    """
+    Registra o relatório periódico em ``report_logger``, o logger
+    configurado pelo processamento.
+    """
+    global _report_logger
+
+    _report_logger = report_logger
+
+    if _reporter is not None:
+        _reporter.report_logger = report_logger
+
+
+def start():
+    """
+    Inicia o relatório periódico do processo corrente, se configurado.
+    """
+    global _reporter, _reporter_pid
+
+    if not _options or _reporter_pid == os.getpid():
+        return
+
+    prometheus_file = _options['prometheus_file']
+    if prometheus_file and _options['pid'] != os.getpid():
+        prometheus_file = '%s.%d' % (prometheus_file, os.getpid())
+
+    _reporter_pid = os.getpid()
+    _reporter = Reporter(registry, _options['interval'], prometheus_file, _report_logger)
+    _reporter.start()
+
+
+@atexit.register
+def stop():
+    if _reporter is not None and _reporter_pid == os.getpid():
+        _reporter.stop()
@@ -0,0 +1,259 @@
+# coding: utf-8
+"""
+Escrita bufferizada das tabulações CSV.
+
+Todas as tabulações produzem o mesmo dialeto: campos entre aspas, aspas
+internas duplicadas e linhas terminadas por \\r\\n. As linhas são acumuladas
+em lotes e gravadas pelo módulo csv através de um buffer de escrita grande,
+evitando a formatação e a escrita linha a linha em Python.
+
+Arquivos de saída terminados em .gz, .xz ou .zst são comprimidos durante a
+escrita. Com mais de uma thread de compressão são utilizados os compressores
+externos pigz, xz e zstd, quando disponíveis; para .zst o pacote opcional
+zstandard é utilizado quando instalado.
+"""
+import io
+import os
+import csv
+import sys
+import gzip
+import logging
+import subprocess
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+import utils
+import profiling
+
+logger = logging.getLogger(__name__)
+
+BUFFER_SIZE = 1024 * 1024
+BATCH_SIZE = 1000
+LINE_TERMINATOR = '\r\n'
+COMPRESS_THREADS = 1
+GZIP_LEVEL = 6
+
+COMPRESSIONS = {
+    '.gz': 'gzip',
+    '.xz': 'xz',
+    '.zst': 'zstd',
+}
+
+# Comandos de compressão e descompressão utilizados em subprocessos.
+COMPRESS_COMMANDS = {
+    'gzip': ['pigz', '-c', '-p', '%(threads)d'],
+    'xz': ['xz', '-c', '-T', '%(threads)d'],
+    'zstd': ['zstd', '-c', '-q', '-T%(threads)d'],
+}
+
+DECOMPRESS_COMMANDS = {
+    'zstd': ['zstd', '-d', '-c', '-q'],
+}
+
+PY2 = sys.version_info[0] == 2
+
+
+def _encode(row):
+    """
+    O módulo csv do Python 2 grava apenas bytes.
+    """
+    return [i.encode('utf-8') if isinstance(i, unicode) else i for i in row]
+
+
+def compression(path):
+    """
+    Retorna o formato de compressão indicado pela extensão de ``path`` ou
+    None.
+    """
+    return COMPRESSIONS.get(os.path.splitext(path or '')[1].lower(), None)
+
+
+def _executable(name):
+
+    for directory in os.environ.get('PATH', '').split(os.pathsep):
+        candidate = os.path.join(directory, name)
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return candidate
+
+    return None
+
+
+class Subprocess(io.RawIOBase):
+    """
+    Arquivo binário cujo conteúdo é gravado através de um compressor
+    externo executado em um subprocesso.
+    """
+
+    def __init__(self, command, path):
+        self.path = path
+        self._output = io.open(path, 'wb')
+        self._process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=self._output)
+
+    def writable(self):
+
+        return True
+
+    def write(self, data):
+        self._process.stdin.write(data)
+
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+
+        super(Subprocess, self).close()
+        self._process.stdin.close()
+        returncode = self._process.wait()
+        self._output.close()
+
+        if returncode != 0:
+            raise IOError('Compressor exited with status %d writing %s' % (returncode, self.path))
+
+
+def open_output(path, threads=None):
+    """
+    Abre ``path`` para escrita binária, comprimindo conforme a extensão.
+    """
+    threads = threads or utils.compress_threads() or COMPRESS_THREADS
+    fmt = compression(path)
+
+    if fmt is None:
+        return io.open(path, 'wb')
+
+    if fmt == 'zstd' and zstandard is not None:
+        compressor = zstandard.ZstdCompressor(threads=threads if threads > 1 else 0)
+        return compressor.stream_writer(io.open(path, 'wb'))
+
+    command = COMPRESS_COMMANDS[fmt]
+    if (threads > 1 or fmt == 'zstd') and _executable(command[0]):
+        return Subprocess([i % {'threads': threads} for i in command], path)
+
+    if threads > 1:
+        logger.warning('%s not available, compressing %s with a single thread' % (command[0], path))
+
+    if fmt == 'gzip':
+        return gzip.GzipFile(path, 'wb', compresslevel=GZIP_LEVEL)
+
+    if fmt == 'xz' and lzma is not None:
+        return lzma.open(path, 'wb')
+
+    raise ValueError('No %s compressor available for %s' % (fmt, path))
+
+
+def open_input(path):
+    """
+    Abre ``path`` para leitura de texto UTF-8, descomprimindo conforme a
+    extensão e preservando os terminadores de linha.
+    """
+    fmt = compression(path)
+
+    if fmt is None:
+        return io.open(path, 'r', encoding='utf-8', newline='')
+
+    if fmt == 'gzip':
+        binary = gzip.GzipFile(path, 'rb')
+    elif fmt == 'xz' and lzma is not None:
+        binary = lzma.open(path, 'rb')
+    elif fmt == 'zstd' and zstandard is not None:
+        binary = zstandard.ZstdDecompressor().stream_reader(io.open(path, 'rb'))
+    elif fmt in DECOMPRESS_COMMANDS and _executable(DECOMPRESS_COMMANDS[fmt][0]):
+        process = subprocess.Popen(
+            DECOMPRESS_COMMANDS[fmt] + [path], stdout=subprocess.PIPE)
+        binary = process.stdout
+    else:
+        raise ValueError('No %s decompressor available for %s' % (fmt, path))
+
+    return io.TextIOWrapper(io.BufferedReader(binary), encoding='utf-8', newline='')
+
+
+class CSVWriter(object):
+
+    def __init__(self, output_file=None, buffer_size=BUFFER_SIZE,
+        batch_size=BATCH_SIZE, threads=None, append=False):
+        """
+        Grava em ``output_file`` ou, quando não informado, na saída padrão.
+        ``threads`` define o número de threads de compressão. Com ``append``
+        as linhas são acrescentadas ao final de um arquivo não comprimido.
+        """
+        if append and compression(output_file):
+            raise ValueError('Compressed output can not be appended: %s' % output_file)
+
+        self.batch_size = batch_size
+        self._rows = []
+        self._close_file = bool(output_file)
+
+        if not output_file:
+            self._file = sys.stdout
+        elif append and PY2:
+            self._file = io.open(output_file, 'ab', buffering=buffer_size)
+        elif append:
+            self._file = io.open(
+                output_file, 'a', encoding='utf-8', newline='',
+                buffering=buffer_size)
+        elif PY2:
+            self._file = io.BufferedWriter(open_output(output_file, threads), buffer_size)
+        elif compression(output_file):
+            self._file = io.TextIOWrapper(
+                io.BufferedWriter(open_output(output_file, threads), buffer_size),
+                encoding='utf-8', newline='')
+        else:
+            self._file = io.open(
+                output_file, 'w', encoding='utf-8', newline='',
+                buffering=buffer_size)
+
+        self._writer = csv.writer(
+            self._file, quoting=csv.QUOTE_ALL, lineterminator=LINE_TERMINATOR)
+
+    def writerow(self, row):
+        self._rows.append(_encode(row) if PY2 else row)
+
+        if len(self._rows) >= self.batch_size:
+            self.flush_rows()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def write(self, line):
+        """
+        Grava uma linha já formatada, como o cabeçalho ou linhas copiadas de
+        uma saída anterior, preservando a ordem das linhas em lote.
+        """
+        self.flush_rows()
+
+        line = '%s%s' % (line, LINE_TERMINATOR)
+        with profiling.stage('write'):
+            self._file.write(line.encode('utf-8') if PY2 and isinstance(line, unicode) else line)
+
+    def flush_rows(self):
+        if not self._rows:
+            return
+
+        with profiling.stage('write', len(self._rows)):
+            self._writer.writerows(self._rows)
+        self._rows = []
+
+    def flush(self):
+        self.flush_rows()
+        self._file.flush()
+
+    def close(self):
+        if self._file is None:
+            return
+
+        self.flush()
+
+        if self._close_file:
+            self._file.close()
+
+        self._file = None
@@ -0,0 +1,114 @@
+# coding: utf-8
+"""
+Executa várias tabulações de documentos em uma única leitura da coleção.
+
+Cada tabulação (Dumper) registrada como destino recebe os documentos de um
+único fluxo ArticleMeta.documents() através do método ``process(document)``,
+de modo que cada documento é recuperado apenas uma vez, independentemente do
+número de relatórios produzidos.
+"""
+import os
+import logging
+import importlib
+
+import utils
+
+logger = logging.getLogger(__name__)
+
+# nome do relatório: (módulo do Dumper, arquivo de saída padrão)
+REPORTS = {
+    'counts': ('publication.counts', 'counts.csv'),
+    'affiliations': ('publication.affiliations', 'affiliations.csv'),
+    'languages': ('publication.languages', 'languages.csv'),
+    'licenses': ('publication.licenses', 'licenses.csv'),
+    'authors': ('publication.authors', 'authors.csv'),
+    'dates': ('publication.dates', 'dates.csv'),
+    'citedby': ('bibliometric.citedby', 'citedby.csv'),
+    'accesses': ('accesses.dumpdata', 'accesses.csv'),
+    'natural_keys': ('export.natural_keys', 'natural_keys.csv'),
+}
+
+PUBLICATION_REPORTS = [
+    'counts', 'affiliations', 'languages', 'licenses', 'authors', 'dates']
+
+
+def build_sink(report, collection, output_dir='.', compression=None):
+    """
+    Cria o Dumper de ``report``. Com ``compression`` (extensão gz, xz ou zst)
+    a saída é comprimida durante a escrita.
+    """
+    module_name, output_file = REPORTS[report]
+    module = importlib.import_module(module_name)
+
+    if compression:
+        output_file = '%s.%s' % (output_file, compression)
+
+    return module.Dumper(
+        collection, output_file=os.path.join(output_dir, output_file))
+
+
+class Pipeline(object):
+
+    def __init__(self, collection, issns=None, sinks=None, workers=None):
+        self._articlemeta = utils.articlemeta_server(workers=workers)
+        self.collection = collection
+        self.issns = issns or [None]
+        self.sinks = []
+
+        for sink in sinks or []:
+            self.register(sink)
+
+    def register(self, sink):
+        """
+        Registra um destino. Um destino é qualquer objeto que implemente
+        ``process(document)``.
+        """
+        if not hasattr(sink, 'process'):
+            raise ValueError('sink must implement process(document): %s' % repr(sink))
+
+        self.sinks.append(sink)
+
+    @property
+    def fields(self):
+        """
+        União das seções do documento declaradas pelos destinos em ``fields``.
+        Se algum destino não declarar suas seções o documento é completo.
+        """
+        fields = set()
+
+        for sink in self.sinks:
+            sink_fields = getattr(sink, 'fields', None)
+            if sink_fields is None:
+                return None
+            fields.update(sink_fields)
+
+        return sorted(fields)
+
+    def process(self, document):
+        for sink in self.sinks:
+            try:
+                sink.process(document)
+            except Exception as e:
+                logger.exception(e)
+                logger.error('Fail to process document %s in %s' % (
+                    document.publisher_id, sink.__class__.__module__))
+
+    def close(self):
+        for sink in self.sinks:
+            output_file = getattr(sink, 'output_file', None)
+            if hasattr(output_file, 'close'):
+                output_file.close()
+
+    def run(self):
+        fields = self.fields
+
+        for issn in self.issns:
+            for document in self._articlemeta.documents(
+                collection=self.collection, issn=issn, fields=fields):
+                if not document:
+                    continue
+                logger.debug('Reading document: %s' % document.publisher_id)
+                self.process(document)
+
+        self.close()
+        logger.info('Export finished')
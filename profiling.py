@@ -0,0 +1,225 @@
+# coding: utf-8
+"""
+Perfil de tempo por etapa dos processamentos (--profile).
+
+O tempo de execução é dividido nas etapas:
+
+    fetch: requisições thrift aos serviços (por requisição)
+    decode: decodificação JSON das respostas (por documento)
+    xylose: construção dos objetos xylose (por documento)
+    format: formatação das linhas dos relatórios (por documento)
+    write: gravação das linhas na saída (por linha)
+
+Com o perfil habilitado o relatório é registrado periodicamente e ao final
+da execução com o tempo acumulado e a vazão de cada etapa. Etapas executadas
+em várias threads (fetch com workers) acumulam o tempo de todas as threads,
+podendo superar o tempo total de execução. Com o perfil desabilitado as
+etapas não são medidas.
+
+Em execuções paralelas (sharding) cada processo filho mede as próprias etapas
+e devolve um snapshot, somado ao perfil do processo principal.
+"""
+import time
+import atexit
+import inspect
+import logging
+import functools
+import threading
+
+logger = logging.getLogger(__name__)
+
+STAGES = [
+    ('fetch', 'requests'),
+    ('decode', 'documents'),
+    ('xylose', 'documents'),
+    ('format', 'documents'),
+    ('write', 'rows'),
+]
+
+REPORT_INTERVAL = 60
+
+
+class Stage(object):
+
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.seconds = 0.0
+        self.items = 0
+
+
+class _NullTimer(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class Timer(object):
+
+    def __init__(self, profiler, name, items):
+        self.profiler = profiler
+        self.name = name
+        self.items = items
+
+    def __enter__(self):
+        self.started = time.time()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.add(self.name, time.time() - self.started, self.items)
+
+        return False
+
+
+class Profiler(object):
+
+    def __init__(self, stages=STAGES):
+        self.enabled = False
+        self.started = None
+        self._stages = [Stage(name, unit) for name, unit in stages]
+        self._index = dict((stage.name, stage) for stage in self._stages)
+        self._lock = threading.Lock()
+
+    def stage(self, name, items=1):
+        """
+        Contexto que acumula o tempo gasto na etapa ``name`` com ``items``
+        unidades processadas.
+        """
+        if not self.enabled:
+            return NULL_TIMER
+
+        return Timer(self, name, items)
+
+    def add(self, name, seconds, items=1):
+        with self._lock:
+            stage = self._index[name]
+            stage.seconds += seconds
+            stage.items += items
+
+    def reset(self):
+        with self._lock:
+            for stage in self._stages:
+                stage.seconds = 0.0
+                stage.items = 0
+
+    def snapshot(self):
+        """
+        Retorna (etapa, segundos, unidades) das etapas medidas.
+        """
+        with self._lock:
+            return [
+                (stage.name, stage.seconds, stage.items)
+                for stage in self._stages if stage.seconds or stage.items
+            ]
+
+    def merge(self, snapshot):
+        """
+        Soma as etapas de ``snapshot``, obtido em outro processo.
+        """
+        for name, seconds, items in snapshot:
+            self.add(name, seconds, items)
+
+    def report(self):
+        """
+        Linhas do relatório com tempo, unidades processadas e vazão de cada
+        etapa, em relação ao tempo da etapa e ao tempo total de execução.
+        """
+        wall = time.time() - self.started
+        lines = ['Profile after %.1fs' % wall]
+
+        with self._lock:
+            for stage in self._stages:
+                if not stage.items:
+                    continue
+
+                lines.append('%s: %d %s in %.1fs (%.1f%% of wall time), %.1f %s/s in stage, %.1f %s/s overall' % (
+                    stage.name, stage.items, stage.unit, stage.seconds,
+                    100.0 * stage.seconds / wall if wall else 0,
+                    stage.items / stage.seconds if stage.seconds else 0, stage.unit,
+                    stage.items / wall if wall else 0, stage.unit))
+
+        return lines
+
+    def log(self, report_logger=None):
+        for line in self.report():
+            (report_logger or logger).info(line)
+
+    def enable(self, report_logger=None, interval=REPORT_INTERVAL):
+        """
+        Habilita o perfil, registrando o relatório em ``report_logger`` a
+        cada ``interval`` segundos e ao final da execução.
+        """
+        if self.enabled:
+            return
+
+        self.enabled = True
+        self.started = time.time()
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                self.log(report_logger)
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+        def finish():
+            stop.set()
+            self.log(report_logger)
+
+        atexit.register(finish)
+
+
+profiler = Profiler()
+
+
+def enable(report_logger=None, interval=REPORT_INTERVAL):
+
+    profiler.enable(report_logger, interval)
+
+
+def stage(name, items=1):
+
+    return profiler.stage(name, items)
+
+
+def timed(name):
+    """
+    Decorador que contabiliza cada chamada da função na etapa ``name``. Para
+    geradores é contabilizado o tempo de geração de todos os itens.
+    """
+
+    def decorator(func):
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator(*args, **kwargs):
+                items = func(*args, **kwargs)
+                while True:
+                    with stage(name, 0):
+                        try:
+                            item = next(items)
+                        except StopIteration:
+                            break
+                    yield item
+                if profiler.enabled:
+                    profiler.add(name, 0, 1)
+
+            return generator
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -9,9 +9,13 @@ Formato de saída:
 
 import argparse
 import logging
-import codecs
 
 import utils
+import metrics
+import profiling
+import output
+import sharding
+from publication import incremental
 
 logger = logging.getLogger(__name__)
 
@@ -56,25 +60,28 @@ def pages(first, last):
 
 class Dumper(object):
 
-    def __init__(self, collection, issns=None, output_file=None):
+    def __init__(self, collection, issns=None, output_file=None, workers=None):
 
         self._ratchet = utils.ratchet_server()
-        self._articlemeta = utils.articlemeta_server()
+        self._articlemeta = utils.articlemeta_server(workers=workers)
         self.collection = collection
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
+        self.output_file = output.CSVWriter(output_file)
         header = [u"PID",u"issn",u"título",u"área temática",u"ano de publicação",u"tipo de documento",u"total autores",u"0 autores",u"1 autor",u"2 autores",u"3 autores",u"4 autores",u"5 autores",u"+6 autores",u"total páginas",u"total referências"]
         self.write(','.join(header))
 
     def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def writerows(self, rows):
+        self.output_file.writerows(rows)
+
+    def process(self, data):
+        self.output_file.writerow(self.fmt_csv(data))
 
     def run(self):
-        for item in self.items():
-            self.write(item)
+        self.writerows(self.items())
+        self.output_file.close()
         logger.info('Export finished')
 
     def items(self):
@@ -87,6 +94,7 @@ class Dumper(object):
                 logger.debug('Reading document: %s' % data.publisher_id)
                 yield self.fmt_csv(data)
         
+    @profiling.timed('format')
     def fmt_csv(self, data):
         countries = set()
 
@@ -114,9 +122,7 @@ class Dumper(object):
             str(len(data.citations or [])) # total de citações
         ]
 
-        joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in line])
-
-        return joined_line
+        return line
 
 def main():
 
@@ -142,6 +148,33 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--previous_output',
+        '-p',
+        help='Previous output file to be patched with the documents changed since its checkpoint, requires --output_file'
+    )
+
+    parser.add_argument(
+        '--processes',
+        '-j',
+        type=int,
+        default=sharding.PROCESSES,
+        help='Number of processes dumping ISSNs in parallel, requires --output_file'
+    )
+
+    parser.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        help='Number of documents retrieved in parallel from Article Meta'
+    )
+
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Report the time and throughput of each processing stage'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -158,12 +191,37 @@ def main():
 
     args = parser.parse_args()
     _config_logging(args.logging_level, args.logging_file)
+    metrics.set_logger(logger)
+
+    if args.profile:
+        profiling.enable(logger)
+
     logger.info('Dumping data for: %s' % args.collection)
 
     issns = None
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
 
-    dumper = Dumper(args.collection, issns, args.output_file)
+    error = incremental.check_files(args.output_file, args.previous_output)
+    if error:
+        logger.error(error)
+        exit()
+
+    if args.processes > 1:
+        if not args.output_file or args.previous_output:
+            logger.error('Parallel dump requires an output file and is not available for incremental dumps')
+            exit()
+
+        started_at = incremental.now()
+        sharding.run('publication.counts', args.collection, issns,
+            args.output_file, args.processes, workers=args.workers)
+        incremental.write_checkpoint(args.output_file, started_at)
+        exit()
+
+    dumper = Dumper(args.collection, issns, args.output_file, workers=args.workers)
+
+    if not args.output_file:
+        dumper.run()
+        exit()
 
-    dumper.run()
+    incremental.run(dumper, args.output_file, args.previous_output)
@@ -7,12 +7,19 @@ Formato de saída:
 """
 import argparse
 import logging
-import codecs
 
 import utils
+import metrics
+import profiling
+import output
+import sharding
+from publication import incremental
 
 logger = logging.getLogger(__name__)
 
+# Seções do documento utilizadas por fmt_csv além de clients.BASE_FIELDS
+FIELDS = ['created_at', 'updated_at']
+
 def _config_logging(logging_level='INFO', logging_file=None):
 
     allowed_levels = {
@@ -42,25 +49,29 @@ def _config_logging(logging_level='INFO', logging_file=None):
 
 class Dumper(object):
 
-    def __init__(self, collection, issns=None, output_file=None):
+    def __init__(self, collection, issns=None, output_file=None, workers=None):
 
         self._ratchet = utils.ratchet_server()
-        self._articlemeta = utils.articlemeta_server()
+        self._articlemeta = utils.articlemeta_server(workers=workers)
         self.collection = collection
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
+        self.fields = FIELDS
+        self.output_file = output.CSVWriter(output_file)
         header = [u"PID",u"ISSN",u"título",u"área temática",u"ano de publicação",u"tipo de documento",u"recebido",u"revisado",u"aceito",u"publicado",u"entrada no SciELO",u"atualização no SciELO"]
         self.write(','.join(header))
 
     def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def writerows(self, rows):
+        self.output_file.writerows(rows)
+
+    def process(self, data):
+        self.output_file.writerow(self.fmt_csv(data))
 
     def run(self):
-        for item in self.items():
-            self.write(item)
+        self.writerows(self.items())
+        self.output_file.close()
         logger.info('Export finished')
 
     def items(self):
@@ -69,10 +80,11 @@ class Dumper(object):
             self.issns = [None]
 
         for issn in self.issns:
-            for data in self._articlemeta.documents(collection=self.collection, issn=issn):
+            for data in self._articlemeta.documents(collection=self.collection, issn=issn, fields=self.fields):
                 logger.debug('Reading document: %s' % data.publisher_id)
                 yield self.fmt_csv(data)
         
+    @profiling.timed('format')
     def fmt_csv(self, data):
         line = []
         line.append(data.publisher_id)
@@ -88,9 +100,7 @@ class Dumper(object):
         line.append(data.creation_date or '')
         line.append(data.update_date or '')
 
-        joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in line])
-
-        return joined_line
+        return line
 
 def main():
 
@@ -116,6 +126,33 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--previous_output',
+        '-p',
+        help='Previous output file to be patched with the documents changed since its checkpoint, requires --output_file'
+    )
+
+    parser.add_argument(
+        '--processes',
+        '-j',
+        type=int,
+        default=sharding.PROCESSES,
+        help='Number of processes dumping ISSNs in parallel, requires --output_file'
+    )
+
+    parser.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        help='Number of documents retrieved in parallel from Article Meta'
+    )
+
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Report the time and throughput of each processing stage'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -132,12 +169,37 @@ def main():
 
     args = parser.parse_args()
     _config_logging(args.logging_level, args.logging_file)
+    metrics.set_logger(logger)
+
+    if args.profile:
+        profiling.enable(logger)
+
     logger.info('Dumping data for: %s' % args.collection)
 
     issns = None
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
 
-    dumper = Dumper(args.collection, issns, args.output_file)
+    error = incremental.check_files(args.output_file, args.previous_output)
+    if error:
+        logger.error(error)
+        exit()
+
+    if args.processes > 1:
+        if not args.output_file or args.previous_output:
+            logger.error('Parallel dump requires an output file and is not available for incremental dumps')
+            exit()
+
+        started_at = incremental.now()
+        sharding.run('publication.dates', args.collection, issns,
+            args.output_file, args.processes, workers=args.workers)
+        incremental.write_checkpoint(args.output_file, started_at)
+        exit()
+
+    dumper = Dumper(args.collection, issns, args.output_file, workers=args.workers)
+
+    if not args.output_file:
+        dumper.run()
+        exit()
 
-    dumper.run()
+    incremental.run(dumper, args.output_file, args.previous_output)
@@ -2,11 +2,12 @@
 
 import argparse
 import logging
-import codecs
 
 import utils
-
-import counts, affiliations, languages, licenses, authors, dates
+import metrics
+import profiling
+import output
+import pipeline
 
 logger = logging.getLogger(__name__)
 
@@ -38,35 +39,18 @@ def _config_logging(logging_level='INFO', logging_file=None):
 
 class Dumper(object):
 
-    def __init__(self, collection, issns=None):
-
-        self._ratchet = utils.ratchet_server()
-        self._articlemeta = utils.articlemeta_server()
-        self.collection = collection
-        self.issns = issns
-        self.counts = counts.Dumper(collection, output_file='counts.csv')
-        self.affiliations = affiliations.Dumper(collection, output_file='affiliations.csv')
-        self.languages = languages.Dumper(collection, output_file='languages.csv')
-        self.licenses = licenses.Dumper(collection, output_file='licenses.csv')
-        self.authors = authors.Dumper(authors, output_file='authors.csv')
-        self.dates = dates.Dumper(authors, output_file='dates.csv')
+    def __init__(self, collection, issns=None, reports=None, output_dir='.',
+        workers=None, compression=None):
 
-    def run(self):
+        self.pipeline = pipeline.Pipeline(collection, issns, workers=workers)
 
-        if not self.issns:
-            self.issns = [None]
+        for report in reports or pipeline.PUBLICATION_REPORTS:
+            self.pipeline.register(
+                pipeline.build_sink(report, collection, output_dir, compression))
 
-        for issn in self.issns:
-            for data in self._articlemeta.documents(collection=self.collection, issn=issn):
-                logger.debug('Reading document: %s' % data.publisher_id)
-                self.counts.write(self.counts.fmt_csv(data))
-                self.affiliations.write(self.affiliations.fmt_csv(data))
-                self.languages.write(self.languages.fmt_csv(data))
-                self.licenses.write(self.licenses.fmt_csv(data))
-                self.authors.write(self.authors.fmt_csv(data))
-                self.dates.write(self.dates.fmt_csv(data))
+    def run(self):
 
-        logger.info('Export finished')
+        self.pipeline.run()
 
 def main():
 
@@ -86,6 +70,41 @@ def main():
         help='Collection Acronym'
     )
 
+    parser.add_argument(
+        '--reports',
+        nargs='+',
+        choices=sorted(pipeline.REPORTS.keys()),
+        default=pipeline.PUBLICATION_REPORTS,
+        help='Reports produced from a single read of the collection'
+    )
+
+    parser.add_argument(
+        '--output_dir',
+        '-r',
+        default='.',
+        help='Directory to receive the dumped reports'
+    )
+
+    parser.add_argument(
+        '--compression',
+        '-z',
+        choices=sorted(ext[1:] for ext in output.COMPRESSIONS),
+        help='Compress the reports while writing them'
+    )
+
+    parser.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        help='Number of documents retrieved in parallel from Article Meta'
+    )
+
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Report the time and throughput of each processing stage'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -102,12 +121,18 @@ def main():
 
     args = parser.parse_args()
     _config_logging(args.logging_level, args.logging_file)
+    metrics.set_logger(logger)
+
+    if args.profile:
+        profiling.enable(logger)
+
     logger.info('Dumping data for: %s' % args.collection)
 
     issns = None
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
 
-    dumper = Dumper(args.collection, issns)
+    dumper = Dumper(args.collection, issns, args.reports, args.output_dir,
+        workers=args.workers, compression=args.compression)
 
     dumper.run()
\ No newline at end of file
@@ -0,0 +1,207 @@
+# coding: utf-8
+"""
+Atualização incremental das tabulações de documentos (publication/*).
+
+A partir de uma saída anterior e da data registrada em seu arquivo de
+checkpoint, apenas os documentos incluídos, alterados ou removidos desde então
+(article_history_changes) e os documentos dos periódicos alterados desde então
+(journal_history_changes) são processados. As linhas da saída anterior dos
+documentos não alterados são copiadas sem modificação.
+
+Todas as tabulações suportadas possuem o PID do documento na primeira coluna.
+"""
+import os
+import csv
+import logging
+import datetime
+
+import output
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_SUFFIX = '.checkpoint'
+
+
+def checkpoint_file(output_file):
+
+    return output_file + CHECKPOINT_SUFFIX
+
+
+def read_checkpoint(output_file):
+    """
+    Retorna a data registrada no checkpoint de ``output_file`` ou None quando
+    não há checkpoint.
+    """
+    try:
+        with open(checkpoint_file(output_file), 'r') as f:
+            return f.read().strip() or None
+    except IOError:
+        return None
+
+
+def write_checkpoint(output_file, date):
+
+    with open(checkpoint_file(output_file), 'w') as f:
+        f.write(date)
+
+
+def now():
+
+    return datetime.datetime.now().isoformat()[0:19]
+
+
+def document_changes(articlemeta, collection, from_date, until_date=None,
+    issns=None):
+    """
+    Retorna os conjuntos de PIDs incluídos/alterados e removidos entre
+    ``from_date`` e ``until_date``, considerando apenas o último evento
+    registrado para cada documento.
+    """
+    changed = set()
+    deleted = set()
+
+    events = articlemeta.documents_history(
+        collection=collection, from_date=from_date, until_date=until_date)
+
+    for event in sorted(events, key=lambda i: i.date):
+        if issns and event.code[1:10] not in issns:
+            continue
+
+        if event.event == 'delete':
+            changed.discard(event.code)
+            deleted.add(event.code)
+        else:
+            deleted.discard(event.code)
+            changed.add(event.code)
+
+    return changed, deleted
+
+
+def journal_changes(articlemeta, collection, from_date, until_date=None,
+    issns=None):
+    """
+    Retorna o conjunto de ISSNs dos periódicos incluídos, alterados ou
+    removidos entre ``from_date`` e ``until_date``. Os metadados do
+    periódico são repetidos em todas as linhas de seus documentos.
+    """
+    changed = set()
+
+    events = articlemeta.journals_history(
+        collection=collection, from_date=from_date, until_date=until_date)
+
+    for event in events:
+        # O código dos eventos de periódicos é a lista de seus ISSNs.
+        codes = event.code if isinstance(event.code, list) else [event.code]
+
+        for code in codes:
+            if issns and code not in issns:
+                continue
+
+            changed.add(code)
+
+    return changed
+
+
+def read_rows(path):
+    """
+    Gera as linhas CSV de ``path``. Campos entre aspas podem conter quebras
+    de linha.
+    """
+    with output.open_input(path) as f:
+        if output.PY2:
+            # O módulo csv do Python 2 lê apenas bytes.
+            f = (line.encode('utf-8') for line in f)
+
+        for row in csv.reader(f):
+            yield row
+
+
+def patch(dumper, previous_file, changed, deleted, journals=None):
+    """
+    Copia para a saída do ``dumper`` as linhas de ``previous_file`` dos
+    documentos não afetados e reprocessa os documentos alterados e os
+    documentos dos periódicos de ``journals``.
+    """
+    skip = changed | deleted
+    journals = journals or set()
+    changed = set(changed)
+
+    def kept_rows():
+        rows = read_rows(previous_file)
+        next(rows, None)  # cabeçalho, já escrito pelo dumper
+        for row in rows:
+            if not row or row[0] in skip:
+                continue
+            if row[0][1:10] in journals:
+                changed.add(row[0])
+                continue
+            yield row
+
+    dumper.writerows(kept_rows())
+
+    for code in sorted(changed):
+        document = dumper._articlemeta.document(
+            code, dumper.collection, fields=getattr(dumper, 'fields', None))
+
+        if not document:
+            continue
+
+        # fmt_csv retorna uma linha ou, para alguns relatórios, várias linhas
+        # por documento.
+        rows = list(dumper.fmt_csv(document))
+
+        if rows and not isinstance(rows[0], list):
+            rows = [rows]
+
+        dumper.writerows(rows)
+
+
+def check_files(output_file, previous_file):
+    """
+    Retorna uma mensagem de erro quando a execução incremental não pode ser
+    realizada com os arquivos informados. Deve ser verificado antes da
+    criação do dumper, que trunca o arquivo de saída.
+    """
+    if not previous_file:
+        return None
+
+    if not output_file:
+        return 'Incremental dump requires an output file'
+
+    if os.path.abspath(previous_file) == os.path.abspath(output_file):
+        return 'Previous output and output file must be different files'
+
+    if not read_checkpoint(previous_file):
+        return 'Missing checkpoint for previous output: %s' % previous_file
+
+
+def run(dumper, output_file, previous_file=None):
+    """
+    Executa o ``dumper`` de forma incremental a partir de ``previous_file``
+    ou completa quando nenhuma saída anterior é informada, registrando o
+    checkpoint de ``output_file`` ao final.
+    """
+    started_at = now()
+
+    if not previous_file:
+        dumper.run()
+        write_checkpoint(output_file, started_at)
+        return
+
+    from_date = read_checkpoint(previous_file)
+
+    changed, deleted = document_changes(
+        dumper._articlemeta, dumper.collection, from_date[:10],
+        issns=dumper.issns)
+
+    journals = journal_changes(
+        dumper._articlemeta, dumper.collection, from_date[:10],
+        issns=dumper.issns)
+
+    logger.info('Patching %s: %d changed and %d deleted documents and %d changed journals since %s' % (
+        previous_file, len(changed), len(deleted), len(journals), from_date))
+
+    patch(dumper, previous_file, changed, deleted, journals)
+    dumper.output_file.close()
+    write_checkpoint(output_file, started_at)
+    logger.info('Export finished')
@@ -9,9 +9,11 @@ Formato de saída:
 
 import argparse
 import logging
-import codecs
 
 import utils
+import metrics
+import profiling
+import output
 
 logger = logging.getLogger(__name__)
 
@@ -50,19 +52,19 @@ class Dumper(object):
         self._articlemeta = utils.articlemeta_server()
         self.collection = collection
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
+        self.output_file = output.CSVWriter(output_file)
         header = [u"issn scielo",u"issn impresso",u"issn eletrônico",u"nome do publicador",u"título",u"título abreviado",u"título nlm",u"periodicidade",u"área temática",u"bases WOS",u"áreas temáticas WOS",u"situação atual",u"ano de inclusão",u"licença de uso padrão"]
         self.write(','.join(header))
 
     def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def writerows(self, rows):
+        self.output_file.writerows(rows)
 
     def run(self):
-        for item in self.items():
-            self.write(item)
+        self.writerows(self.items())
+        self.output_file.close()
         logger.info('Export finished')
 
     def items(self):
@@ -74,6 +76,7 @@ class Dumper(object):
             for data in self._articlemeta.journals(collection=self.collection, issn=issn):
                 yield self.fmt_csv(data)
         
+    @profiling.timed('format')
     def fmt_csv(self, data):
 
         line = [
@@ -97,9 +100,7 @@ class Dumper(object):
         else:
             line.append("")
 
-        joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in line])
-
-        return joined_line
+        return line
 
 
 def main():
@@ -126,6 +127,12 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Report the time and throughput of each processing stage'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -142,6 +149,11 @@ def main():
 
     args = parser.parse_args()
     _config_logging(args.logging_level, args.logging_file)
+    metrics.set_logger(logger)
+
+    if args.profile:
+        profiling.enable(logger)
+
     logger.info('Dumping data for: %s' % args.collection)
 
     issns = None
@@ -0,0 +1,113 @@
+# coding: utf-8
+"""
+Retomada de execuções interrompidas.
+
+Durante a execução é registrado em um arquivo de estado (JSON) a posição do
+último documento cuja saída foi gravada: o ISSN, a posição na listagem de
+identificadores do ISSN (offset) e o PID do documento, além do tamanho do
+arquivo de saída naquele momento. Ao retomar, a saída é truncada nesse
+tamanho, descartando linhas gravadas após o último checkpoint, e a leitura
+dos documentos recomeça na posição registrada.
+"""
+import os
+import io
+import json
+import logging
+import datetime
+
+logger = logging.getLogger(__name__)
+
+STATE_SUFFIX = '.state'
+
+
+def state_file(output_file):
+
+    return output_file + STATE_SUFFIX
+
+
+class Checkpoint(object):
+
+    def __init__(self, path):
+        self.path = path
+
+    def read(self):
+        """
+        Retorna o último estado registrado ou None.
+        """
+        if not os.path.exists(self.path):
+            return None
+
+        with io.open(self.path, 'r', encoding='utf-8') as f:
+            return json.loads(f.read())
+
+    def commit(self, issn, offset, pid, output_size=None):
+        """
+        Registra o estado de forma atômica, substituindo o arquivo anterior
+        apenas após a gravação completa do novo estado.
+        """
+        state = {
+            'issn': issn,
+            'offset': offset,
+            'pid': pid,
+            'output_size': output_size,
+            'date': datetime.datetime.now().isoformat()
+        }
+
+        temp = self.path + '.tmp'
+        with io.open(temp, 'wb') as f:
+            f.write(json.dumps(state).encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(temp, self.path)
+
+        logger.debug('Checkpoint %s: %s at offset %d' % (self.path, pid, offset))
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def truncate(output_file, size):
+    """
+    Descarta o conteúdo de ``output_file`` gravado após ``size`` bytes.
+    """
+    with io.open(output_file, 'r+b') as f:
+        f.truncate(size)
+
+
+def documents(articlemeta, issns, state=None, **kwargs):
+    """
+    Gera (issn, offset, documento) para os documentos de ``issns``, onde
+    offset é a posição seguinte ao documento na listagem do ISSN. Com
+    ``state`` os ISSNs anteriores ao registrado são ignorados e a leitura
+    do ISSN registrado recomeça após o último documento processado.
+
+    ``kwargs`` são repassados a ArticleMeta.documents().
+    """
+    start = 0
+    if state:
+        if state['issn'] not in issns:
+            raise ValueError('Checkpoint ISSN %s is not among the given ISSNs' % state['issn'])
+        start = issns.index(state['issn'])
+
+    for index, issn in enumerate(issns[start:]):
+        offset = 0
+        last_pid = None
+
+        # O documento do checkpoint é solicitado novamente para confirmar
+        # que a listagem não mudou desde a execução anterior.
+        if state and index == 0 and state['offset'] > 0:
+            offset = state['offset'] - 1
+            last_pid = state['pid']
+
+        for document in articlemeta.documents(issn=issn, offset=offset, **kwargs):
+            offset += 1
+
+            if last_pid is not None:
+                pid, last_pid = last_pid, None
+                if document.publisher_id == pid:
+                    continue
+                logger.warning('Documents list changed since the checkpoint, expected %s but found %s' % (
+                    pid, document.publisher_id))
+
+            yield issn, offset, document
@@ -59,5 +59,8 @@ setup(
     processing_export_kbart=export.kbart:main
     processing_bibliometric_citedby=bibliometric.citedby:main
     processing_bibliometric_impact_factor=bibliometric.impact_factor:main
+    processing_benchmark_json_decoding=benchmarks.json_decoding:main
+    processing_benchmark_xml_validation=benchmarks.xml_validation:main
+    processing_benchmark_natural_keys=benchmarks.natural_keys:main
     """
 )
@@ -0,0 +1,124 @@
+# coding: utf-8
+"""
+Execução paralela das tabulações distribuindo os ISSNs entre processos.
+
+Cada ISSN (shard) é processado por um Dumper próprio em um processo do pool,
+gravando um arquivo parcial. Ao final, os arquivos parciais são concatenados
+na ordem dos ISSNs, mantendo apenas o cabeçalho do primeiro, de modo que o
+resultado não depende da ordem de conclusão dos processos.
+
+Quando nenhum ISSN é informado os shards são os periódicos da coleção, e não
+faixas de offsets da listagem de identificadores: os Dumpers percorrem os
+documentos por ISSN e a divisão por periódico cobre todos os documentos sem
+depender da contagem total de identificadores.
+
+O perfil das etapas (--profile) medido em cada shard é somado ao perfil do
+processo principal.
+
+O pool de processos é criado antes de qualquer cliente thrift do processo
+principal, cujas threads (prefetch de identificadores, pools de conexões) não
+devem ser herdadas pelos processos filhos.
+"""
+import io
+import os
+import shutil
+import logging
+import importlib
+import multiprocessing
+
+import utils
+import output
+import profiling
+from thrift import pool
+
+logger = logging.getLogger(__name__)
+
+PROCESSES = 1
+
+
+def part_file(output_file, index):
+
+    return '%s.part%05d' % (output_file, index)
+
+
+def collection_issns(collection):
+    articlemeta = utils.articlemeta_server()
+
+    return sorted(set(
+        journal.scielo_issn for journal in articlemeta.journals(collection=collection)))
+
+
+def _init_worker():
+    pool.reset_after_fork()
+
+
+def _run_shard(shard):
+    """
+    Executa um shard e retorna o arquivo parcial e o snapshot do perfil das
+    etapas executadas no shard.
+    """
+    module_name, collection, issn, output_file, kwargs = shard
+    module = importlib.import_module(module_name)
+    profiling.profiler.reset()
+
+    logger.info('Running shard %s of %s' % (issn, module_name))
+    dumper = module.Dumper(collection, [issn], output_file=output_file, **kwargs)
+    dumper.run()
+
+    if dumper.output_file:
+        dumper.output_file.close()
+
+    return output_file, profiling.profiler.snapshot()
+
+
+def merge(parts, output_file, header=True):
+    """
+    Concatena ``parts`` em ``output_file`` na ordem informada. Com
+    ``header`` a primeira linha de cada parte, exceto da primeira, é
+    descartada. ``output_file`` é comprimido conforme a extensão.
+    """
+    merged = output.open_output(output_file)
+    try:
+        for index, part in enumerate(parts):
+            with io.open(part, 'rb') as f:
+                if header and index > 0:
+                    f.readline()
+                shutil.copyfileobj(f, merged, output.BUFFER_SIZE)
+    finally:
+        merged.close()
+
+
+def run(module_name, collection, issns, output_file, processes=PROCESSES,
+    header=True, **kwargs):
+    """
+    Executa o Dumper de ``module_name`` para cada ISSN em um pool de
+    ``processes`` processos e consolida o resultado em ``output_file``.
+    ``kwargs`` são repassados ao construtor de cada Dumper.
+    """
+    workers = multiprocessing.Pool(processes, initializer=_init_worker)
+    try:
+        issns = sorted(set(issns or collection_issns(collection)))
+
+        shards = [
+            (module_name, collection, issn, part_file(output_file, index), kwargs)
+            for index, issn in enumerate(issns)
+        ]
+
+        logger.info('Dumping %d shards with %d processes' % (len(shards), processes))
+
+        results = workers.map(_run_shard, shards, chunksize=1)
+    finally:
+        workers.close()
+        workers.join()
+
+    parts = []
+    for part, snapshot in results:
+        parts.append(part)
+        profiling.profiler.merge(snapshot)
+
+    merge(parts, output_file, header=header)
+
+    for part in parts:
+        os.remove(part)
+
+    logger.info('Export finished')
@@ -0,0 +1,63 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+from accesses import columnar
+
+
+@unittest.skipIf(not columnar.is_available(), 'pyarrow is not installed')
+class ParquetWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.output_file = os.path.join(self.tmpdir, 'accesses.parquet')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _row(self, day, total):
+        return {
+            'id': u'scl_S0000-00002000000100001',
+            'collection': u'scl',
+            'pid': u'S0000-00002000000100001',
+            'issn': u'0000-0000',
+            'journal_title': u'Revista',
+            'subject_areas': [u'Health Sciences'],
+            'languages': [u'pt', u'en'],
+            'aff_countries': [],
+            'access_date': u'2015-01-%02d' % day,
+            'access_year': u'2015',
+            'access_month': u'01',
+            'access_day': u'%02d' % day,
+            'access_html': total,
+            'access_total': total,
+        }
+
+    def test_write_row_groups(self):
+        writer = columnar.ParquetWriter(self.output_file, row_group_size=2)
+
+        for day in range(1, 6):
+            writer.write(self._row(day, day * 10))
+        writer.close()
+        writer.close()
+
+        parquet_file = columnar.pq.ParquetFile(self.output_file)
+        self.assertEqual(parquet_file.metadata.num_row_groups, 3)
+
+        table = parquet_file.read().to_pydict()
+        self.assertEqual(table['access_total'], [10, 20, 30, 40, 50])
+        self.assertEqual(table['access_pdf'], [0, 0, 0, 0, 0])
+        self.assertEqual(table['issn'], [u'0000-0000'] * 5)
+        self.assertEqual(table['languages'][0], [u'pt', u'en'])
+        self.assertEqual(table['document_title'], [None] * 5)
+
+    def test_text_columns_are_dictionary_encoded(self):
+        writer = columnar.ParquetWriter(self.output_file)
+        writer.write(self._row(1, 1))
+        writer.close()
+
+        schema = columnar.pq.read_schema(self.output_file)
+        self.assertTrue(columnar.pa.types.is_dictionary(schema.field('issn').type))
+        self.assertTrue(columnar.pa.types.is_int64(schema.field('access_total').type))
@@ -1,4 +1,5 @@
 # coding: utf-8
+import json
 import unittest
 
 from accesses import dumpdata
@@ -322,6 +323,57 @@ class DumpDataTest(unittest.TestCase):
         self.assertEqual(sorted(result), sorted(expected))
 
 
+    def test_join_accesses_filters_period_without_changing_input(self):
+        record = {
+            "html": {
+                "total": 7,
+                "y2012": {
+                    "m01": {
+                        "d08": 3,
+                        "d31": 1,
+                        "total": 4
+                    },
+                    "m02": {
+                        "d01": 2,
+                        "total": 2
+                    },
+                    "total": 6
+                },
+                "y2013": {
+                    "m01": {
+                        "d01": 1,
+                        "total": 1
+                    },
+                    "total": 1
+                }
+            },
+            "pdf": {
+                "total": 2,
+                "y2012": {
+                    "m01": {
+                        "d08": 2,
+                        "total": 2
+                    },
+                    "total": 2
+                }
+            }
+        }
+
+        original = json.loads(json.dumps(record))
+
+        dayly = dumpdata.join_accesses('S0102-67202009000300001', [record, record], '2012-01-08', '2012-01-31', True)
+        monthly = dumpdata.join_accesses('S0102-67202009000300001', [record], '2012-02', '2013-01', False)
+
+        self.assertEqual(dayly, {
+            '2012-01-08': {'html': 6, 'pdf': 4},
+            '2012-01-31': {'html': 2}
+        })
+        self.assertEqual(monthly, {
+            '2012-02': {'html': 2},
+            '2013-01': {'html': 1}
+        })
+        self.assertEqual(record, original)
+
     def test_join_metadata_with_accesses(self):
 
         from tests.fixtures import articlemeta
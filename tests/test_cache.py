@@ -0,0 +1,65 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+from thrift.cache import DocumentCache
+
+
+class DocumentCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = DocumentCache(os.path.join(self.tmpdir, 'cache.sqlite'))
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_get_missing_document(self):
+
+        self.assertIsNone(self.cache.get('scl', 'S0000', 'xylose', '2015-01-01'))
+
+    def test_get_stored_document(self):
+        self.cache.set('scl', 'S0000', 'xylose', '2015-01-01', '{"a": 1}')
+
+        result = self.cache.get('scl', 'S0000', 'xylose', '2015-01-01')
+
+        self.assertEqual(result, '{"a": 1}')
+
+    def test_get_outdated_document(self):
+        self.cache.set('scl', 'S0000', 'xylose', '2015-01-01', '{"a": 1}')
+
+        result = self.cache.get('scl', 'S0000', 'xylose', '2015-02-01')
+
+        self.assertIsNone(result)
+
+    def test_documents_are_keyed_by_format(self):
+        self.cache.set('scl', 'S0000', 'xylose', '2015-01-01', '{"a": 1}')
+        self.cache.set('scl', 'S0000', 'xmlrsps', '2015-01-01', '<article/>')
+
+        self.assertEqual(self.cache.get('scl', 'S0000', 'xylose', '2015-01-01'), '{"a": 1}')
+        self.assertEqual(self.cache.get('scl', 'S0000', 'xmlrsps', '2015-01-01'), '<article/>')
+
+    def test_set_replaces_document(self):
+        self.cache.set('scl', 'S0000', 'xylose', '2015-01-01', '{"a": 1}')
+        self.cache.set('scl', 'S0000', 'xylose', '2015-02-01', '{"a": 2}')
+
+        result = self.cache.get('scl', 'S0000', 'xylose', '2015-02-01')
+
+        self.assertEqual(result, '{"a": 2}')
+
+    def test_delete(self):
+        self.cache.set('scl', 'S0000', 'xylose', '2015-01-01', '{"a": 1}')
+        self.cache.delete('scl', 'S0000')
+
+        self.assertIsNone(self.cache.get('scl', 'S0000', 'xylose', '2015-01-01'))
+
+    def test_persistence(self):
+        self.cache.set('scl', 'S0000', 'xylose', '2015-01-01', '{"a": 1}')
+        self.cache.close()
+
+        self.cache = DocumentCache(os.path.join(self.tmpdir, 'cache.sqlite'))
+
+        self.assertEqual(self.cache.get('scl', 'S0000', 'xylose', '2015-01-01'), '{"a": 1}')
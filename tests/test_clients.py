@@ -1,9 +1,304 @@
 # coding: utf-8
+import os
+import json
+import time
+import random
+import shutil
+import tempfile
 import unittest
+from multiprocessing.pool import ThreadPool
 
+from thrift import clients, pool
+from thrift.cache import DocumentCache
 from utils import accessstats_server, publicationstats_server
 
 
+class OrderedMapTest(unittest.TestCase):
+
+    def test_ordered_map_keeps_input_order(self):
+
+        def slow_double(value):
+            time.sleep(random.random() / 100)
+            return value * 2
+
+        executor = ThreadPool(4)
+
+        result = list(clients.ordered_map(executor, slow_double, range(50), 8))
+
+        self.assertEqual(result, [i * 2 for i in range(50)])
+
+    def test_ordered_map_raises_worker_exception(self):
+
+        def fail(value):
+            if value == 3:
+                raise clients.ServerError('fail')
+            return value
+
+        executor = ThreadPool(2)
+
+        with self.assertRaises(clients.ServerError):
+            list(clients.ordered_map(executor, fail, range(10), 4))
+
+
+class FakeArticleMetaClient(object):
+
+    def __init__(self, total):
+        self.total = total
+        self.requested_offsets = []
+        self.requested_articles = 0
+        self.requested_journals = []
+        self.replace_journal_metadata = []
+
+    def get_article_identifiers(self, collection=None, issn=None,
+        from_date=None, until_date=None, limit=None, offset=None):
+        self.requested_offsets.append(offset)
+        return [
+            clients.articlemeta_thrift.article_identifiers(
+                code='S0000-0000%013d' % i, collection=collection,
+                processing_date='2015-01-01')
+            for i in range(offset, min(offset + limit, self.total))
+        ]
+
+    def get_article(self, code=None, collection=None,
+        replace_journal_metadata=None, fmt=None):
+        self.requested_articles += 1
+        self.replace_journal_metadata.append(replace_journal_metadata)
+        return '{"code": "%s"}' % code
+
+    def get_journal(self, code=None, collection=None):
+        self.requested_journals.append(code)
+        return '{"code": "%s", "v100": [{"_": "Journal %s"}]}' % (code, code)
+
+    def close(self):
+        pass
+
+
+class ArticleMetaDocumentsTest(unittest.TestCase):
+
+    def _articlemeta(self, total, workers, cache=None, journal_cache=True):
+        fake = FakeArticleMetaClient(total)
+        articlemeta = clients.ArticleMeta(
+            'localhost', 0, workers=workers, cache=cache,
+            journal_cache=journal_cache)
+        articlemeta._pool = pool.ConnectionPool(lambda: fake, size=workers)
+
+        return articlemeta, fake
+
+    def test_documents_sequential(self):
+        articlemeta, fake = self._articlemeta(2500, 1)
+
+        result = list(articlemeta.documents(collection='scl', fmt='json'))
+
+        self.assertEqual(len(result), 2500)
+        self.assertEqual(fake.requested_offsets, [0, 1000, 2000, 3000])
+
+    def test_documents_concurrent_keeps_order(self):
+        articlemeta, fake = self._articlemeta(2500, 4)
+
+        result = list(articlemeta.documents(collection='scl', fmt='json'))
+
+        expected = ['{"code": "S0000-0000%013d"}' % i for i in range(2500)]
+        self.assertEqual(result, expected)
+
+    def test_documents_served_from_cache(self):
+        tmpdir = tempfile.mkdtemp()
+        cache = DocumentCache(os.path.join(tmpdir, 'cache.sqlite'))
+
+        articlemeta, fake = self._articlemeta(10, 1, cache=cache)
+        first = list(articlemeta.documents(collection='scl', fmt='json'))
+
+        articlemeta, fake = self._articlemeta(10, 1, cache=cache)
+        second = list(articlemeta.documents(collection='scl', fmt='json'))
+
+        cache.close()
+        shutil.rmtree(tmpdir)
+
+        self.assertEqual(first, second)
+        self.assertEqual(fake.requested_articles, 0)
+
+    def test_documents_share_journal_metadata(self):
+        articlemeta, fake = self._articlemeta(30, 4)
+
+        result = list(articlemeta.documents(collection='scl'))
+
+        self.assertEqual(fake.requested_journals, ['0000-0000'])
+        self.assertEqual(set(fake.replace_journal_metadata), set([False]))
+        self.assertEqual(result[0].journal.title, 'Journal 0000-0000')
+        self.assertTrue(result[0].journal is result[-1].journal)
+
+    def test_documents_without_journal_cache(self):
+        articlemeta, fake = self._articlemeta(3, 1, journal_cache=False)
+
+        list(articlemeta.documents(collection='scl'))
+
+        self.assertEqual(fake.requested_journals, [])
+        self.assertEqual(fake.replace_journal_metadata, [True, True, True])
+
+
+class FakeFullArticleMetaClient(FakeArticleMetaClient):
+
+    def get_article(self, code=None, collection=None,
+        replace_journal_metadata=None, fmt=None):
+        self.requested_articles += 1
+        return json.dumps({
+            'code': code,
+            'article': {'v880': [{'_': code}]},
+            'citations': [{'v30': [{'_': 'Journal'}]}],
+            'license': 'by/4.0'
+        })
+
+
+class ArticleMetaProjectionTest(unittest.TestCase):
+
+    def test_project(self):
+        data = {'article': {}, 'citations': [], 'license': 'by', 'body': {}}
+
+        self.assertEqual(
+            clients.project(data, ['license']), {'article': {}, 'license': 'by'})
+
+    def test_document_fields(self):
+        tmpdir = tempfile.mkdtemp()
+        cache = DocumentCache(os.path.join(tmpdir, 'cache.sqlite'))
+        fake = FakeFullArticleMetaClient(1)
+        articlemeta = clients.ArticleMeta(
+            'localhost', 0, cache=cache, journal_cache=False)
+        articlemeta._pool = pool.ConnectionPool(lambda: fake, size=1)
+
+        first = articlemeta.document(
+            'S0000-00000000000000000', 'scl', processing_date='2015-01-01',
+            fields=['license'])
+        second = articlemeta.document(
+            'S0000-00000000000000000', 'scl', processing_date='2015-01-01',
+            fields=['license'])
+        cached = cache.get(
+            'scl', 'S0000-00000000000000000', 'xylose:license', '2015-01-01')
+
+        cache.close()
+        shutil.rmtree(tmpdir)
+
+        self.assertEqual(fake.requested_articles, 1)
+        self.assertEqual(sorted(first.data.keys()), ['article', 'code', 'license'])
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first.permissions['id'], 'by/4.0')
+        self.assertNotIn('citations', json.loads(cached))
+
+    def test_document_fields_decoded_once(self):
+        tmpdir = tempfile.mkdtemp()
+        cache = DocumentCache(os.path.join(tmpdir, 'cache.sqlite'))
+        fake = FakeFullArticleMetaClient(1)
+        articlemeta = clients.ArticleMeta(
+            'localhost', 0, cache=cache, journal_cache=False)
+        articlemeta._pool = pool.ConnectionPool(lambda: fake, size=1)
+
+        decoded = []
+        loads = clients.decoder.loads
+
+        def counted_loads(data):
+            decoded.append(data)
+            return loads(data)
+
+        clients.decoder.loads = counted_loads
+        try:
+            document = articlemeta.document(
+                'S0000-00000000000000000', 'scl', processing_date='2015-01-01',
+                fields=['license'])
+        finally:
+            clients.decoder.loads = loads
+            cache.close()
+            shutil.rmtree(tmpdir)
+
+        self.assertEqual(len(decoded), 1)
+        self.assertEqual(sorted(document.data.keys()), ['article', 'code', 'license'])
+
+
+class FakeAccessStatsClient(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.requested_issns = []
+
+    def search(self, body, parameters):
+        body = json.loads(body)
+        issns = [i['terms']['issn'] for i in body['query']['bool']['must'] if 'terms' in i]
+        self.requested_issns.append(issns[0] if issns else None)
+
+        assert body['aggs']['issn']['terms']['size'] == 0
+
+        buckets = [
+            i for i in self.buckets if not issns or i['key'] in issns[0]]
+
+        return json.dumps({'aggregations': {'issn': {'buckets': buckets}}})
+
+    def close(self):
+        pass
+
+
+class AccessStatsBulkTest(unittest.TestCase):
+
+    def _access_year(self, access_year, total):
+        bucket = {'key': access_year, 'doc_count': 1}
+        for field in ['access_html', 'access_abstract', 'access_pdf', 'access_epdf']:
+            bucket[field] = {'value': 0.0}
+        bucket['access_total'] = {'value': float(total)}
+
+        return bucket
+
+    def _issn(self, issn, publication_years):
+        return {
+            'key': issn,
+            'doc_count': 1,
+            'publication_year': {'buckets': [
+                {
+                    'key': publication_year,
+                    'doc_count': 1,
+                    'access_year': {'buckets': [
+                        self._access_year(access_year, total)
+                        for access_year, total in access_years
+                    ]}
+                } for publication_year, access_years in publication_years
+            ]}
+        }
+
+    def _accessstats(self, fake):
+        accessstats = clients.AccessStats('localhost', 0)
+        accessstats._pool = pool.ConnectionPool(lambda: fake, size=1)
+
+        return accessstats
+
+    def setUp(self):
+        self.fake = FakeAccessStatsClient([
+            self._issn('0000-0000', [('2010', [('2015', 10)]), ('2009', [('2015', 5)])]),
+            self._issn('1111-1111', [('2012', [('2014', 7)])]),
+            self._issn('2222-2222', [('2013', [('2014', 3)])]),
+        ])
+
+    def test_access_lifetime_bulk_collection(self):
+
+        result = self._accessstats(self.fake).access_lifetime_bulk('scl')
+
+        self.assertEqual(self.fake.requested_issns, [None])
+        self.assertEqual(result, {
+            '0000-0000': [
+                ['2009', '2015', 0, 0, 0, 0, 5],
+                ['2010', '2015', 0, 0, 0, 0, 10]
+            ],
+            '1111-1111': [
+                ['2012', '2014', 0, 0, 0, 0, 7]
+            ],
+            '2222-2222': [
+                ['2013', '2014', 0, 0, 0, 0, 3]
+            ]
+        })
+
+    def test_access_lifetime_bulk_issns_in_chunks(self):
+
+        result = self._accessstats(self.fake).access_lifetime_bulk(
+            'scl', issns=['0000-0000', '1111-1111', '2222-2222'], chunk_size=2)
+
+        self.assertEqual(self.fake.requested_issns, [['0000-0000', '1111-1111'], ['2222-2222']])
+        self.assertEqual(sorted(result.keys()), ['0000-0000', '1111-1111', '2222-2222'])
+
+
 class ThirftClientsTest(unittest.TestCase):
 
     def test_compute_last_included_document_by_journal_without_data(self):
@@ -0,0 +1,37 @@
+# coding: utf-8
+import json
+import unittest
+
+from thrift import decoder
+from tests.fixtures import articlemeta
+
+
+class DecoderTest(unittest.TestCase):
+
+    def tearDown(self):
+        decoder.use()
+
+    def test_default_backend_is_first_available(self):
+
+        self.assertEqual(decoder.backend, decoder.available_backends()[0])
+
+    def test_backends_decode_alike(self):
+        payload = json.dumps(articlemeta.document)
+
+        for name in decoder.available_backends():
+            decoder.use(name)
+            self.assertEqual(decoder.loads(payload), articlemeta.document)
+
+    def test_invalid_json_raises_value_error(self):
+
+        for name in decoder.available_backends():
+            decoder.use(name)
+            with self.assertRaises(ValueError):
+                decoder.loads('{"code": ')
+
+    def test_unavailable_backend(self):
+
+        with self.assertRaises(ValueError):
+            decoder.use('missing_json_backend')
+
+        self.assertEqual(decoder.backend, decoder.available_backends()[0])
@@ -0,0 +1,107 @@
+# coding: utf-8
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from export import doaj_validation
+
+RECORD = u"""<records>
+  <record>
+    <journalTitle>Revista de Saúde Pública</journalTitle>
+    <issn>0034-8910</issn>
+    <publicationDate>2016-03-01</publicationDate>
+    <title>Título do documento</title>
+    <fullTextUrl format="html">http://www.scielo.br/scielo.php?pid=S0034-89102016000100001</fullTextUrl>
+  </record>
+</records>"""
+
+INVALID_RECORD = u"""<records>
+  <record>
+    <journalTitle>Revista de Saúde Pública</journalTitle>
+    <title>Título do documento</title>
+  </record>
+</records>"""
+
+
+def local_xsd(directory):
+    """
+    Cópia do doajArticles.xsd sem o import remoto dos códigos de idioma.
+    """
+    with open(doaj_validation.DOAJ_XSD) as f:
+        xsd = f.read()
+
+    xsd = re.sub(r'<xs:import .*?</xs:import>', '', xsd, flags=re.S)
+    xsd = xsd.replace('iso_639-2b:LanguageCodeType', 'xs:string')
+
+    path = os.path.join(directory, 'doajArticles.xsd')
+    with open(path, 'w') as f:
+        f.write(xsd)
+
+    return path
+
+
+class DOAJValidationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.xsd = doaj_validation.DOAJ_XSD
+        doaj_validation.DOAJ_XSD = local_xsd(self.directory)
+        doaj_validation._schema = None
+
+    def tearDown(self):
+        doaj_validation.DOAJ_XSD = self.xsd
+        doaj_validation._schema = None
+        shutil.rmtree(self.directory)
+
+    def test_valid_text(self):
+        self.assertEqual(doaj_validation.validate_xml(RECORD), (True, None))
+
+    def test_valid_bytes(self):
+        self.assertEqual(doaj_validation.validate_xml(RECORD.encode('utf-8')), (True, None))
+
+    def test_invalid(self):
+        valid, message = doaj_validation.validate_xml(INVALID_RECORD)
+
+        self.assertFalse(valid)
+        self.assertTrue(message.startswith('XML is not valid: '))
+
+    def test_not_well_formed(self):
+        valid, message = doaj_validation.validate_xml(u'<records><record></records>')
+
+        self.assertFalse(valid)
+        self.assertTrue(message.startswith('XML is not well formed: '))
+
+    def test_empty(self):
+        self.assertEqual(doaj_validation.validate_xml(u''), (False, 'Empty document'))
+        self.assertEqual(doaj_validation.validate_xml(None), (False, 'Empty document'))
+
+    def test_schema_is_compiled_once(self):
+        self.assertIs(doaj_validation.schema(), doaj_validation.schema())
+
+    def test_validator_keeps_order(self):
+        items = [('S1', RECORD), ('S2', INVALID_RECORD), ('S3', u''), ('S4', RECORD.encode('utf-8'))]
+
+        for processes in [1, 2]:
+            validator = doaj_validation.SchemaValidator(processes, chunksize=1)
+            try:
+                results = validator.validate(items)
+            finally:
+                validator.close()
+
+            self.assertEqual([valid for valid, message in results], [True, False, False, True])
+
+    def test_validator_without_schema(self):
+        with open(doaj_validation.DOAJ_XSD, 'w') as f:
+            f.write(u'<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema"><xs:element')
+
+        validator = doaj_validation.SchemaValidator(2)
+        try:
+            self.assertIsNone(validator._pool)
+            results = validator.validate([('S1', RECORD), ('S2', RECORD)])
+        finally:
+            validator.close()
+
+        self.assertEqual([valid for valid, message in results], [False, False])
+        self.assertTrue(results[0][1].startswith('DOAJ schema not available: '))
@@ -0,0 +1,88 @@
+# coding: utf-8
+import unittest
+
+from lxml import etree
+
+try:
+    from export import natural_keys
+except ImportError:
+    natural_keys = None
+
+XML = u"""<article>
+<front>
+<journal-meta>
+<journal-title-group><journal-title> Revista de Teste </journal-title></journal-title-group>
+</journal-meta>
+<article-meta>
+<article-id pub-id-type="other">00001</article-id>
+<pub-date><year>2015</year></pub-date>
+<volume>10</volume>
+<issue>2</issue>
+<fpage>100</fpage>
+<lpage>110</lpage>
+</article-meta>
+</front>
+<body><p>Texto</p></body>
+</article>"""
+
+
+class FakeTree(object):
+
+    def __init__(self, xml):
+        self.lxml = etree.ElementTree(etree.fromstring(xml))
+
+
+class FakeDocument(object):
+
+    collection_acronym = u'scl'
+    publisher_id = u'S0000-00002015000200100'
+
+
+@unittest.skipIf(natural_keys is None, 'packtools is not installed')
+class NaturalKeysTest(unittest.TestCase):
+
+    def test_natural_key_values(self):
+        result = natural_keys.natural_key_values(FakeTree(XML))
+
+        self.assertEqual(
+            result,
+            [u'Revista de Teste', u'10', u'2', u'2015', u'100', None, u'110', None, u'00001'])
+
+    def test_fmt_json(self):
+        dumper = natural_keys.Dumper.__new__(natural_keys.Dumper)
+
+        values = natural_keys.natural_key_values(FakeTree(XML))
+        result = dumper.fmt_json(FakeDocument(), values)
+
+        self.assertEqual(
+            result,
+            [u'scl', u'S0000-00002015000200100', u'Revista de Teste', u'10', u'2',
+             u'2015', u'100', '', u'110', '', u'00001',
+             u'revista-de-teste_10_2_2015_100_none_110_none_00001'])
+
+    def test_front_tree_stops_after_front(self):
+        body = u'<p>Texto</p>' * 50000
+        xml = XML.replace(u'<body><p>Texto</p></body>', u'<body>%s<unclosed></body>' % body)
+
+        tree = natural_keys.front_tree(xml)
+
+        self.assertEqual([i.tag for i in tree.getroot()], ['front'])
+        self.assertEqual(
+            natural_keys._extract_front(('S0000-00002015000200100', xml)),
+            natural_keys.natural_key_values(FakeTree(XML)))
+
+    def test_front_tree_from_bytes(self):
+        xml = u'<?xml version="1.0" encoding="utf-8"?>\n%s' % XML
+
+        tree = natural_keys.front_tree(xml.encode('utf-8'))
+
+        self.assertEqual(tree.getroot().tag, 'article')
+
+    def test_front_tree_with_dtd_entities(self):
+        xml = XML.replace(u'<volume>10</volume>', u'<volume>10&nbsp;</volume>')
+
+        self.assertIsNone(natural_keys.front_tree(xml))
+
+    def test_front_tree_with_invalid_xml(self):
+        self.assertIsNone(natural_keys.front_tree(u'<article><front>'))
+        self.assertIsNone(natural_keys.front_tree(u''))
@@ -0,0 +1,55 @@
+# coding: utf-8
+import unittest
+
+from export import validation
+
+
+class FakeDocument(object):
+
+    def __init__(self, publisher_id):
+        self.publisher_id = publisher_id
+        self.collection_acronym = u'scl'
+        self.processing_date = u'2015-01-01'
+
+
+class FakeArticleMeta(object):
+
+    def document(self, code, collection, fmt='xylose', processing_date=None):
+        if code == 'S0002':
+            raise ValueError('unavailable')
+
+        return u'<article id="%s"/>' % code
+
+
+def length(item):
+    code, xml = item
+
+    return len(xml)
+
+
+class ValidationPipelineTest(unittest.TestCase):
+
+    def test_fetch_xml(self):
+        articlemeta = FakeArticleMeta()
+
+        self.assertEqual(validation.fetch_xml(articlemeta, FakeDocument('S0001')), u'<article id="S0001"/>')
+        self.assertEqual(validation.fetch_xml(articlemeta, FakeDocument('S0002')), u'')
+
+    def test_fetch_xmls(self):
+        documents = [FakeDocument('S%04d' % i) for i in range(1, 6)]
+
+        result = list(validation.fetch_xmls(FakeArticleMeta(), iter(documents), threads=3))
+
+        self.assertEqual([document for document, xml in result], documents)
+        self.assertEqual(result[0][1], u'<article id="S0001"/>')
+        self.assertEqual(result[1][1], u'')
+
+    def test_process_xmls(self):
+        items = [(FakeDocument('S%04d' % i), u'x' * i) for i in range(20)]
+
+        for processes in [1, 3]:
+            result = list(validation.process_xmls(length, iter(items), processes, chunksize=2))
+
+            self.assertEqual(
+                [(document.publisher_id, size) for document, size in result],
+                [('S%04d' % i, i) for i in range(20)])
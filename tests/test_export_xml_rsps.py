@@ -0,0 +1,77 @@
+# coding: utf-8
+import unittest
+
+try:
+    from export import xml_rsps
+except ImportError:
+    xml_rsps = None
+
+
+class FakeError(object):
+
+    def __init__(self, message):
+        self.message = message
+
+    def get_apparent_element(self, lxml):
+        raise ValueError()
+
+
+class FakeValidator(object):
+
+    lxml = None
+
+    def __init__(self, dtd_errors=None, sps_errors=None):
+        self.dtd_errors = dtd_errors or []
+        self.sps_errors = sps_errors or []
+        self.calls = {'validate': 0, 'validate_style': 0}
+
+    def validate(self):
+        self.calls['validate'] += 1
+        return not self.dtd_errors, self.dtd_errors
+
+    def validate_style(self):
+        self.calls['validate_style'] += 1
+        return not self.sps_errors, self.sps_errors
+
+
+class FakeDocument(object):
+
+    def __init__(self, publisher_id):
+        self.publisher_id = publisher_id
+
+
+@unittest.skipIf(xml_rsps is None, 'packtools is not installed')
+class SummarizeTest(unittest.TestCase):
+
+    def test_each_validation_runs_once(self):
+        validator = FakeValidator(sps_errors=[FakeError(u'missing element')])
+
+        summary = xml_rsps.summarize(validator)
+
+        self.assertEqual(validator.calls, {'validate': 1, 'validate_style': 1})
+        self.assertTrue(summary['dtd_is_valid'])
+        self.assertFalse(summary['sps_is_valid'])
+        self.assertFalse(summary['is_valid'])
+        self.assertEqual(summary['sps_errors'], [{'message': u'missing element', 'apparent_line': None}])
+
+    def test_cached_validator(self):
+        validator = FakeValidator()
+        cached = xml_rsps.CachedValidator(validator)
+
+        self.assertEqual(cached.validate(), (True, []))
+        self.assertEqual(cached.validate(), (True, []))
+        self.assertEqual(cached.validate_style(), (True, []))
+        self.assertIsNone(cached.lxml)
+        self.assertEqual(validator.calls, {'validate': 1, 'validate_style': 1})
+
+    def test_parallel_validations_keep_order(self):
+        dumper = xml_rsps.Dumper.__new__(xml_rsps.Dumper)
+        dumper.processes = 2
+        items = [(FakeDocument('S%04d' % i), u'<invalid') for i in range(25)]
+
+        result = list(dumper.validations(iter(items)))
+
+        self.assertEqual(
+            [document.publisher_id for document, summary in result],
+            [document.publisher_id for document, xml in items])
+        self.assertTrue(all(summary['parsing_error'] for document, summary in result))
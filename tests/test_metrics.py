@@ -0,0 +1,142 @@
+# coding: utf-8
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+
+import metrics
+from thrift import pool
+
+
+class FakeConnection(object):
+
+    def get_article(self, code):
+        if code is None:
+            raise KeyError('code')
+        return u'{"code": "%s"}' % code
+
+    def close(self):
+        pass
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = metrics.Registry(buckets=[0.1, 1])
+
+    def test_timed_records_calls_bytes_and_errors(self):
+        with self.registry.timed('articlemeta') as timer:
+            timer.bytes = 10
+
+        with self.assertRaises(KeyError):
+            with self.registry.timed('articlemeta'):
+                raise KeyError('code')
+
+        endpoint = self.registry.endpoints()[0]
+
+        self.assertEqual(endpoint.calls, 2)
+        self.assertEqual(endpoint.errors, 1)
+        self.assertEqual(endpoint.bytes, 10)
+        self.assertEqual(endpoint.in_flight, 0)
+        self.assertEqual(endpoint.max_in_flight, 1)
+
+    def test_histogram(self):
+        for seconds in [0.05, 0.05, 0.5, 5]:
+            self.registry.start('ratchet')
+            self.registry.finish('ratchet', seconds)
+
+        endpoint = self.registry.endpoints()[0]
+
+        self.assertEqual(endpoint.counts, [2, 1, 1])
+        self.assertEqual(endpoint.quantile(0.5), 0.1)
+        self.assertEqual(endpoint.quantile(0.75), 1)
+        self.assertEqual(endpoint.quantile(1), float('inf'))
+
+    def test_prometheus(self):
+        self.registry.start('ratchet')
+        self.registry.finish('ratchet', 0.5, 100)
+        self.registry.start('ratchet')
+
+        result = self.registry.prometheus().splitlines()
+
+        self.assertIn('# TYPE processing_request_duration_seconds histogram', result)
+        self.assertIn('processing_request_duration_seconds_bucket{endpoint="ratchet",le="0.1"} 0', result)
+        self.assertIn('processing_request_duration_seconds_bucket{endpoint="ratchet",le="1.0"} 1', result)
+        self.assertIn('processing_request_duration_seconds_bucket{endpoint="ratchet",le="+Inf"} 1', result)
+        self.assertIn('processing_request_duration_seconds_count{endpoint="ratchet"} 1', result)
+        self.assertIn('processing_response_bytes_total{endpoint="ratchet"} 100', result)
+        self.assertIn('processing_requests_in_flight{endpoint="ratchet"} 1', result)
+
+    def test_write_prometheus(self):
+        tmpdir = tempfile.mkdtemp()
+        path = os.path.join(tmpdir, 'processing.prom')
+
+        try:
+            self.registry.start('ratchet')
+            self.registry.finish('ratchet', 0.5)
+            self.registry.write_prometheus(path)
+
+            with open(path) as f:
+                self.assertEqual(f.read(), self.registry.prometheus())
+            self.assertEqual(os.listdir(tmpdir), ['processing.prom'])
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_log_line(self):
+        self.registry.start('ratchet')
+        self.registry.finish('ratchet', 0.5, 100, error=True)
+
+        self.assertEqual(
+            self.registry.log_line(),
+            'ratchet calls=1 errors=1 mean=0.500s p95<=1s bytes=100 in_flight=0 max_in_flight=1')
+
+    def test_pool_calls_are_recorded(self):
+        metrics.registry.reset()
+        cpool = pool.ConnectionPool(lambda: FakeConnection(), size=1, name='ArticleMeta')
+
+        cpool.client.get_article('S0001')
+        with self.assertRaises(KeyError):
+            cpool.client.get_article(None)
+
+        endpoint = metrics.registry.endpoints()[0]
+
+        self.assertEqual(endpoint.name, 'ArticleMeta.get_article')
+        self.assertEqual(endpoint.calls, 2)
+        self.assertEqual(endpoint.errors, 1)
+        self.assertEqual(endpoint.bytes, len(u'{"code": "S0001"}'))
+
+    def test_report_logger(self):
+        lines = []
+
+        class FakeLogger(object):
+            def info(self, line):
+                lines.append(line)
+
+        self.registry.start('ratchet')
+        self.registry.finish('ratchet', 0.5, 100)
+
+        metrics.Reporter(self.registry, report_logger=FakeLogger()).report()
+
+        self.assertEqual(lines, ['Requests: %s' % self.registry.log_line()])
+
+    def test_pool_wait_is_not_recorded(self):
+        metrics.registry.reset()
+        cpool = pool.ConnectionPool(lambda: FakeConnection(), size=1, name='ArticleMeta')
+
+        # O único slot do pool fica ocupado durante 0.3s.
+        connection = cpool.acquire()
+        releaser = threading.Timer(0.3, cpool.release, [connection])
+        releaser.start()
+
+        started = time.time()
+        cpool.client.get_article('S0001')
+        waited = time.time() - started
+        releaser.join()
+
+        endpoint = metrics.registry.endpoints()[0]
+
+        self.assertGreaterEqual(waited, 0.25)
+        self.assertLess(endpoint.seconds, 0.2)
+        self.assertEqual(endpoint.max_in_flight, 1)
@@ -0,0 +1,100 @@
+# coding: utf-8
+import os
+import codecs
+import shutil
+import tempfile
+import unittest
+
+import output
+
+
+class CSVWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.output_file = os.path.join(self.tmpdir, 'output.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _read(self):
+        with codecs.open(self.output_file, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def test_rows_are_quoted(self):
+        writer = output.CSVWriter(self.output_file)
+
+        writer.write(u'PID,título')
+        writer.writerow([u'S0001', u'ação "entre aspas"'])
+        writer.writerow([u'S0002', u'a,b\nc'])
+        writer.close()
+
+        self.assertEqual(
+            self._read(),
+            u'PID,título\r\n'
+            u'"S0001","ação ""entre aspas"""\r\n'
+            u'"S0002","a,b\nc"\r\n'
+        )
+
+    def test_lines_keep_order_with_batched_rows(self):
+        writer = output.CSVWriter(self.output_file, batch_size=2)
+
+        writer.writerows([[u'1'], [u'2'], [u'3']])
+        writer.write(u'"4"')
+        writer.writerow([u'5'])
+        writer.close()
+        writer.close()
+
+        self.assertEqual(self._read(), u'"1"\r\n"2"\r\n"3"\r\n"4"\r\n"5"\r\n')
+
+
+class CompressedOutputTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _roundtrip(self, name, threads=1):
+        path = os.path.join(self.tmpdir, name)
+        writer = output.CSVWriter(path, threads=threads)
+        writer.write(u'PID,título')
+        writer.writerows([[u'S%04d' % i, u'ação'] for i in range(2500)])
+        writer.close()
+
+        with output.open_input(path) as f:
+            return f.read()
+
+    def test_compression_by_extension(self):
+
+        self.assertEqual(output.compression('a/accesses.csv.gz'), 'gzip')
+        self.assertEqual(output.compression('accesses.csv.XZ'), 'xz')
+        self.assertEqual(output.compression('accesses.csv.zst'), 'zstd')
+        self.assertIsNone(output.compression('accesses.csv'))
+        self.assertIsNone(output.compression('accesses.csv.gz.part00001'))
+
+    def test_gzip(self):
+        result = self._roundtrip('output.csv.gz')
+
+        self.assertTrue(result.startswith(u'PID,título\r\n"S0000","ação"\r\n'))
+        self.assertEqual(len(result.splitlines()), 2501)
+
+        with open(os.path.join(self.tmpdir, 'output.csv.gz'), 'rb') as f:
+            self.assertEqual(f.read(2), b'\x1f\x8b')
+
+    def test_xz(self):
+        if output.lzma is None:
+            self.skipTest('lzma is not available')
+
+        result = self._roundtrip('output.csv.xz')
+
+        self.assertEqual(len(result.splitlines()), 2501)
+
+    def test_external_compressor(self):
+        if not output._executable('xz'):
+            self.skipTest('xz is not installed')
+
+        result = self._roundtrip('output.csv.xz', threads=2)
+
+        self.assertEqual(len(result.splitlines()), 2501)
@@ -0,0 +1,89 @@
+# coding: utf-8
+import unittest
+
+import pipeline
+
+
+class FakeDocument(object):
+
+    def __init__(self, pid):
+        self.publisher_id = pid
+
+
+class FakeArticleMeta(object):
+
+    def __init__(self, total):
+        self.total = total
+        self.reads = 0
+        self.fields = []
+
+    def documents(self, collection=None, issn=None, fields=None):
+        self.fields.append(fields)
+        for i in range(self.total):
+            self.reads += 1
+            yield FakeDocument('S%04d' % i)
+
+
+class FakeSink(object):
+
+    def __init__(self, fail=False, fields=None):
+        self.processed = []
+        self.fail = fail
+        self.fields = fields
+
+    def process(self, document):
+        if self.fail:
+            raise ValueError('fail')
+        self.processed.append(document.publisher_id)
+
+
+class PipelineTest(unittest.TestCase):
+
+    def _pipeline(self, sinks, total=5):
+        pl = pipeline.Pipeline('scl', sinks=sinks)
+        pl._articlemeta = FakeArticleMeta(total)
+
+        return pl
+
+    def test_documents_are_read_once_for_all_sinks(self):
+        sinks = [FakeSink(), FakeSink(), FakeSink()]
+        pl = self._pipeline(sinks)
+
+        pl.run()
+
+        self.assertEqual(pl._articlemeta.reads, 5)
+        for sink in sinks:
+            self.assertEqual(sink.processed, ['S0000', 'S0001', 'S0002', 'S0003', 'S0004'])
+
+    def test_failing_sink_does_not_stop_others(self):
+        sink = FakeSink()
+        pl = self._pipeline([FakeSink(fail=True), sink])
+
+        pl.run()
+
+        self.assertEqual(len(sink.processed), 5)
+
+    def test_fields_union_of_sinks(self):
+        pl = self._pipeline([FakeSink(fields=['license']), FakeSink(fields=['fulltexts', 'license'])])
+
+        pl.run()
+
+        self.assertEqual(pl._articlemeta.fields, [['fulltexts', 'license']])
+
+    def test_full_documents_when_a_sink_has_no_fields(self):
+        pl = self._pipeline([FakeSink(fields=['license']), FakeSink()])
+
+        pl.run()
+
+        self.assertEqual(pl._articlemeta.fields, [None])
+
+    def test_register_invalid_sink(self):
+        pl = self._pipeline([])
+
+        with self.assertRaises(ValueError):
+            pl.register(object())
+
+    def test_publication_reports_are_registered(self):
+
+        for report in pipeline.PUBLICATION_REPORTS:
+            self.assertIn(report, pipeline.REPORTS)
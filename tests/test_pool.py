@@ -0,0 +1,211 @@
+# coding: utf-8
+import time
+import socket
+import unittest
+
+from thriftpy.transport import TTransportException
+
+from thrift import pool, retry
+
+
+class FakeConnection(object):
+
+    def __init__(self, fail_with=None):
+        self.closed = False
+        self.calls = 0
+        self.fail_with = fail_with
+
+    def ping(self, value):
+        self.calls += 1
+        if self.fail_with:
+            raise self.fail_with
+        return value
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def test_connection_is_reused(self):
+        created = []
+
+        def factory():
+            created.append(FakeConnection())
+            return created[-1]
+
+        cpool = pool.ConnectionPool(factory, size=2)
+
+        for i in range(10):
+            self.assertEqual(cpool.client.ping(i), i)
+
+        self.assertEqual(len(created), 1)
+        self.assertEqual(created[0].calls, 10)
+
+    def test_idle_connection_is_replaced(self):
+        created = []
+
+        def factory():
+            created.append(FakeConnection())
+            return created[-1]
+
+        cpool = pool.ConnectionPool(factory, size=2, idle_timeout=-1)
+
+        cpool.client.ping(1)
+        cpool.client.ping(2)
+
+        self.assertEqual(len(created), 2)
+        self.assertTrue(created[0].closed)
+
+    def test_reconnect_on_transport_exception(self):
+        created = [FakeConnection(fail_with=TTransportException())]
+
+        def factory():
+            if created[-1].calls == 0 and len(created) == 1:
+                return created[0]
+            created.append(FakeConnection())
+            return created[-1]
+
+        cpool = pool.ConnectionPool(factory, size=1)
+
+        self.assertEqual(cpool.client.ping('ok'), 'ok')
+        self.assertTrue(created[0].closed)
+        self.assertEqual(len(created), 2)
+
+    def test_transport_exception_after_reconnect_is_raised(self):
+
+        def factory():
+            return FakeConnection(fail_with=TTransportException())
+
+        cpool = pool.ConnectionPool(factory, size=1)
+
+        with self.assertRaises(TTransportException):
+            cpool.client.ping('ok')
+
+        # o slot deve ter sido devolvido ao pool
+        with self.assertRaises(TTransportException):
+            cpool.client.ping('ok')
+
+    def test_get_pool_is_shared(self):
+        first = pool.get_pool('service', 'localhost', 1)
+        second = pool.get_pool('service', 'localhost', 1)
+
+        self.assertTrue(first is second)
+
+    def test_get_pool_grows(self):
+        first = pool.get_pool('service', 'localhost', 2, size=2)
+        second = pool.get_pool('service', 'localhost', 2, size=5)
+        third = pool.get_pool('service', 'localhost', 2, size=3)
+
+        self.assertTrue(first is second is third)
+        self.assertEqual(first.size, 5)
+
+        first._factory = FakeConnection
+        connections = [first.acquire() for i in range(5)]
+        self.assertEqual(len(connections), 5)
+
+    def test_get_pool_by_timeout(self):
+        first = pool.get_pool('service', 'localhost', 3, timeout=1000)
+        second = pool.get_pool('service', 'localhost', 3, timeout=2000)
+
+        self.assertFalse(first is second)
+
+    def test_get_pool_policy(self):
+        policy = retry.RetryPolicy(max_attempts=7)
+
+        first = pool.get_pool('service', 'localhost', 4)
+        pool.get_pool('service', 'localhost', 4, policy=policy)
+
+        self.assertTrue(first.policy is policy)
+
+        pool.get_pool('service', 'localhost', 4, policy=retry.RetryPolicy(max_attempts=2))
+
+        self.assertTrue(first.policy is policy)
+
+
+class FlakyConnection(FakeConnection):
+    """
+    Conexão cujas chamadas falham enquanto houver erros em ``errors``.
+    """
+
+    def __init__(self, errors):
+        super(FlakyConnection, self).__init__()
+        self.errors = errors
+
+    def ping(self, value):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return value
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def _pool(self, errors, **kwargs):
+        policy = retry.RetryPolicy(backoff=0, **kwargs)
+
+        return pool.ConnectionPool(
+            lambda: FlakyConnection(errors), size=1, policy=policy,
+            breaker=policy.breaker('fake'))
+
+    def test_transient_errors_are_retried(self):
+        cpool = self._pool([socket.timeout(), TTransportException()], max_attempts=3)
+
+        self.assertEqual(cpool.client.ping('ok'), 'ok')
+
+    def test_max_attempts(self):
+        cpool = self._pool([socket.timeout()] * 3, max_attempts=3)
+
+        with self.assertRaises(socket.timeout):
+            cpool.client.ping('ok')
+
+    def test_other_errors_are_not_retried(self):
+        errors = [KeyError('key'), TTransportException()]
+        cpool = self._pool(errors, max_attempts=3)
+
+        with self.assertRaises(KeyError):
+            cpool.client.ping('ok')
+
+        self.assertEqual(len(errors), 1)
+
+    def test_deadline(self):
+        policy = retry.RetryPolicy(max_attempts=10, backoff=1, deadline=0.5)
+
+        self.assertTrue(policy.should_retry(1, 0.2))
+        self.assertFalse(policy.should_retry(1, 0.6))
+        self.assertFalse(policy.should_retry(10, 0))
+
+    def test_delay_is_bounded(self):
+        policy = retry.RetryPolicy(backoff=0.5, max_backoff=3)
+
+        for attempt in range(1, 10):
+            delay = policy.delay(attempt)
+            self.assertTrue(0 <= delay <= min(3, 0.5 * 2 ** (attempt - 1)))
+
+    def test_circuit_breaker_pauses_calls(self):
+        breaker = retry.CircuitBreaker(threshold=2, pause=0.2)
+
+        breaker.failure()
+        self.assertFalse(breaker.is_open)
+        self.assertEqual(breaker.wait(), 0)
+
+        breaker.failure()
+        self.assertTrue(breaker.is_open)
+
+        started = time.time()
+        breaker.wait()
+        self.assertTrue(time.time() - started >= 0.15)
+        self.assertFalse(breaker.is_open)
+
+        # após a pausa uma única falha reabre o circuito
+        breaker.failure()
+        self.assertTrue(breaker.is_open)
+
+        breaker.success()
+        self.assertFalse(breaker.is_open)
+        self.assertEqual(breaker.failures, 0)
+
+    def test_circuit_breaker_without_threshold(self):
+        policy = retry.RetryPolicy(breaker_threshold=0)
+
+        self.assertIsNone(policy.breaker('fake'))
@@ -0,0 +1,90 @@
+# coding: utf-8
+import time
+import unittest
+
+import profiling
+
+
+class Dumper(object):
+
+    @profiling.timed('format')
+    def fmt_csv(self, data):
+        return [data]
+
+    @profiling.timed('format')
+    def fmt_rows(self, data):
+        for item in data:
+            yield [item]
+
+
+class ProfilingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.profiler = profiling.profiler
+        profiling.profiler = profiling.Profiler()
+
+    def tearDown(self):
+        profiling.profiler = self.profiler
+
+    def _enable(self):
+        profiling.profiler.enabled = True
+        profiling.profiler.started = time.time()
+
+    def _stage(self, name):
+        return dict((stage.name, stage) for stage in profiling.profiler._stages)[name]
+
+    def test_disabled_profiler_does_not_measure(self):
+        self.assertEqual(Dumper().fmt_csv('a'), ['a'])
+
+        with profiling.stage('write', 10):
+            pass
+
+        self.assertEqual(self._stage('format').items, 0)
+        self.assertEqual(self._stage('write').items, 0)
+
+    def test_stage(self):
+        self._enable()
+
+        with profiling.stage('write', 10):
+            pass
+        with profiling.stage('write', 5):
+            pass
+
+        self.assertEqual(self._stage('write').items, 15)
+
+    def test_timed_function(self):
+        self._enable()
+
+        Dumper().fmt_csv('a')
+        Dumper().fmt_csv('b')
+
+        self.assertEqual(self._stage('format').items, 2)
+
+    def test_timed_generator(self):
+        self._enable()
+
+        self.assertEqual(list(Dumper().fmt_rows('abc')), [['a'], ['b'], ['c']])
+        self.assertEqual(self._stage('format').items, 1)
+
+    def test_report(self):
+        self._enable()
+        profiling.profiler.add('decode', 2.0, 100)
+
+        lines = profiling.profiler.report()
+
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith('decode: 100 documents in 2.0s'))
+        self.assertIn('50.0 documents/s in stage', lines[1])
+
+    def test_snapshot_and_merge(self):
+        self._enable()
+        profiling.profiler.add('decode', 2.0, 100)
+
+        snapshot = profiling.profiler.snapshot()
+        profiling.profiler.reset()
+        profiling.profiler.add('write', 1.0, 10)
+        profiling.profiler.merge(snapshot)
+
+        self.assertEqual(snapshot, [('decode', 2.0, 100)])
+        self.assertEqual(self._stage('decode').items, 100)
+        self.assertEqual(self._stage('write').items, 10)
@@ -0,0 +1,199 @@
+# coding: utf-8
+import os
+import codecs
+import shutil
+import tempfile
+import unittest
+
+import output
+from publication import incremental
+from thrift.clients import articlemeta_thrift
+
+
+def event(code, name, date):
+    return articlemeta_thrift.event_document(
+        code=code, collection='scl', event=name, date=date)
+
+
+def journal_event(code, name, date):
+    return articlemeta_thrift.event_journal(
+        code=code, collection='scl', event=name, date=date)
+
+
+class FakeArticleMeta(object):
+
+    def __init__(self, events, journal_events=None):
+        self.events = events
+        self.journal_events = journal_events or []
+
+    def documents_history(self, collection=None, from_date=None,
+        until_date=None):
+        return iter(self.events)
+
+    def journals_history(self, collection=None, from_date=None,
+        until_date=None):
+        return iter(self.journal_events)
+
+    def document(self, code, collection, fields=None):
+        return {'pid': code, 'title': 'new %s' % code}
+
+
+class FakeDumper(object):
+
+    def __init__(self, events, output_file, journal_events=None):
+        self._articlemeta = FakeArticleMeta(events, journal_events)
+        self.collection = 'scl'
+        self.issns = None
+        self.output_file = output.CSVWriter(output_file)
+
+    def write(self, line):
+        self.output_file.write(line)
+
+    def writerows(self, rows):
+        self.output_file.writerows(rows)
+
+    def fmt_csv(self, data):
+        return [data['pid'], data['title']]
+
+
+class IncrementalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_document_changes_keeps_last_event(self):
+        events = [
+            event('S0102-67202009000300001', 'add', '2016-01-01'),
+            event('S0102-67202009000300002', 'update', '2016-01-02'),
+            event('S0102-67202009000300001', 'delete', '2016-01-03'),
+            event('S0102-67202009000300003', 'delete', '2016-01-01'),
+            event('S0102-67202009000300003', 'add', '2016-01-04'),
+        ]
+
+        changed, deleted = incremental.document_changes(
+            FakeArticleMeta(events), 'scl', '2016-01-01')
+
+        self.assertEqual(changed, set(['S0102-67202009000300002', 'S0102-67202009000300003']))
+        self.assertEqual(deleted, set(['S0102-67202009000300001']))
+
+    def test_document_changes_filtered_by_issn(self):
+        events = [
+            event('S0102-67202009000300001', 'add', '2016-01-01'),
+            event('S1234-43212009000300002', 'update', '2016-01-02'),
+        ]
+
+        changed, deleted = incremental.document_changes(
+            FakeArticleMeta(events), 'scl', '2016-01-01', issns=['0102-6720'])
+
+        self.assertEqual(changed, set(['S0102-67202009000300001']))
+
+    def test_patch(self):
+        previous = os.path.join(self.tmpdir, 'previous.csv')
+        with codecs.open(previous, 'w', encoding='utf-8') as f:
+            f.write(u'"PID","título"\r\n')
+            f.write(u'"S0102-67202009000300001","old 1"\r\n')
+            f.write(u'"S0102-67202009000300002","old 2"\r\n')
+            f.write(u'"S0102-67202009000300003","old 3"\r\n')
+
+        output_file = os.path.join(self.tmpdir, 'output.csv')
+        dumper = FakeDumper([
+            event('S0102-67202009000300002', 'update', '2016-01-01'),
+            event('S0102-67202009000300003', 'delete', '2016-01-01'),
+        ], output_file)
+        dumper.write(u'"PID","título"')
+        changed, deleted = incremental.document_changes(
+            dumper._articlemeta, 'scl', '2016-01-01')
+
+        incremental.patch(dumper, previous, changed, deleted)
+        dumper.output_file.close()
+
+        with codecs.open(output_file, 'r', encoding='utf-8') as f:
+            result = f.read()
+
+        self.assertEqual(result,
+            u'"PID","título"\r\n'
+            u'"S0102-67202009000300001","old 1"\r\n'
+            u'"S0102-67202009000300002","new S0102-67202009000300002"\r\n')
+
+    def test_patch_multiline_fields(self):
+        previous = os.path.join(self.tmpdir, 'previous.csv')
+        with codecs.open(previous, 'w', encoding='utf-8') as f:
+            f.write(u'"PID","título"\r\n')
+            f.write(u'"S0102-67202009000300001","old\r\n1"\r\n')
+            f.write(u'"S0102-67202009000300002","old\r\n\r\n2"\r\n')
+            f.write(u'"S0102-67202009000300003","old, ""3"""\r\n')
+
+        output_file = os.path.join(self.tmpdir, 'output.csv')
+        dumper = FakeDumper([
+            event('S0102-67202009000300002', 'delete', '2016-01-01'),
+        ], output_file)
+        dumper.write(u'"PID","título"')
+        changed, deleted = incremental.document_changes(
+            dumper._articlemeta, 'scl', '2016-01-01')
+
+        incremental.patch(dumper, previous, changed, deleted)
+        dumper.output_file.close()
+
+        with codecs.open(output_file, 'r', encoding='utf-8') as f:
+            result = f.read()
+
+        self.assertEqual(result,
+            u'"PID","título"\r\n'
+            u'"S0102-67202009000300001","old\r\n1"\r\n'
+            u'"S0102-67202009000300003","old, ""3"""\r\n')
+
+    def test_journal_changes_filtered_by_issn(self):
+        articlemeta = FakeArticleMeta([], [
+            journal_event(['0102-6720', '1678-9946'], 'update', '2016-01-01'),
+            journal_event(['1234-4321'], 'add', '2016-01-02'),
+        ])
+
+        journals = incremental.journal_changes(
+            articlemeta, 'scl', '2016-01-01', issns=['0102-6720'])
+
+        self.assertEqual(journals, set(['0102-6720']))
+
+    def test_patch_changed_journal(self):
+        previous = os.path.join(self.tmpdir, 'previous.csv')
+        with codecs.open(previous, 'w', encoding='utf-8') as f:
+            f.write(u'"PID","título"\r\n')
+            f.write(u'"S0102-67202009000300001","old 1"\r\n')
+            f.write(u'"S1234-43212009000300002","old 2"\r\n')
+            f.write(u'"S0102-67202009000300003","old 3"\r\n')
+
+        output_file = os.path.join(self.tmpdir, 'output.csv')
+        dumper = FakeDumper([], output_file, [
+            journal_event(['0102-6720', '1678-9946'], 'update', '2016-01-01'),
+        ])
+        dumper.write(u'"PID","título"')
+        journals = incremental.journal_changes(
+            dumper._articlemeta, 'scl', '2016-01-01')
+
+        incremental.patch(dumper, previous, set(), set(), journals)
+        dumper.output_file.close()
+
+        with codecs.open(output_file, 'r', encoding='utf-8') as f:
+            result = f.read()
+
+        self.assertEqual(journals, set(['0102-6720', '1678-9946']))
+        self.assertEqual(result,
+            u'"PID","título"\r\n'
+            u'"S1234-43212009000300002","old 2"\r\n'
+            u'"S0102-67202009000300001","new S0102-67202009000300001"\r\n'
+            u'"S0102-67202009000300003","new S0102-67202009000300003"\r\n')
+
+    def test_check_files(self):
+        previous = os.path.join(self.tmpdir, 'previous.csv')
+        output = os.path.join(self.tmpdir, 'output.csv')
+
+        self.assertIsNone(incremental.check_files(output, None))
+        self.assertIsNotNone(incremental.check_files(None, previous))
+        self.assertIsNotNone(incremental.check_files(previous, previous))
+        self.assertIsNotNone(incremental.check_files(output, previous))
+
+        incremental.write_checkpoint(previous, '2016-01-01T00:00:00')
+
+        self.assertIsNone(incremental.check_files(output, previous))
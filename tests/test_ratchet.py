@@ -0,0 +1,91 @@
+# coding: utf-8
+import json
+import time
+import socket
+import threading
+import unittest
+
+from thriftpy.rpc import make_server
+
+from thrift import clients
+from accesses import dumpdata
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    return port
+
+
+class RatchetHandler(object):
+    """
+    Servidor Ratchet local que responde com o próprio código consultado.
+    """
+
+    def __init__(self):
+        self.requested = []
+        self._lock = threading.Lock()
+
+    def general(self, code):
+        with self._lock:
+            self.requested.append(code)
+        time.sleep(0.01)
+        return json.dumps({'objects': [{'code': code}]})
+
+
+class RatchetBatchTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.handler = RatchetHandler()
+        cls.port = free_port()
+        cls.server = make_server(
+            clients.ratchet_thrift.RatchetStats, cls.handler, '127.0.0.1',
+            cls.port)
+        cls.server.daemon = True
+        thread = threading.Thread(target=cls.server.serve)
+        thread.daemon = True
+        thread.start()
+        time.sleep(0.1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.close()
+
+    def setUp(self):
+        self.handler.requested = []
+
+    def test_documents_concurrent(self):
+        ratchet = clients.Ratchet('127.0.0.1', self.port, workers=8)
+        codes = ['code-%d' % i for i in range(40)]
+
+        result = ratchet.documents(codes)
+
+        self.assertEqual(sorted(result.keys()), sorted(codes))
+        for code in codes:
+            self.assertEqual(json.loads(result[code])['objects'][0]['code'], code)
+        self.assertEqual(sorted(self.handler.requested), sorted(codes))
+
+    def test_documents_sequential(self):
+        ratchet = clients.Ratchet('127.0.0.1', self.port, workers=1)
+
+        result = ratchet.documents(['a', 'b'])
+
+        self.assertEqual(self.handler.requested, ['a', 'b'])
+        self.assertEqual(sorted(result.keys()), ['a', 'b'])
+
+
+class BatchesTest(unittest.TestCase):
+
+    def test_batches(self):
+
+        result = list(dumpdata.batches(iter(range(7)), 3))
+
+        self.assertEqual(result, [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_batches_empty(self):
+
+        self.assertEqual(list(dumpdata.batches([], 3)), [])
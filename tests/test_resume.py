@@ -0,0 +1,107 @@
+# coding: utf-8
+import os
+import io
+import shutil
+import tempfile
+import unittest
+
+import output
+import resume
+
+
+class FakeDocument(object):
+
+    def __init__(self, publisher_id):
+        self.publisher_id = publisher_id
+
+
+class FakeArticleMeta(object):
+
+    def __init__(self, listings):
+        self.listings = listings
+        self.requested = []
+
+    def documents(self, issn=None, offset=0, **kwargs):
+        self.requested.append((issn, offset))
+
+        for pid in self.listings[issn][offset:]:
+            yield FakeDocument(pid)
+
+
+class ResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.articlemeta = FakeArticleMeta({
+            '0001-0001': ['A1', 'A2', 'A3'],
+            '0002-0002': ['B1', 'B2', 'B3', 'B4'],
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _pids(self, state=None):
+        return [(issn, offset, document.publisher_id) for issn, offset, document in resume.documents(
+            self.articlemeta, ['0001-0001', '0002-0002'], state)]
+
+    def test_checkpoint_roundtrip(self):
+        checkpoint = resume.Checkpoint(os.path.join(self.tmpdir, 'dump.csv.state'))
+
+        self.assertIsNone(checkpoint.read())
+
+        checkpoint.commit('0002-0002', 2, 'B2', 120)
+        state = checkpoint.read()
+
+        self.assertEqual(state['issn'], '0002-0002')
+        self.assertEqual(state['offset'], 2)
+        self.assertEqual(state['pid'], 'B2')
+        self.assertEqual(state['output_size'], 120)
+        self.assertEqual(os.listdir(self.tmpdir), ['dump.csv.state'])
+
+        checkpoint.remove()
+
+        self.assertIsNone(checkpoint.read())
+
+    def test_documents_offsets(self):
+        result = self._pids()
+
+        self.assertEqual(result[0], ('0001-0001', 1, 'A1'))
+        self.assertEqual(result[3], ('0002-0002', 1, 'B1'))
+        self.assertEqual(len(result), 7)
+
+    def test_documents_resumed_from_state(self):
+        result = self._pids({'issn': '0002-0002', 'offset': 2, 'pid': 'B2'})
+
+        self.assertEqual(result, [('0002-0002', 3, 'B3'), ('0002-0002', 4, 'B4')])
+        self.assertEqual(self.articlemeta.requested, [('0002-0002', 1)])
+
+    def test_documents_resumed_from_changed_listing(self):
+        result = self._pids({'issn': '0002-0002', 'offset': 2, 'pid': 'B9'})
+
+        self.assertEqual([i[2] for i in result], ['B2', 'B3', 'B4'])
+
+    def test_documents_resumed_with_unknown_issn(self):
+        with self.assertRaises(ValueError):
+            self._pids({'issn': '0003-0003', 'offset': 1, 'pid': 'C1'})
+
+    def test_truncate_and_append(self):
+        path = os.path.join(self.tmpdir, 'dump.csv')
+
+        writer = output.CSVWriter(path)
+        writer.writerow([u'A1'])
+        writer.flush()
+        size = os.path.getsize(path)
+        writer.writerow([u'A2'])
+        writer.close()
+
+        resume.truncate(path, size)
+        writer = output.CSVWriter(path, append=True)
+        writer.writerow([u'A3'])
+        writer.close()
+
+        with io.open(path, 'r', encoding='utf-8', newline='') as f:
+            self.assertEqual(f.read(), u'"A1"\r\n"A3"\r\n')
+
+    def test_append_compressed_output(self):
+        with self.assertRaises(ValueError):
+            output.CSVWriter(os.path.join(self.tmpdir, 'dump.csv.gz'), append=True)
@@ -0,0 +1,131 @@
+# coding: utf-8
+import os
+import codecs
+import shutil
+import tempfile
+import unittest
+
+import output
+import profiling
+import sharding
+
+
+class Dumper(object):
+    """
+    Dumper utilizado pelos processos do teste de execução paralela.
+    """
+
+    def __init__(self, collection, issns=None, output_file=None, suffix=''):
+        self.issns = issns
+        self.suffix = suffix
+        self.output_file = codecs.open(output_file, 'w', encoding='utf-8')
+        self.output_file.write(u'"ISSN"\r\n')
+
+    def run(self):
+        for issn in self.issns:
+            for i in range(3):
+                with profiling.stage('write'):
+                    self.output_file.write(u'"%s","%d%s"\r\n' % (issn, i, self.suffix))
+
+
+class ShardingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmpdir, name)
+        with codecs.open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def _read(self, path):
+        with codecs.open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def test_merge_with_header(self):
+        parts = [
+            self._write('a', u'"h"\r\n"1"\r\n'),
+            self._write('b', u'"h"\r\n"2"\r\n'),
+        ]
+        output = os.path.join(self.tmpdir, 'output.csv')
+
+        sharding.merge(parts, output)
+
+        self.assertEqual(self._read(output), u'"h"\r\n"1"\r\n"2"\r\n')
+
+    def test_merge_without_header(self):
+        parts = [
+            self._write('a', u'{"a": 1}\r\n'),
+            self._write('b', u'{"a": 2}\r\n'),
+        ]
+        output = os.path.join(self.tmpdir, 'output.json')
+
+        sharding.merge(parts, output, header=False)
+
+        self.assertEqual(self._read(output), u'{"a": 1}\r\n{"a": 2}\r\n')
+
+    def test_merge_compressed(self):
+        parts = [
+            self._write('a', u'"h"\r\n"1"\r\n'),
+            self._write('b', u'"h"\r\n"2"\r\n'),
+        ]
+        output_file = os.path.join(self.tmpdir, 'output.csv.gz')
+
+        sharding.merge(parts, output_file)
+
+        with output.open_input(output_file) as f:
+            self.assertEqual(f.read(), u'"h"\r\n"1"\r\n"2"\r\n')
+
+    def test_run_is_deterministic(self):
+        output = os.path.join(self.tmpdir, 'output.csv')
+
+        sharding.run('tests.test_sharding', 'scl', ['2222-2222', '1111-1111', '3333-3333'],
+            output, processes=3, suffix='x')
+
+        expected = u'"ISSN"\r\n' + u''.join(
+            u'"%s","%dx"\r\n' % (issn, i)
+            for issn in ['1111-1111', '2222-2222', '3333-3333'] for i in range(3))
+
+        self.assertEqual(self._read(output), expected)
+        self.assertEqual(os.listdir(self.tmpdir), ['output.csv'])
+
+    def test_pool_created_before_listing_journals(self):
+        calls = []
+        pool_class = sharding.multiprocessing.Pool
+        collection_issns = sharding.collection_issns
+
+        def Pool(*args, **kwargs):
+            calls.append('pool')
+            return pool_class(*args, **kwargs)
+
+        def listing(collection):
+            calls.append('journals')
+            return ['1111-1111']
+
+        sharding.multiprocessing.Pool = Pool
+        sharding.collection_issns = listing
+        try:
+            sharding.run('tests.test_sharding', 'scl', None,
+                os.path.join(self.tmpdir, 'output.csv'), processes=2)
+        finally:
+            sharding.multiprocessing.Pool = pool_class
+            sharding.collection_issns = collection_issns
+
+        self.assertEqual(calls, ['pool', 'journals'])
+
+    def test_run_merges_shard_profiles(self):
+        profiler = profiling.profiler
+        profiling.profiler = profiling.Profiler()
+        profiling.profiler.enabled = True
+        try:
+            sharding.run('tests.test_sharding', 'scl', ['1111-1111', '2222-2222', '3333-3333'],
+                os.path.join(self.tmpdir, 'output.csv'), processes=2)
+            snapshot = dict((name, items) for name, seconds, items in profiling.profiler.snapshot())
+        finally:
+            profiling.profiler = profiler
+
+        self.assertEqual(snapshot, {'write': 9})
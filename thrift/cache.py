@@ -0,0 +1,73 @@
+# coding: utf-8
+"""
+Cache local em disco (SQLite) dos documentos recuperados do Article Meta.
+
+Os registros são indexados por coleção, PID e formato e validados pela
+processing_date informada em article_identifiers, de modo que apenas
+documentos alterados desde a última execução são solicitados ao servidor.
+"""
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentCache(object):
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS documents ('
+            'collection TEXT NOT NULL, '
+            'code TEXT NOT NULL, '
+            'fmt TEXT NOT NULL, '
+            'processing_date TEXT NOT NULL, '
+            'payload TEXT NOT NULL, '
+            'PRIMARY KEY (collection, code, fmt))'
+        )
+        self._conn.commit()
+
+    def get(self, collection, code, fmt, processing_date):
+        """
+        Retorna o conteúdo armazenado ou None quando o documento não está no
+        cache ou foi processado novamente após ser armazenado.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT processing_date, payload FROM documents '
+                'WHERE collection=? AND code=? AND fmt=?',
+                (collection, code, fmt)
+            ).fetchone()
+
+        if not row or row[0] != processing_date:
+            return None
+
+        logger.debug('Document loaded from cache: %s_%s' % (collection, code))
+        return row[1]
+
+    def set(self, collection, code, fmt, processing_date, payload):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO documents '
+                '(collection, code, fmt, processing_date, payload) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (collection, code, fmt, processing_date, payload)
+            )
+            self._conn.commit()
+
+    def delete(self, collection, code):
+        with self._lock:
+            self._conn.execute(
+                'DELETE FROM documents WHERE collection=? AND code=?',
+                (collection, code)
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -3,11 +3,23 @@ import os
 import thriftpy
 import json
 import logging
+import threading
+from collections import deque
+from multiprocessing.pool import ThreadPool
 
-from thriftpy.rpc import make_client
 from xylose.scielodocument import Article, Journal
 
+import profiling
+from thrift import pool, decoder
+
 LIMIT = 1000
+WORKERS = 1
+ACCESS_LIFETIME_ISSNS = 100
+JOURNAL_CACHE = True
+
+# Seções do documento utilizadas pelos atributos básicos do xylose Article
+# (publisher_id, journal, issue, publication_date, document_type).
+BASE_FIELDS = ['article', 'code', 'collection', 'issue', 'title']
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +38,33 @@ accessstats_thrift = thriftpy.load(
 publication_stats_thrift = thriftpy.load(
     os.path.join(os.path.dirname(__file__))+'/publication_stats.thrift')
 
+def ordered_map(executor, func, items, window):
+    """
+    Aplica ``func`` a cada item de ``items`` utilizando o ``executor``
+    (multiprocessing ThreadPool), mantendo no máximo ``window`` chamadas em
+    andamento e entregando os resultados na mesma ordem de ``items``.
+    """
+    pending = deque()
+
+    for item in items:
+        pending.append(executor.apply_async(func, (item,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+
+    while pending:
+        yield pending.popleft().get()
+
+
+def project(data, fields):
+    """
+    Retorna uma cópia de ``data`` contendo apenas as seções de primeiro nível
+    ``fields`` e BASE_FIELDS.
+    """
+    keys = set(fields) | set(BASE_FIELDS)
+
+    return dict((key, value) for key, value in data.items() if key in keys)
+
+
 class ServerError(Exception):
     def __init__(self, message=None):
         self.message = message or 'thirftclient: ServerError'
@@ -36,22 +75,26 @@ class ServerError(Exception):
 
 class AccessStats(object):
 
-    def __init__(self, address, port):
+    def __init__(self, address, port, pool_size=pool.POOL_SIZE,
+        pool_idle_timeout=pool.IDLE_TIMEOUT, retry_policy=None):
         """
         Cliente thrift para o Access Stats.
         """
         self._address = address
         self._port = port
+        self._pool = pool.get_pool(
+            accessstats_thrift.AccessStats,
+            self._address,
+            self._port,
+            size=pool_size,
+            idle_timeout=pool_idle_timeout,
+            policy=retry_policy
+        )
 
     @property
     def client(self):
 
-        client = make_client(
-            accessstats_thrift.AccessStats,
-            self._address,
-            self._port
-        )
-        return client
+        return self._pool.client
 
     def _compute_access_lifetime(self, query_result):
 
@@ -71,6 +114,66 @@ class AccessStats(object):
 
         return sorted(data)
 
+    def _publication_year_aggs(self):
+        """
+        Agregação dos acessos por ano de publicação e ano de acesso.
+        """
+
+        return {
+            "publication_year": {
+                "terms": {
+                    "field": "publication_year",
+                    "size": 0,
+                    "order": {
+                        "access_total": "desc"
+                    }
+              },
+              "aggs": {
+                    "access_total": {
+                        "sum": {
+                            "field": "access_total"
+                        }
+                    },
+                    "access_year": {
+                        "terms": {
+                            "field": "access_year",
+                            "size": 0,
+                            "order": {
+                                "access_total": "desc"
+                            }
+                        },
+                        "aggs": {
+                            "access_total": {
+                                "sum": {
+                                    "field": "access_total"
+                                }
+                            },
+                            "access_abstract": {
+                                "sum": {
+                                    "field": "access_abstract"
+                                }
+                            },
+                            "access_epdf": {
+                                "sum": {
+                                    "field": "access_epdf"
+                                }
+                            },
+                            "access_html": {
+                                "sum": {
+                                    "field": "access_html"
+                                }
+                            },
+                            "access_pdf": {
+                                "sum": {
+                                    "field": "access_pdf"
+                                }
+                            }
+                        }
+                    }
+                }
+            }
+        }
+
     def access_lifetime(self, issn, collection, raw=False):
 
         body = {
@@ -90,91 +193,104 @@ class AccessStats(object):
                 }
             },
             "size": 0,
-            "aggs": {
-                "publication_year": {
-                    "terms": {
-                        "field": "publication_year",
-                        "size": 0,
-                        "order": {
-                            "access_total": "desc"
-                        }
-                  },
-                  "aggs": {
-                        "access_total": {
-                            "sum": {
-                                "field": "access_total"
-                            }
-                        },
-                        "access_year": {
-                            "terms": {
-                                "field": "access_year",
-                                "size": 0,
-                                "order": {
-                                    "access_total": "desc"
-                                }
-                            },
-                            "aggs": {
-                                "access_total": {
-                                    "sum": {
-                                        "field": "access_total"
-                                    }
-                                },
-                                "access_abstract": {
-                                    "sum": {
-                                        "field": "access_abstract"
-                                    }
-                                },
-                                "access_epdf": {
-                                    "sum": {
-                                        "field": "access_epdf"
-                                    }
-                                },
-                                "access_html": {
-                                    "sum": {
-                                        "field": "access_html"
-                                    }
-                                },
-                                "access_pdf": {
-                                    "sum": {
-                                        "field": "access_pdf"
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
+            "aggs": self._publication_year_aggs()
         }
 
         query_parameters = [
             accessstats_thrift.kwargs('size', '0')
         ]
 
-        query_result = json.loads(self.client.search(json.dumps(body), query_parameters))
+        query_result = decoder.loads(self.client.search(json.dumps(body), query_parameters))
 
         computed = self._compute_access_lifetime(query_result)
 
         return query_result if raw else computed
 
+    def _compute_access_lifetime_bulk(self, query_result, data):
+
+        for issn in query_result['aggregations']['issn']['buckets']:
+            data[issn['key']] = self._compute_access_lifetime({'aggregations': issn})
+
+        return data
+
+    def access_lifetime_bulk(self, collection, issns=None,
+        chunk_size=ACCESS_LIFETIME_ISSNS):
+        """
+        Versão de access_lifetime para a coleção inteira. Os acessos são
+        agregados por issn, ano de publicação e ano de acesso em agregações
+        terms aninhadas, evitando uma consulta por periódico. Com ``issns``
+        é realizada uma consulta para cada ``chunk_size`` periódicos.
+
+        Retorna um dicionário issn -> linhas no formato de access_lifetime.
+        """
+        issns = list(issns or [])
+        chunks = [issns[i:i + chunk_size] for i in range(0, len(issns), chunk_size)] or [None]
+
+        query_parameters = [
+            accessstats_thrift.kwargs('size', '0')
+        ]
+
+        data = {}
+        for chunk in chunks:
+            must = [{
+                "match": {
+                    "collection": collection
+                }
+            }]
+
+            if chunk:
+                must.append({
+                    "terms": {
+                        "issn": chunk
+                    }
+                })
+
+            body = {
+                "query": {
+                    "bool": {
+                        "must": must
+                    }
+                },
+                "size": 0,
+                "aggs": {
+                    "issn": {
+                        "terms": {
+                            "field": "issn",
+                            "size": 0
+                        },
+                        "aggs": self._publication_year_aggs()
+                    }
+                }
+            }
+
+            query_result = decoder.loads(self.client.search(json.dumps(body), query_parameters))
+            self._compute_access_lifetime_bulk(query_result, data)
+
+        return data
+
 
 class PublicationStats(object):
 
-    def __init__(self, address, port):
+    def __init__(self, address, port, pool_size=pool.POOL_SIZE,
+        pool_idle_timeout=pool.IDLE_TIMEOUT, retry_policy=None):
         """
         Cliente thrift para o PublicationStats.
         """
         self._address = address
         self._port = port
-
-    @property
-    def client(self):
-        client = make_client(
+        self._pool = pool.get_pool(
             publication_stats_thrift.PublicationStats,
             self._address,
-            self._port
+            self._port,
+            size=pool_size,
+            idle_timeout=pool_idle_timeout,
+            policy=retry_policy
         )
 
-        return client
+    @property
+    def client(self):
+
+        return self._pool.client
 
     def _compute_first_included_document_by_journal(self, query_result):
 
@@ -219,7 +335,7 @@ class PublicationStats(object):
             publication_stats_thrift.kwargs('size', '1')
         ]
 
-        query_result = json.loads(self.client.search('article', json.dumps(body), query_parameters))
+        query_result = decoder.loads(self.client.search('article', json.dumps(body), query_parameters))
 
         return self._compute_first_included_document_by_journal(query_result)
 
@@ -272,28 +388,32 @@ class PublicationStats(object):
             publication_stats_thrift.kwargs('size', '1')
         ]
 
-        query_result = json.loads(self.client.search('article', json.dumps(body), query_parameters))
+        query_result = decoder.loads(self.client.search('article', json.dumps(body), query_parameters))
 
         return self._compute_last_included_document_by_journal(query_result)
 
 class Citedby(object):
 
-    def __init__(self, address, port):
+    def __init__(self, address, port, pool_size=pool.POOL_SIZE,
+        pool_idle_timeout=pool.IDLE_TIMEOUT, retry_policy=None):
         """
         Cliente thrift para o Citedby.
         """
         self._address = address
         self._port = port
-
-    @property
-    def client(self):
-        client = make_client(
+        self._pool = pool.get_pool(
             citedby_thrift.Citedby,
             self._address,
-            self._port
+            self._port,
+            size=pool_size,
+            idle_timeout=pool_idle_timeout,
+            policy=retry_policy
         )
 
-        return client
+    @property
+    def client(self):
+
+        return self._pool.client
 
     def citedby_pid(self, code, metaonly=False):
 
@@ -303,22 +423,40 @@ class Citedby(object):
 
 class Ratchet(object):
 
-    def __init__(self, address, port):
+    def __init__(self, address, port, pool_size=pool.POOL_SIZE,
+        pool_idle_timeout=pool.IDLE_TIMEOUT, workers=WORKERS,
+        retry_policy=None):
         """
         Cliente thrift para o Ratchet.
+
+        ``workers`` define quantas chaves são consultadas em paralelo por
+        ``documents``.
         """
         self._address = address
         self._port = port
-
-    @property
-    def client(self):
-        client = make_client(
+        self.workers = max(workers or WORKERS, 1)
+        self._executor = None
+        self._pool = pool.get_pool(
             ratchet_thrift.RatchetStats,
             self._address,
-            self._port
+            self._port,
+            size=max(pool_size, self.workers),
+            idle_timeout=pool_idle_timeout,
+            policy=retry_policy
         )
 
-        return client
+    @property
+    def executor(self):
+
+        if not self._executor:
+            self._executor = ThreadPool(self.workers)
+
+        return self._executor
+
+    @property
+    def client(self):
+
+        return self._pool.client
 
     def document(self, code):
 
@@ -326,47 +464,148 @@ class Ratchet(object):
 
         return data
 
+    def documents(self, codes):
+        """
+        Recupera os acessos de várias chaves, em paralelo quando ``workers``
+        é maior que 1. Retorna um dicionário chave: resposta do Ratchet.
+        """
+        codes = list(codes)
+
+        if self.workers == 1:
+            return dict((code, self.document(code)) for code in codes)
+
+        return dict(zip(
+            codes,
+            ordered_map(self.executor, self.document, codes, self.workers * 2)
+        ))
+
 class ArticleMeta(object):
 
-    def __init__(self, address, port):
+    def __init__(self, address, port, pool_size=pool.POOL_SIZE,
+        pool_idle_timeout=pool.IDLE_TIMEOUT, workers=WORKERS, cache=None,
+        journal_cache=JOURNAL_CACHE, retry_policy=None):
         """
         Cliente thrift para o Articlemeta.
+
+        ``workers`` define quantos documentos de uma página de identificadores
+        são recuperados em paralelo por ``documents``.
+
+        ``cache`` é um thrift.cache.DocumentCache opcional utilizado para
+        servir localmente documentos não alterados desde a última consulta.
+
+        Com ``journal_cache`` os documentos xylose são recuperados sem os
+        metadados do periódico, que são carregados uma única vez por periódico
+        e anexados a cada documento.
+
+        ``retry_policy`` (thrift.retry.RetryPolicy) define as novas tentativas
+        das chamadas RPC com falhas transitórias.
         """
         self._address = address
         self._port = port
-
-    @property
-    def client(self):
-
-        client = make_client(
+        self.cache = cache
+        self.journal_cache = journal_cache
+        self._journals = {}
+        self._journals_lock = threading.Lock()
+        self.workers = max(workers or WORKERS, 1)
+        self._executor = None
+        self._prefetcher = None
+        self._pool = pool.get_pool(
             articlemeta_thrift.ArticleMeta,
             self._address,
-            self._port
+            self._port,
+            size=max(pool_size, self.workers + 1),
+            idle_timeout=pool_idle_timeout,
+            policy=retry_policy
         )
-        return client
 
+    @property
+    def executor(self):
+
+        if not self._executor:
+            self._executor = ThreadPool(self.workers)
+
+        return self._executor
+
+    @property
+    def prefetcher(self):
+
+        if not self._prefetcher:
+            self._prefetcher = ThreadPool(1)
+
+        return self._prefetcher
+
+    def _identifiers(self, get_page, offset=0):
+        """
+        Percorre as páginas de identificadores (ou eventos de histórico)
+        retornadas por ``get_page(offset)``, solicitando em segundo plano a página seguinte
+        enquanto a página corrente é consumida.
+        """
+        next_page = self.prefetcher.apply_async(get_page, (offset,))
 
-    def journals(self, collection=None, issn=None):
-        offset = 0
         while True:
-            identifiers = self.client.get_journal_identifiers(collection=collection, issn=issn, limit=LIMIT, offset=offset)
+            identifiers = next_page.get()
+
             if len(identifiers) == 0:
-                raise StopIteration
+                return
+
+            offset += LIMIT
+            next_page = self.prefetcher.apply_async(get_page, (offset,))
 
             for identifier in identifiers:
+                yield identifier
+
+    @property
+    def client(self):
+
+        return self._pool.client
+
+
+    def journals(self, collection=None, issn=None):
 
-                journal = self.client.get_journal(
-                    code=identifier.code[0], collection=identifier.collection)
+        def get_page(offset):
+            return self.client.get_journal_identifiers(
+                collection=collection, issn=issn, limit=LIMIT, offset=offset)
 
-                jjournal = json.loads(journal)
+        for identifier in self._identifiers(get_page):
 
-                xjournal = Journal(jjournal)
+            journal = self.client.get_journal(
+                code=identifier.code[0], collection=identifier.collection)
 
-                logger.info('Journal loaded: %s_%s' % ( identifier.collection, identifier.code))
+            jjournal = decoder.loads(journal)
 
-                yield xjournal
+            xjournal = Journal(jjournal)
 
-            offset += 1000
+            logger.info('Journal loaded: %s_%s' % ( identifier.collection, identifier.code))
+
+            yield xjournal
+
+    def _journal_metadata(self, code, collection):
+        key = (collection, code)
+
+        with self._journals_lock:
+            if key in self._journals:
+                return self._journals[key]
+
+        try:
+            journal = self.client.get_journal(code=code, collection=collection)
+        except:
+            msg = 'Error retrieving journal: %s_%s' % (collection, code)
+            raise ServerError(msg)
+
+        jjournal = decoder.loads(journal) if journal else None
+        metadata = (jjournal, Journal(jjournal)) if jjournal else None
+
+        with self._journals_lock:
+            return self._journals.setdefault(key, metadata)
+
+    def journal(self, code, collection):
+        """
+        Retorna o periódico ``code`` da coleção, recuperando-o do Articlemeta
+        apenas na primeira consulta.
+        """
+        metadata = self._journal_metadata(code, collection)
+
+        return metadata[1] if metadata else None
 
     def exists_article(self, code, collection):
         try:
@@ -390,31 +629,83 @@ class ArticleMeta(object):
             raise ServerError(msg)
 
 
-    def document(self, code, collection, replace_journal_metadata=True, fmt='xylose'):
+    def _get_article(self, code, collection, fmt, processing_date=None,
+        replace_journal_metadata=True, fields=None):
+        use_cache = self.cache is not None and processing_date is not None
+        cache_fmt = fmt if replace_journal_metadata else '%s:nojournal' % fmt
+        if fields:
+            cache_fmt = '%s:%s' % (cache_fmt, ','.join(sorted(fields)))
+
+        if use_cache:
+            article = self.cache.get(collection, code, cache_fmt, processing_date)
+            if article is not None:
+                return article
+
         try:
             article = self.client.get_article(
                 code=code,
                 collection=collection,
-                replace_journal_metadata=True, 
+                replace_journal_metadata=replace_journal_metadata,
                 fmt=fmt
             )
         except:
             msg = 'Error retrieving document: %s_%s' % (collection, code)
             raise ServerError(msg)
 
-        jarticle = None
-        try:
-            jarticle = json.loads(article)
-        except:
-            msg = 'Fail to load JSON when retrienving document: %s_%s' % (collection, code)
-            raise ServerError(msg)
+        if use_cache:
+            # Com projeção o cache guarda apenas as seções solicitadas,
+            # reduzindo a decodificação das próximas leituras. O documento já
+            # decodificado e projetado é retornado.
+            if fields and article:
+                try:
+                    with profiling.stage('decode'):
+                        data = decoder.loads(article)
+                except ValueError:
+                    data = None
+
+                if isinstance(data, dict):
+                    data = project(data, fields)
+                    self.cache.set(collection, code, cache_fmt, processing_date, json.dumps(data))
+                    return data
+
+            self.cache.set(collection, code, cache_fmt, processing_date, article)
+
+        return article
+
+    def document(self, code, collection, replace_journal_metadata=True,
+        fmt='xylose', processing_date=None, fields=None):
+        """
+        Com ``fields`` (apenas para fmt xylose) o documento mantém somente as
+        seções de primeiro nível informadas, além de BASE_FIELDS.
+        """
+        attach_journal = fmt == 'xylose' and self.journal_cache
+        fields = fields if fmt == 'xylose' else None
+        article = self._get_article(
+            code, collection, fmt, processing_date,
+            replace_journal_metadata=not attach_journal,
+            fields=fields
+        )
+
+        jarticle = article
+        if not isinstance(article, dict):
+            try:
+                with profiling.stage('decode'):
+                    jarticle = decoder.loads(article)
+            except:
+                msg = 'Fail to load JSON when retrienving document: %s_%s' % (collection, code)
+                raise ServerError(msg)
 
         if not jarticle:
             logger.warning('Document not found for : %s_%s' % ( collection, code))
             return None
 
         if fmt == 'xylose':
-            xarticle = Article(jarticle)
+            with profiling.stage('xylose'):
+                if fields and not isinstance(article, dict):
+                    jarticle = project(jarticle, fields)
+                xarticle = Article(jarticle)
+                if attach_journal:
+                    self._attach_journal(xarticle, code, collection)
             logger.info('Document loaded: %s_%s' % ( collection, code))
             return xarticle
         else:
@@ -422,29 +713,80 @@ class ArticleMeta(object):
             return article
 
 
+    def _attach_journal(self, xarticle, code, collection):
+        """
+        Substitui os metadados de periódico do documento pelos do periódico
+        memoizado, identificado pelo ISSN contido no PID do documento.
+        """
+        metadata = self._journal_metadata(code[1:10], collection)
+
+        if not metadata:
+            logger.warning('Journal not found for document: %s_%s' % (collection, code))
+            return
+
+        xarticle.data['title'], xarticle._journal = metadata
+
+    def _fetch_documents(self, identifiers, fmt, fields=None):
+
+        def fetch(identifier):
+            return self.document(
+                code=identifier.code,
+                collection=identifier.collection,
+                replace_journal_metadata=True,
+                fmt=fmt,
+                processing_date=identifier.processing_date,
+                fields=fields
+            )
+
+        if self.workers == 1:
+            return (fetch(identifier) for identifier in identifiers)
+
+        return ordered_map(self.executor, fetch, identifiers, self.workers * 2)
+
     def documents(self, collection=None, issn=None, from_date=None,
-        until_date=None, fmt='xylose'):
-        offset = 0
-        while True:
-            identifiers = self.client.get_article_identifiers(
+        until_date=None, fmt='xylose', fields=None, offset=0):
+        """
+        ``offset`` é a posição, na listagem de identificadores, do primeiro
+        documento retornado.
+        """
+
+        def get_page(offset):
+            return self.client.get_article_identifiers(
                 collection=collection, issn=issn, from_date=from_date,
                 until_date=until_date, limit=LIMIT, offset=offset)
 
-            if len(identifiers) == 0:
-                raise StopIteration
+        # A janela de documentos em andamento atravessa o limite das páginas,
+        # então os documentos da página seguinte começam a ser recuperados
+        # enquanto o fim da página corrente ainda está sendo consumido.
+        for document in self._fetch_documents(self._identifiers(get_page, offset), fmt, fields):
 
-            for identifier in identifiers:
+            yield document
+
+    def documents_history(self, collection=None, event=None, code=None,
+        from_date=None, until_date=None):
+
+        def get_page(offset):
+            return self.client.article_history_changes(
+                collection=collection, event=event, code=code,
+                from_date=from_date, until_date=until_date, limit=LIMIT,
+                offset=offset)
+
+        for change in self._identifiers(get_page):
+
+            yield change
+
+    def journals_history(self, collection=None, event=None, code=None,
+        from_date=None, until_date=None):
 
-                document = self.document(
-                    code=identifier.code,
-                    collection=identifier.collection,
-                    replace_journal_metadata=True, 
-                    fmt=fmt
-                )
+        def get_page(offset):
+            return self.client.journal_history_changes(
+                collection=collection, event=event, code=code,
+                from_date=from_date, until_date=until_date, limit=LIMIT,
+                offset=offset)
 
-                yield document
+        for change in self._identifiers(get_page):
 
-            offset += 1000
+            yield change
 
     def collections(self):
         
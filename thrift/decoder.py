@@ -0,0 +1,59 @@
+# coding: utf-8
+"""
+Decodificação JSON das respostas dos servidores thrift.
+
+Utiliza a primeira implementação disponível de BACKENDS, na ordem. orjson e
+ujson são dependências opcionais; na ausência de ambas é utilizado o módulo
+json da biblioteca padrão. Todas lançam ValueError (ou subclasse) para JSON
+inválido.
+"""
+import json
+import logging
+import importlib
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ['orjson', 'ujson', 'json']
+
+backend = None
+loads = json.loads
+
+
+def load_backend(name):
+    """
+    Retorna a função loads do backend ``name`` ou None se o pacote não
+    estiver instalado.
+    """
+    try:
+        module = importlib.import_module(name)
+    except ImportError:
+        return None
+
+    return module.loads
+
+
+def available_backends():
+
+    return [name for name in BACKENDS if load_backend(name) is not None]
+
+
+def use(name=None):
+    """
+    Define o backend utilizado por ``loads``. Sem ``name`` é utilizado o
+    primeiro backend disponível de BACKENDS.
+    """
+    global backend, loads
+
+    names = [name] if name else BACKENDS
+
+    for item in names:
+        func = load_backend(item)
+        if func is not None:
+            backend, loads = item, func
+            logger.debug('Using %s to decode JSON' % item)
+            return backend
+
+    raise ValueError('JSON backend not available: %s' % name)
+
+
+use()
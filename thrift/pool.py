@@ -0,0 +1,272 @@
+# coding: utf-8
+"""
+Pool de conexões thrift persistentes compartilhado pelos clientes de
+thrift/clients.py.
+"""
+import time
+import logging
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from thriftpy.rpc import make_client
+
+import metrics
+import profiling
+from thrift import retry
+
+POOL_SIZE = 10
+IDLE_TIMEOUT = 300
+SOCKET_TIMEOUT = 60000
+
+logger = logging.getLogger(__name__)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool(object):
+
+    def __init__(self, factory, size=POOL_SIZE, idle_timeout=IDLE_TIMEOUT,
+        policy=None, breaker=None, name='thrift'):
+        """
+        Mantém até ``size`` conexões abertas criadas por ``factory``.
+
+        Conexões ociosas por mais de ``idle_timeout`` segundos ou com o
+        transporte fechado são descartadas e recriadas na próxima requisição.
+
+        ``policy`` (thrift.retry.RetryPolicy) define as novas tentativas das
+        chamadas com falhas transitórias, por padrão uma única reconexão.
+        ``breaker`` (thrift.retry.CircuitBreaker) pausa as chamadas quando o
+        servidor acumula falhas.
+
+        As chamadas são registradas em metrics como ``name``.método.
+        """
+        self._factory = factory
+        self.name = name
+        self.policy = policy or retry.RECONNECT
+        self.breaker = breaker
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.Semaphore(size)
+        self._resize_lock = threading.Lock()
+
+    def grow(self, size):
+        """
+        Aumenta o número máximo de conexões do pool para ``size``. O pool
+        nunca é reduzido.
+        """
+        with self._resize_lock:
+            for i in range(size - self.size):
+                self._slots.release()
+            self.size = max(self.size, size)
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def is_healthy(self, connection, last_used):
+        if self.idle_timeout and time.time() - last_used > self.idle_timeout:
+            return False
+
+        try:
+            return connection._oprot.trans.is_open()
+        except AttributeError:
+            return True
+
+    def acquire(self):
+        self._slots.acquire()
+
+        return self._checkout()
+
+    def _checkout(self):
+        """
+        Retorna uma conexão ociosa saudável ou uma nova conexão, após a
+        obtenção de um slot do pool.
+        """
+        while True:
+            try:
+                connection, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+            if self.is_healthy(connection, last_used):
+                return connection
+
+            logger.debug('Discarding stale thrift connection')
+            self._close(connection)
+
+        try:
+            return self._factory()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, connection):
+        self._idle.put((connection, time.time()))
+        self._slots.release()
+
+    def discard(self, connection):
+        self._close(connection)
+        self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                connection, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close(connection)
+
+    def _call(self, method, *args, **kwargs):
+        # A espera por um slot livre não é contabilizada como latência da
+        # requisição.
+        self._slots.acquire()
+
+        with metrics.timed('%s.%s' % (self.name, method)) as timer, profiling.stage('fetch'):
+            connection = self._checkout()
+
+            try:
+                result = getattr(connection, method)(*args, **kwargs)
+            except Exception:
+                self.discard(connection)
+                raise
+
+            self.release(connection)
+            timer.bytes = metrics.payload_size(result)
+
+        return result
+
+    def call(self, method, *args, **kwargs):
+        """
+        Executa ``method`` em uma conexão do pool. Em caso de falha
+        transitória a conexão é descartada e a chamada é repetida em uma nova
+        conexão conforme a política de novas tentativas.
+        """
+        attempt = 0
+        started = time.time()
+
+        while True:
+            if self.breaker:
+                # A pausa do circuit breaker não é descontada do prazo.
+                started += self.breaker.wait()
+
+            try:
+                result = self._call(method, *args, **kwargs)
+            except self.policy.retry_on as e:
+                if self.breaker:
+                    self.breaker.failure()
+
+                attempt += 1
+                delay = self.policy.delay(attempt)
+                if not self.policy.should_retry(attempt, time.time() - started + delay):
+                    raise
+
+                logger.warning('Thrift error calling %s (%s), retrying in %.1f seconds' % (
+                    method, e.__class__.__name__, delay))
+                time.sleep(delay)
+                continue
+
+            if self.breaker:
+                self.breaker.success()
+
+            return result
+
+    @property
+    def client(self):
+        return PooledClient(self)
+
+
+class PooledClient(object):
+    """
+    Expõe a mesma interface do cliente thrift, executando cada chamada RPC
+    através do pool.
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def __getattr__(self, method):
+
+        def call(*args, **kwargs):
+            return self._pool.call(method, *args, **kwargs)
+
+        return call
+
+
+def get_pool(service, address, port, size=POOL_SIZE, idle_timeout=IDLE_TIMEOUT,
+    timeout=SOCKET_TIMEOUT, policy=None):
+    """
+    Retorna o pool registrado para ``service`` em ``address``:``port`` com o
+    ``timeout`` informado, criando-o na primeira chamada. Instâncias de um
+    mesmo cliente apontando para o mesmo servidor compartilham as conexões e
+    o circuit breaker.
+
+    Um pool já registrado é ampliado quando ``size`` é maior que o seu
+    tamanho e passa a utilizar ``policy`` quando foi criado com a política
+    padrão. Uma política diferente da registrada ou um ``idle_timeout``
+    diferente são ignorados com um aviso.
+
+    Sem ``policy`` é utilizada a política padrão de thrift.retry.
+    """
+    key = (service, address, port, timeout)
+    name = '%s:%s' % (address, port)
+
+    with _pools_lock:
+        if key not in _pools:
+            def factory():
+                return make_client(service, address, port, timeout=timeout)
+
+            _pools[key] = ConnectionPool(
+                factory, size, idle_timeout,
+                policy=policy or retry.RetryPolicy(),
+                name=getattr(service, '__name__', str(service)))
+            _pools[key].breaker = _pools[key].policy.breaker(name)
+            _pools[key].default_policy = policy is None
+
+            return _pools[key]
+
+        pool = _pools[key]
+
+        if size > pool.size:
+            logger.debug('Growing thrift pool %s from %d to %d connections' % (name, pool.size, size))
+            pool.grow(size)
+
+        if idle_timeout != pool.idle_timeout:
+            logger.warning('Thrift pool %s already registered with idle timeout %s, ignoring %s' % (
+                name, pool.idle_timeout, idle_timeout))
+
+        if policy is not None and policy != pool.policy:
+            if pool.default_policy:
+                pool.policy = policy
+                pool.breaker = policy.breaker(name)
+                pool.default_policy = False
+            else:
+                logger.warning('Thrift pool %s already registered with another retry policy, ignoring the given one' % name)
+
+        return pool
+
+
+def close_all():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+def reset_after_fork():
+    """
+    Descarta, sem fechar, os pools herdados do processo pai. Os sockets são
+    compartilhados com o processo pai e não podem ser reutilizados ou
+    encerrados pelo processo filho.
+    """
+    global _pools, _pools_lock
+
+    _pools = {}
+    _pools_lock = threading.Lock()
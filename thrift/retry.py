@@ -0,0 +1,146 @@
+# coding: utf-8
+"""
+Política de novas tentativas e circuit breaker das chamadas RPC thrift.
+
+Falhas transitórias (transporte e sockets) são repetidas com backoff
+exponencial e jitter, respeitando um número máximo de tentativas e um prazo
+total por chamada. Falhas transitórias consecutivas de um mesmo servidor
+abrem o circuito, pausando todas as chamadas para o servidor por um intervalo
+antes de voltar a tentar.
+"""
+import time
+import random
+import socket
+import logging
+import threading
+
+from thriftpy.transport import TTransportException
+
+MAX_ATTEMPTS = 5
+BACKOFF = 0.5
+MAX_BACKOFF = 30
+DEADLINE = 300
+BREAKER_THRESHOLD = 10
+BREAKER_PAUSE = 60
+
+TRANSIENT_ERRORS = (TTransportException, socket.error, socket.timeout)
+
+logger = logging.getLogger(__name__)
+
+
+class RetryPolicy(object):
+
+    def __init__(self, max_attempts=MAX_ATTEMPTS, backoff=BACKOFF,
+        max_backoff=MAX_BACKOFF, deadline=DEADLINE,
+        breaker_threshold=BREAKER_THRESHOLD, breaker_pause=BREAKER_PAUSE,
+        retry_on=TRANSIENT_ERRORS):
+        """
+        ``max_attempts`` inclui a primeira tentativa. ``deadline`` é o tempo
+        máximo, em segundos, entre a primeira tentativa e o início da última;
+        0 desativa o prazo. ``breaker_threshold`` e ``breaker_pause`` definem
+        o circuit breaker criado para cada servidor (0 desativa o breaker).
+        """
+        self.max_attempts = max(max_attempts, 1)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.breaker_threshold = breaker_threshold
+        self.breaker_pause = breaker_pause
+        self.retry_on = retry_on
+
+    def __eq__(self, other):
+
+        return isinstance(other, RetryPolicy) and vars(self) == vars(other)
+
+    def __ne__(self, other):
+
+        return not self == other
+
+    def delay(self, attempt):
+        """
+        Intervalo antes da tentativa seguinte à tentativa ``attempt``
+        (1 para a primeira), sorteado entre 0 e o backoff exponencial.
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+
+    def should_retry(self, attempt, elapsed):
+        """
+        Indica se uma nova tentativa deve ser feita após ``attempt``
+        tentativas, sendo ``elapsed`` os segundos decorridos até o início da
+        nova tentativa.
+        """
+        if attempt >= self.max_attempts:
+            return False
+
+        return not self.deadline or elapsed < self.deadline
+
+    def breaker(self, name=None):
+
+        if not self.breaker_threshold:
+            return None
+
+        return CircuitBreaker(self.breaker_threshold, self.breaker_pause, name)
+
+
+# Política aplicada aos pools criados sem política: reconecta uma única vez,
+# sem espera e sem prazo.
+RECONNECT = RetryPolicy(max_attempts=2, backoff=0, deadline=0, breaker_threshold=0)
+
+
+class CircuitBreaker(object):
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, pause=BREAKER_PAUSE, name=None):
+        """
+        Abre o circuito após ``threshold`` falhas consecutivas, pausando as
+        chamadas por ``pause`` segundos. Após a pausa uma única falha reabre
+        o circuito; um sucesso o fecha.
+        """
+        self.threshold = threshold
+        self.pause = pause
+        self.name = name
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+
+        opened_at = self.opened_at
+
+        return opened_at is not None and time.time() - opened_at < self.pause
+
+    def wait(self):
+        """
+        Aguarda o fim da pausa quando o circuito está aberto. Retorna os
+        segundos aguardados.
+        """
+        opened_at = self.opened_at
+
+        if opened_at is None:
+            return 0
+
+        remaining = opened_at + self.pause - time.time()
+        if remaining <= 0:
+            return 0
+
+        time.sleep(remaining)
+
+        return remaining
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+
+            if self.failures < self.threshold:
+                return
+
+            if not self.is_open:
+                logger.warning('Circuit open for %s after %d consecutive failures, pausing calls for %s seconds' % (
+                    self.name, self.failures, self.pause))
+
+            self.opened_at = time.time()
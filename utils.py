@@ -8,7 +8,8 @@ import logging
 
 from django.utils.text import slugify
 
-from thrift import clients
+import metrics
+from thrift import clients, cache, retry
 
 try:
     from configparser import ConfigParser
@@ -95,6 +96,48 @@ config = Configuration.from_env()
 settings = dict(config.items())
 
 
+def thrift_pool_options():
+    options = {}
+
+    try:
+        options['pool_size'] = int(settings['app:main']['thrift_pool_size'])
+    except KeyError:
+        pass
+    except ValueError:
+        logger.warning('Invalid thrift_pool_size, assuming default value')
+
+    try:
+        options['pool_idle_timeout'] = int(settings['app:main']['thrift_pool_idle_timeout'])
+    except KeyError:
+        pass
+    except ValueError:
+        logger.warning('Invalid thrift_pool_idle_timeout, assuming default value')
+
+    options['retry_policy'] = thrift_retry_policy()
+
+    return options
+
+
+def thrift_retry_policy():
+    options = {}
+
+    for option, key, cast in [
+        ('max_attempts', 'thrift_retry_attempts', int),
+        ('backoff', 'thrift_retry_backoff', float),
+        ('deadline', 'thrift_retry_deadline', float),
+        ('breaker_threshold', 'thrift_breaker_threshold', int),
+        ('breaker_pause', 'thrift_breaker_pause', float)
+    ]:
+        try:
+            options[option] = cast(settings['app:main'][key])
+        except KeyError:
+            pass
+        except ValueError:
+            logger.warning('Invalid %s, assuming default value' % key)
+
+    return retry.RetryPolicy(**options)
+
+
 def publicationstats_server():
     try:
         server = settings['app:main']['publicationstats_thriftserver'].split(':')
@@ -105,7 +148,7 @@ def publicationstats_server():
         host = 'publicationstats.scielo.org'
         port = 11620
 
-    return clients.PublicationStats(host, port)
+    return clients.PublicationStats(host, port, **thrift_pool_options())
 
 def citedby_server():
     try:
@@ -117,10 +160,19 @@ def citedby_server():
         host = 'citedby.scielo.org'
         port = 11610
 
-    return clients.Citedby(host, port)
+    return clients.Citedby(host, port, **thrift_pool_options())
 
 
-def ratchet_server():
+def ratchet_workers():
+    try:
+        return int(settings['app:main']['ratchet_workers'])
+    except KeyError:
+        return clients.WORKERS
+    except ValueError:
+        logger.warning('Invalid ratchet_workers, assuming default value %d' % clients.WORKERS)
+        return clients.WORKERS
+
+def ratchet_server(workers=None):
     try:
         server = settings['app:main']['ratchet_thriftserver'].split(':')
         host = server[0]
@@ -130,9 +182,50 @@ def ratchet_server():
         host = 'ratchet.scielo.org'
         port = 11630
 
-    return clients.Ratchet(host, port)
+    return clients.Ratchet(
+        host, port, workers=workers or ratchet_workers(),
+        **thrift_pool_options())
+
+def compress_threads():
+    try:
+        return int(settings['app:main']['compress_threads'])
+    except KeyError:
+        return None
+    except ValueError:
+        logger.warning('Invalid compress_threads, assuming default value')
+        return None
+
+def articlemeta_workers():
+    try:
+        return int(settings['app:main']['articlemeta_workers'])
+    except KeyError:
+        return clients.WORKERS
+    except ValueError:
+        logger.warning('Invalid articlemeta_workers, assuming default value %d' % clients.WORKERS)
+        return clients.WORKERS
+
+def articlemeta_cache():
+    path = settings.get('app:main', {}).get('articlemeta_cache', None)
+
+    if not path:
+        return None
+
+    try:
+        return cache.DocumentCache(path)
+    except Exception as e:
+        logger.exception(e)
+        logger.warning('Could not open Article Meta cache %s, running without cache' % path)
+        return None
+
+def articlemeta_journal_cache():
+    value = settings.get('app:main', {}).get('articlemeta_journal_cache', None)
+
+    if value is None:
+        return clients.JOURNAL_CACHE
 
-def articlemeta_server():
+    return value.strip().lower() in ['true', 'yes', 'on', '1']
+
+def articlemeta_server(workers=None):
     try:
         server = settings['app:main']['articlemeta_thriftserver'].split(':')
         host = server[0]
@@ -142,7 +235,10 @@ def articlemeta_server():
         host = 'articlemeta.scielo.org'
         port = 11720
 
-    return clients.ArticleMeta(host, port)
+    return clients.ArticleMeta(
+        host, port, workers=workers or articlemeta_workers(),
+        cache=articlemeta_cache(), journal_cache=articlemeta_journal_cache(),
+        **thrift_pool_options())
 
 def accessstats_server():
     try:
@@ -154,7 +250,7 @@ def accessstats_server():
         host = 'ratchet.scielo.org'
         port = 11660
 
-    return clients.AccessStats(host, port)
+    return clients.AccessStats(host, port, **thrift_pool_options())
 
 def is_valid_date(value):
 
@@ -178,3 +274,20 @@ def ckeck_given_issns(issns):
 
     return valid_issns
 
+
+def metrics_options():
+    options = {}
+
+    try:
+        options['interval'] = float(settings['app:main']['metrics_log_interval'])
+    except KeyError:
+        pass
+    except ValueError:
+        logger.warning('Invalid metrics_log_interval, assuming default value')
+
+    options['prometheus_file'] = settings.get('app:main', {}).get('metrics_prometheus_file', None)
+
+    return options
+
+
+metrics.configure(**metrics_options())